@@ -1,15 +1,26 @@
 import streamlit as st
 from data_view import display_data_tab
-from scenario_processor import display_scenario_tab
+from scenario_processor import display_scenario_tab, display_unavailable_job, get_requested_job
 from use_case_loader import UseCaseLoader
 from use_case_manager import add_use_case_manager
+from tool_dashboard import display_profiling_tab
+from history_view import display_history_tab
+from batch_runner import display_batch_section
+from context_store import ContextStore
+from context_provider import set_default_provider, session_state_context
+from sqlite_store import SqliteDatabase, DEFAULT_DATABASE_DIR
+from data_loader import open_data_file
 import os
+from pathlib import Path
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 
 # Load environment variables at startup
 load_dotenv()
 
+# Tool functions called outside a scenario run see the session's context
+set_default_provider(session_state_context)
+
 def get_openai_client(key, endpoint, deployment):
     """Initialize an OpenAI client with the given credentials."""
     client = AzureOpenAI(
@@ -43,6 +54,21 @@ def initialize_clients():
             "O1_MINI_OPENAI_DEPLOYMENT_NAME"
         )
 
+@st.cache_resource
+def get_context_database(use_case: str) -> SqliteDatabase:
+    """Return the SQLite database holding a use case's tables; each session attaches its own copy."""
+    return SqliteDatabase(Path(os.getenv('CONTEXT_DB_PATH') or DEFAULT_DATABASE_DIR) / f"{use_case}.sqlite")
+
+def create_context_store(loader: UseCaseLoader, use_case: str, data: dict) -> ContextStore:
+    """Create the session's context, serving record tables from SQLite if CONTEXT_BACKEND=sqlite."""
+    store = ContextStore(data)
+    if (os.getenv('CONTEXT_BACKEND') or 'memory').lower() == 'sqlite':
+        database = get_context_database(use_case)
+        # Records are streamed from data.json; large tables are never parsed into memory
+        database.import_data(open_data_file(loader.base_path / use_case / "data.json", loader.cache_dir))
+        database.attach(store)
+    return store
+
 def main():
     # Check for environment variables
     required_env_vars = [
@@ -84,14 +110,22 @@ def main():
         1. Select a use case below
         2. Choose the first tab to view sample data and tools
         3. Choose the second tab to execute an agentic workflow
+        4. Choose the third tab to inspect tool performance
+        5. Choose the fourth tab to browse past runs
         """)
         
         st.markdown("---")
         st.header("Select a Use Case")
         st.markdown("After selecting a Use Case below, use the tabs on the right to view sample data and tools, and run an agentic workflow.")
+        # After a page refresh, reopen the use case of the scenario run in the URL
+        requested_job = get_requested_job()
+        requested_use_case = requested_job.metadata.get('use_case') if requested_job else None
+        if 'selected_use_case' not in st.session_state and requested_use_case in use_cases:
+            st.session_state.selected_use_case = requested_use_case
         selected_use_case = st.selectbox(
             "Select Use Case",
             use_cases,
+            key="selected_use_case",
             help="Choose a use case to view its data"
         )
 
@@ -106,14 +140,25 @@ def main():
         # Initialize session state
         if 'current_use_case' not in st.session_state or st.session_state.current_use_case != selected_use_case:
             st.session_state.current_use_case = selected_use_case
-            st.session_state.context = components['data']
-            st.session_state.initial_context = components['data'].copy()
+            # Every change to the context is journaled so it can be reset or undone cheaply
+            st.session_state.context_store = create_context_store(loader, selected_use_case, components['data'])
+            st.session_state.context = st.session_state.context_store.data
+            # Checked on request in the data tab, as checking reads every table
+            st.session_state.pop('integrity_report', None)
             st.session_state.messages = []
+            st.session_state.pop('active_job_id', None)
+            if requested_use_case != selected_use_case:
+                # A link to a run the queue has dropped would otherwise be cleared without a word
+                if requested_job is None and st.query_params.get('job'):
+                    display_unavailable_job(st.query_params['job'])
+                st.query_params.pop('job', None)
 
         # Create tabs
-        tab1, tab2 = st.tabs([
+        tab1, tab2, tab3, tab4 = st.tabs([
             "| 📈 1. Sample Data and Tools |",
-            "| 🧠 2. Run Agentic Workflow |"
+            "| 🧠 2. Run Agentic Workflow |",
+            "| ⏱️ 3. Tool Performance |",
+            "| 🗂️ 4. Run History |"
         ])
         
         with tab1:
@@ -130,7 +175,19 @@ def main():
                 function_mapping=components['function_mapping'],
                 sample_scenarios=components['sample_scenarios']
             )
-            
+            display_batch_section(
+                tools=components['tools'],
+                function_mapping=components['function_mapping']
+            )
+
+        with tab3:
+            display_profiling_tab(
+                use_case=selected_use_case,
+                function_mapping=components['function_mapping']
+            )
+
+        with tab4:
+            display_history_tab(use_case=selected_use_case)
 
 
         add_use_case_manager(st, st.session_state.o1_client)
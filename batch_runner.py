@@ -0,0 +1,216 @@
+import streamlit as st
+import pandas as pd
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from job_queue import Job, QueueFull, COMPLETED, FAILED, CANCELLED
+from scenario_processor import submit_scenario, get_batch_queue, JOB_POLL_INTERVAL
+from context_store import ContextStore
+
+ID_PLACEHOLDER = "{id}"
+
+
+class Batch:
+    """A group of scenario runs submitted together, each on an isolated fork of the context."""
+
+    def __init__(self, batch_id: str, use_case: str, runs: List[Tuple[Optional[str], Job]]):
+        self.id = batch_id
+        self.use_case = use_case
+        self.runs = runs
+        self.created_at = time.time()
+
+    @property
+    def finished(self) -> int:
+        return sum(1 for _, job in self.runs if job.done)
+
+    @property
+    def done(self) -> bool:
+        return self.finished == len(self.runs)
+
+    def cancel(self) -> None:
+        for _, job in self.runs:
+            job.cancel()
+
+
+def list_tables(store: ContextStore) -> List[str]:
+    """Return the tables whose records can be addressed by ID.
+
+    Only a sample of each table is looked at (see ContextStore.table_kind), so lazy and
+    SQLite tables are not loaded.
+    """
+    return [name for name in store.data if store.table_kind(name)]
+
+def list_fields(store: ContextStore, name: str) -> List[str]:
+    """Return the fields of a table's first record."""
+    first = next(iter(store.head(name, 1)), {})
+    return [field for field, value in first.items() if not isinstance(value, (dict, list))]
+
+def list_entity_ids(table: Any, field: str = None, value: str = None) -> List[str]:
+    """Return the IDs of a table's records, optionally only those whose `field` equals `value`.
+
+    Values are compared after normalize_name (ignoring case and extra whitespace) through
+    the table's field index, or an expression index for SQLite tables.
+    """
+    return [str(key) for key in table.record_keys(field or None, value, normalized=True)]
+
+def expand_template(template: str, entity_ids: List[str]) -> List[Tuple[str, str]]:
+    """Build one (entity ID, scenario) pair per ID by filling the {id} placeholder."""
+    return [(entity_id, template.replace(ID_PLACEHOLDER, entity_id)) for entity_id in entity_ids]
+
+def submit_batch(scenarios: List[Tuple[Optional[str], str]], tools: List[Dict],
+                 function_mapping: Dict) -> Batch:
+    """Submit every scenario as its own isolated run on the batch queue.
+
+    Raises QueueFull, after cancelling the runs already submitted, if the batch queue
+    cannot take every run.
+    """
+    queue = get_batch_queue()
+    if queue.max_pending is not None and queue.pending() + len(scenarios) > queue.max_pending:
+        raise QueueFull(f"The batch queue can hold {queue.max_pending} runs and {queue.pending()} are already pending")
+    runs = []
+    batch_id = uuid.uuid4().hex[:12]
+    try:
+        for entity_id, scenario in scenarios:
+            job = submit_scenario(
+                scenario, tools, function_mapping,
+                isolated=True,
+                metadata={'batch_id': batch_id, 'entity_id': entity_id},
+                queue=queue
+            )
+            runs.append((entity_id, job))
+    except QueueFull:
+        for _, job in runs:
+            job.cancel()
+        raise
+    return Batch(batch_id, st.session_state.current_use_case, runs)
+
+def batch_results(batch: Batch) -> pd.DataFrame:
+    """Combine the outcome of every run of a batch into a single table."""
+    rows = []
+    for entity_id, job in batch.runs:
+        result = job.result or {}
+        messages = job.get_messages()
+        final_message = next(
+            (m['content'] for m in reversed(messages) if m['type'] == 'assistant'), None
+        )
+        rows.append({
+            'entity_id': entity_id,
+            'scenario': job.label,
+            'status': job.status,
+            'function_calls': (result.get('operation_counts') or {}).get('function_calls'),
+            'duration_s': (result.get('planning_time') or 0.0) + (result.get('execution_time') or 0.0)
+                          if result else None,
+            'context_changes': result.get('context_changes'),
+            'final_message': final_message,
+            'error': job.error.split('\n')[0] if job.error else None,
+            'job_id': job.id
+        })
+    return pd.DataFrame(rows)
+
+def display_batch(batch: Batch) -> None:
+    """Render the progress and combined results of a batch."""
+    total = len(batch.runs)
+    finished = batch.finished
+    statuses = [job.status for _, job in batch.runs]
+
+    progress_col, cancel_col = st.columns([4, 1])
+    with progress_col:
+        st.progress(
+            finished / total if total else 1.0,
+            text=f"{finished}/{total} runs finished · {statuses.count(COMPLETED)} completed · "
+                 f"{statuses.count(FAILED)} failed · {statuses.count(CANCELLED)} cancelled"
+        )
+    with cancel_col:
+        if not batch.done and st.button("Cancel All", key=f"cancel_batch_{batch.id}", use_container_width=True):
+            batch.cancel()
+
+    results = batch_results(batch)
+    st.dataframe(results, use_container_width=True, hide_index=True)
+    if batch.done:
+        st.download_button(
+            "Download results (CSV)",
+            results.to_csv(index=False),
+            file_name=f"batch_{batch.id}.csv",
+            mime="text/csv",
+            key=f"download_batch_{batch.id}"
+        )
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def poll_batch() -> None:
+    """Re-render a running batch until every run has finished."""
+    batch = st.session_state.get('active_batch')
+    if batch is None or batch.done:
+        st.rerun()
+    display_batch(batch)
+
+def display_batch_section(tools: List[Dict], function_mapping: Dict):
+    """Display the controls to run many scenarios concurrently and their combined results."""
+    st.markdown("---")
+    st.subheader("Batch Runs")
+    st.info("Run one scenario for every record of a table, or a list of scenarios, concurrently. Each run works on its own isolated copy of the data, so runs do not affect each other or the data above.")
+
+    mode = st.radio(
+        "Batch type",
+        ["One scenario per record", "List of scenarios"],
+        horizontal=True,
+        key="batch_mode"
+    )
+
+    scenarios = []
+    if mode == "One scenario per record":
+        store = st.session_state.context_store
+        tables = list_tables(store)
+        if not tables:
+            st.write("This use case has no tables with addressable records.")
+            return
+        table_col, field_col, value_col = st.columns([2, 2, 2])
+        with table_col:
+            table_name = st.selectbox("Table", tables, key="batch_table")
+        with field_col:
+            field = st.selectbox("Only records where", ["(all records)"] + list_fields(store, table_name), key="batch_field")
+        with value_col:
+            value = st.text_input("equals", key="batch_value", disabled=field == "(all records)")
+        template = st.text_area(
+            f"Scenario template (use {ID_PLACEHOLDER} for the record ID)",
+            key="batch_template",
+            placeholder=f"Run fraud triage on claim {ID_PLACEHOLDER} and flag it if it looks suspicious."
+        )
+        # Matching records are only looked up on request, not on every rerun
+        field = None if field == "(all records)" else field
+        selection = (st.session_state.current_use_case, table_name, field, value)
+        if st.button("Preview matching records", key="batch_preview_button"):
+            entity_ids = list_entity_ids(st.session_state.context[table_name], field, value)
+            st.session_state.batch_preview = (selection, entity_ids)
+        preview = st.session_state.get('batch_preview')
+        label = "Run Batch"
+        if preview is not None and preview[0] == selection:
+            entity_ids = preview[1]
+            st.caption(f"{len(entity_ids)} matching records: {', '.join(entity_ids[:10])}"
+                       f"{' …' if len(entity_ids) > 10 else ''}")
+            label = f"Run Batch ({len(entity_ids)} runs)"
+        ready = bool(template.strip())
+    else:
+        text = st.text_area("Scenarios (one per line)", key="batch_scenarios")
+        scenarios = [(None, line.strip()) for line in text.splitlines() if line.strip()]
+        ready = bool(scenarios)
+        label = f"Run Batch ({len(scenarios)} runs)"
+
+    if st.button(label, key="run_batch_button", disabled=not ready):
+        if mode == "One scenario per record":
+            entity_ids = list_entity_ids(st.session_state.context[table_name], field, value)
+            scenarios = expand_template(template.strip(), entity_ids)
+        if not scenarios:
+            st.warning("No records match the selection.")
+        else:
+            try:
+                st.session_state.active_batch = submit_batch(scenarios, tools, function_mapping)
+            except QueueFull as e:
+                st.error(f"Error submitting batch: {str(e)}")
+
+    batch = st.session_state.get('active_batch')
+    if batch is None or batch.use_case != st.session_state.current_use_case:
+        return
+    if batch.done:
+        display_batch(batch)
+    else:
+        poll_batch()
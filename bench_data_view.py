@@ -0,0 +1,114 @@
+import argparse
+import json
+import time
+from typing import Any, Callable, List, Tuple
+
+import pandas as pd
+
+from context_store import ContextStore
+from data_view import convert_to_dataframe
+from synthetic_data import synthesize
+
+# The row-by-row conversion data_view used before tables were normalized column by
+# column, kept here as the baseline
+
+
+def legacy_flatten_dict(d, parent_key='', sep='_'):
+    """Flatten nested dictionaries, keeping arrays intact."""
+    items = []
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(legacy_flatten_dict(v, new_key, sep=sep).items())
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+def legacy_convert_to_dataframe(data, parent_key=''):
+    """Convert nested JSON data to pandas DataFrame with improved type handling."""
+    if isinstance(data, dict):
+        if all(not isinstance(v, (dict, list)) for v in data.values()):
+            processed_data = {k: str(v) if isinstance(v, (int, float)) else v 
+                            for k, v in data.items()}
+            return pd.DataFrame([processed_data])
+        
+        rows = []
+        for key, value in data.items():
+            if isinstance(value, dict):
+                flattened = legacy_flatten_dict(value)
+                flattened['id'] = key
+                rows.append(flattened)
+            elif isinstance(value, list):
+                if value and isinstance(value[0], dict):
+                    df = pd.DataFrame(value)
+                    df['parent_id'] = key
+                    return df
+                else:
+                    return pd.DataFrame({key: [str(x) for x in value]})
+        
+        if rows:
+            return pd.DataFrame(rows)
+        
+    elif isinstance(data, list):
+        if data and isinstance(data[0], dict):
+            flattened_data = [legacy_flatten_dict(item) for item in data]
+            return pd.DataFrame(flattened_data)
+        return pd.DataFrame({parent_key: [str(x) for x in data]})
+    
+    return None
+
+
+def _time(convert: Callable, make_table: Callable, repeat: int) -> Tuple[float, Any]:
+    # Best of `repeat` runs, each on a fresh copy so cached wrappers do not carry over
+    best, frame = float('inf'), None
+    for _ in range(repeat):
+        table = make_table()
+        start = time.perf_counter()
+        frame = convert(table)
+        best = min(best, time.perf_counter() - start)
+    return best, frame
+
+
+def _same_rows(new: Any, old: Any) -> str:
+    if old is None or new is None:
+        return 'n/a'
+    if len(new) != len(old):
+        return f"rows {len(old)} -> {len(new)}"
+    missing = [column for column in old.columns if column not in new.columns]
+    if missing:
+        return f"missing {missing}"
+    text = lambda frame: frame[list(old.columns)].astype(str).replace({'None': 'nan', '<NA>': 'nan'})
+    return 'same' if text(new).reset_index(drop=True).equals(text(old).reset_index(drop=True)) else 'differs'
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the data tab's table-to-frame conversion against the row-by-row baseline")
+    parser.add_argument('source', help="data.json of a use case")
+    parser.add_argument('--rows', type=int, default=100000, help="synthetic records added per table")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement (best is shown)")
+    parser.add_argument('--plain', action='store_true',
+                        help="convert plain JSON instead of tables held by a context store")
+    args = parser.parse_args(argv)
+
+    with open(args.source, 'r') as f:
+        data = synthesize(json.load(f), args.rows, seed=args.seed)
+    text = json.dumps(data)
+
+    def make_table(name: str) -> Callable:
+        if args.plain:
+            return lambda: json.loads(text)[name]
+        return lambda: ContextStore(json.loads(text)).data[name]
+
+    print(f"{'table':<24}{'rows':>9}{'baseline s':>12}{'new s':>10}{'speedup':>9}  result")
+    for name in data:
+        old_time, old = _time(lambda table: legacy_convert_to_dataframe(table, name), make_table(name), args.repeat)
+        new_time, new = _time(lambda table: convert_to_dataframe(table, name), make_table(name), args.repeat)
+        rows = len(new) if new is not None else 0
+        speedup = old_time / new_time if new_time else float('inf')
+        print(f"{name:<24}{rows:>9}{old_time:>12.3f}{new_time:>10.3f}{speedup:>8.1f}x  {_same_rows(new, old)}")
+
+
+if __name__ == '__main__':
+    main()
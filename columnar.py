@@ -0,0 +1,247 @@
+from collections.abc import Mapping
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from context_store import find_record
+
+# Columnar views cached per store; the least recently used are dropped beyond this
+MAX_CACHED_VIEWS = 16
+
+
+def field_value(record: Any, field: str, fill_value: float = 0.0) -> float:
+    """Read a numeric field from a record; dotted paths reach into nested dicts.
+
+    Numbers are returned as floats and lists or dicts as their length, so collection
+    sizes can be scored as well. Anything else (including a missing field) is `fill_value`.
+    """
+    value = record
+    for part in field.split('.'):
+        if not isinstance(value, dict):
+            return fill_value
+        value = dict.get(value, part)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, (list, dict)):
+        return float(len(value))
+    return fill_value
+
+
+def _table_records(table: Any) -> Iterable[Tuple[Any, Any]]:
+    if hasattr(table, 'record_items'):
+        return table.record_items()
+    if isinstance(table, Mapping):
+        return table.items()
+    return ((f"#{index}", record) for index, record in enumerate(table))
+
+
+class ColumnarTable:
+    """NumPy columns of a table's numeric fields, kept in sync with its records.
+
+    Columns are built once and then patched from the context store's change
+    notifications: a changed record only re-reads that record, while added, removed or
+    reordered records rebuild the columns on next use. Population-wide scoring can
+    then run as vectorized NumPy operations instead of loops over record dicts.
+    """
+
+    def __init__(self, table: Any, fields: Sequence[str], fill_value: float = 0.0):
+        self.table = table
+        self.fields = tuple(fields)
+        self.fill_value = fill_value
+        self._keys: List[Any] = []
+        self._positions: Dict[Any, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._stale = True
+        self._dirty = set()
+        self._store = getattr(table, '_store', None)
+        self._name = table._location[0] if self._store is not None else None
+        self._lock = self._store.lock if self._store is not None else nullcontext()
+        if self._store is not None:
+            # Weakly held, so a view that is no longer used stops receiving changes
+            self._store.add_listener(self._on_change, weak=True)
+
+    def close(self) -> None:
+        """Stop following changes to the table."""
+        if self._store is not None:
+            self._store.remove_listener(self._on_change)
+
+    def _on_change(self, table: Any, record_key: Any) -> None:
+        if table != self._name:
+            return
+        if record_key is None:
+            self._stale = True
+        else:
+            self._dirty.add(record_key)
+
+    def _rebuild(self) -> None:
+        if self._store is not None:
+            self.table = self._store.table(self._name)
+        keys, rows = [], []
+        for key, record in _table_records(self.table):
+            keys.append(key)
+            rows.append([field_value(record, field, self.fill_value) for field in self.fields])
+        values = np.array(rows, dtype=float).reshape(len(keys), len(self.fields))
+        self._keys = keys
+        self._positions = {key: position for position, key in enumerate(keys)}
+        self._columns = {field: values[:, i].copy() for i, field in enumerate(self.fields)}
+        self._stale = False
+        self._dirty = set()
+
+    def _patch(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        for key in dirty:
+            position = self._positions.get(key)
+            record = self.record(key) if position is not None else None
+            if record is None:
+                # The record moved or its key changed; only a rebuild can place it
+                self._rebuild()
+                return
+            for field in self.fields:
+                self._columns[field][position] = field_value(record, field, self.fill_value)
+
+    def refresh(self) -> 'ColumnarTable':
+        """Bring the columns up to date with the table."""
+        with self._lock:
+            if self._stale or self._store is None:
+                self._rebuild()
+            elif self._dirty:
+                self._patch()
+        return self
+
+    @property
+    def keys(self) -> List[Any]:
+        """The record keys, in the order of the column entries."""
+        with self._lock:
+            return list(self.refresh()._keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.refresh()._keys)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """Return a copy of the column of `field`, aligned with `keys`."""
+        with self._lock:
+            return self.refresh()._columns[field].copy()
+
+    def record(self, key: Any) -> Any:
+        """Return the record stored under `key` (a dict key, primary key or '#<position>')."""
+        table = self.table
+        if isinstance(table, Mapping):
+            return table.get(key)
+        primary_key = getattr(table, 'primary_key', None)
+        if primary_key and not (isinstance(key, str) and key.startswith('#')):
+            return find_record(table, primary_key, key)
+        position = self._positions.get(key)
+        return table[position] if position is not None and position < len(table) else None
+
+    def positions(self, keys: Sequence[Any] = None) -> Tuple[List[Any], np.ndarray, List[Any]]:
+        """Locate `keys` (default: every record) in the columns.
+
+        Returns the keys that were found, their positions in the columns, and the
+        keys that are not in the table.
+        """
+        with self._lock:
+            self.refresh()
+            if keys is None:
+                return list(self._keys), np.arange(len(self._keys)), []
+            found = [key for key in keys if key in self._positions]
+            missing = [key for key in keys if key not in self._positions]
+            return found, np.array([self._positions[key] for key in found], dtype=int), missing
+
+    def select(self, mask: np.ndarray) -> List[Any]:
+        """Return the keys of the records selected by a boolean mask over the columns."""
+        with self._lock:
+            keys = self.refresh()._keys
+            return [keys[i] for i in np.flatnonzero(mask)]
+
+    def assign(self, field: str, values: Any, keys: Sequence[Any] = None) -> int:
+        """Write `values` to `field` of the records under `keys` (default: every record).
+
+        Writes go through the records, so they are journaled and can be rolled back
+        like any other change; unchanged values are skipped. Returns how many records
+        were updated.
+        """
+        updated = 0
+        with self._lock:
+            keys = self.keys if keys is None else list(keys)
+            values = np.broadcast_to(np.asarray(values), (len(keys),)).tolist()
+            for key, value in zip(keys, values):
+                record = self.record(key)
+                if record is not None and dict.get(record, field) != value:
+                    record[field] = value
+                    updated += 1
+        return updated
+
+
+def columnar(table: Any, fields: Sequence[str], fill_value: float = 0.0) -> ColumnarTable:
+    """Return the up-to-date columnar view of `fields` of a context table.
+
+    Views of tables owned by a ContextStore are cached on the store and reused across
+    calls (the MAX_CACHED_VIEWS most recently used ones); other tables (plain dicts and
+    lists) get a one-off view.
+    """
+    store = getattr(table, '_store', None)
+    if store is None:
+        return ColumnarTable(table, fields, fill_value).refresh()
+    cache_key = ('columnar', table._location[0], tuple(fields), fill_value)
+    with store.lock:
+        # Re-inserted on every use, so the cache is ordered from least to most recently used
+        view = store.derived.pop(cache_key, None)
+        if view is None:
+            view = ColumnarTable(table, fields, fill_value)
+        store.derived[cache_key] = view
+        cached = [key for key in store.derived if key[0] == 'columnar']
+        for key in cached[:-MAX_CACHED_VIEWS]:
+            store.derived.pop(key).close()
+        return view.refresh()
+
+
+# Comparisons a batch filter can make between a numeric field and a value
+FILTER_OPERATORS = {
+    '==': np.equal,
+    '!=': np.not_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal
+}
+
+
+def filter_keys(table: Any, filters: Sequence[Dict[str, Any]],
+                keys: Sequence[Any] = None) -> Tuple[List[Any], List[Any]]:
+    """Return the keys of the records matching every filter, and the `keys` not in the table.
+
+    Each filter is {"field": <numeric field, dotted for nested>, "op": one of
+    FILTER_OPERATORS, "value": <number>}; booleans compare as 0 and 1 and lists and dicts by
+    their length (see field_value). The filters are evaluated as masks over a columnar
+    view of the filtered fields, restricted to `keys` when given.
+    """
+    conditions = []
+    for condition in filters:
+        if not isinstance(condition, Mapping) or not isinstance(condition.get('field'), str):
+            raise ValueError(f"Invalid filter {condition!r}: expected an object with a field, op and value")
+        if condition.get('op') not in FILTER_OPERATORS:
+            raise ValueError(f"Invalid filter operator {condition.get('op')!r}; use one of {', '.join(FILTER_OPERATORS)}")
+        value = condition.get('value')
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"Invalid filter value {value!r} for {condition['field']}: expected a number")
+        conditions.append((condition['field'], FILTER_OPERATORS[condition['op']], float(value)))
+
+    view = columnar(table, sorted({field for field, _, _ in conditions}))
+    ids, positions, missing = view.positions(keys)
+    mask = np.ones(len(ids), dtype=bool)
+    for field, compare, value in conditions:
+        mask &= compare(view[field][positions], value)
+    return [ids[i] for i in np.flatnonzero(mask)], missing
+
+
+def top_k(keys: Sequence[Any], scores: np.ndarray, k: int) -> List[Tuple[Any, float]]:
+    """Return the `k` highest (key, score) pairs, highest first, without sorting every score."""
+    scores = np.asarray(scores, dtype=float)
+    k = max(0, min(k, len(scores)))
+    if not k:
+        return []
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [(keys[i], float(scores[i])) for i in best]
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Iterator, Optional
+
+# The context tool functions work on, bound per run (see bind_context)
+_BOUND_CONTEXT: ContextVar[Optional[Any]] = ContextVar('tool_context', default=None)
+_default_provider: Optional[Callable[[], Any]] = None
+
+
+def get_context() -> Any:
+    """Return the data (tables by name) that tool functions read and update.
+
+    This is the context bound to the current run, or else the one returned by the
+    default provider (the Streamlit session state when running in the app).
+    """
+    context = _BOUND_CONTEXT.get()
+    if context is not None:
+        return context
+    if _default_provider is not None:
+        return _default_provider()
+    raise LookupError("No context is bound; run tool functions inside bind_context(data)")
+
+
+@contextmanager
+def bind_context(context: Any) -> Iterator[Any]:
+    """Make `context` what get_context() returns in this thread or task until the block exits."""
+    token = _BOUND_CONTEXT.set(context)
+    try:
+        yield context
+    finally:
+        _BOUND_CONTEXT.reset(token)
+
+
+def set_default_provider(provider: Optional[Callable[[], Any]]) -> None:
+    """Set the function get_context() falls back to when no context is bound."""
+    global _default_provider
+    _default_provider = provider
+
+
+def session_state_context() -> Any:
+    """Context provider reading the current Streamlit session's context."""
+    import streamlit as st
+    return st.session_state.context
+
+
+def with_current_context(func: Callable) -> Callable:
+    """Wrap `func` to run with the caller's bound context, e.g. when submitted to a thread pool.
+
+    Threads do not inherit context variables, so tools fanned out to a pool would
+    otherwise not see the run's context. (Process pools should pass the data along
+    and call bind_context in the worker.)
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
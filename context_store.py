@@ -0,0 +1,1255 @@
+import copy
+import threading
+import time
+import unicodedata
+import weakref
+from collections import deque
+from itertools import islice
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+
+class _Missing:
+    """Marks a key that did not exist before (or after) a mutation."""
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def infer_primary_key(records: Iterable[Any]) -> Optional[str]:
+    """Pick the ID field of a list of records: `id` or a `*_id` field present and unique in every record."""
+    records = list(records)
+    if not records or not all(isinstance(record, dict) for record in records):
+        return None
+    for field in records[0]:
+        if field != 'id' and not field.endswith('_id'):
+            continue
+        values = [record.get(field, MISSING) for record in records]
+        if MISSING in values:
+            continue
+        try:
+            if len(set(values)) == len(values):
+                return field
+        except TypeError:
+            continue
+    return None
+
+
+def find_record(records: Any, field: str, value: Any, default: Any = None, normalized: bool = False) -> Any:
+    """Return the first record of a table whose `field` equals `value`.
+
+    Context tables answer from a hash index on the field (built on first use and
+    kept up to date as the table changes); plain lists and dicts are scanned.
+    With `normalized`, names are compared after normalize_name().
+    """
+    if hasattr(records, 'find'):
+        return records.find(field, value, default, normalized)
+    iterable = records.values() if isinstance(records, dict) else records
+    if normalized:
+        target = normalize_name(value)
+        return next((r for r in iterable
+                     if isinstance(r, dict) and field in r and normalize_name(r[field]) == target), default)
+    return next((r for r in iterable if isinstance(r, dict) and r.get(field) == value), default)
+
+
+def normalize_name(value: Any) -> str:
+    """Normalize a name for comparison: Unicode NFKC, case-folded, whitespace collapsed."""
+    return ' '.join(unicodedata.normalize('NFKC', str(value)).casefold().split())
+
+
+def resolve_record(records: Any, identifier: Any, name_field: str = 'name') -> Tuple[Any, Any]:
+    """Find a record by ID or by name. Returns (record ID, record), or (None, None).
+
+    The identifier is first tried as a key of a dict table or as the primary key of a
+    list table, then matched against `name_field` after normalize_name(). Both are
+    index lookups on context tables.
+    """
+    if isinstance(records, Mapping):
+        if identifier in records:
+            return identifier, records[identifier]
+        if hasattr(records, 'find_keys'):
+            keys = records.find_keys(name_field, identifier, normalized=True)
+            return (keys[0], records[keys[0]]) if keys else (None, None)
+        target = normalize_name(identifier)
+        return next(((key, record) for key, record in records.items()
+                     if isinstance(record, dict) and normalize_name(record.get(name_field, '')) == target),
+                    (None, None))
+
+    primary_key = getattr(records, 'primary_key', None) or infer_primary_key(records)
+    record = find_record(records, primary_key, identifier) if primary_key else None
+    if record is None:
+        record = find_record(records, name_field, identifier, normalized=True)
+    if record is None:
+        return None, None
+    return (record.get(primary_key) if primary_key else None), record
+
+
+def find_records(records: Any, field: str, value: Any) -> List[Any]:
+    """Return every record of a table whose `field` equals `value` (see find_record)."""
+    if hasattr(records, 'find_all'):
+        return records.find_all(field, value)
+    iterable = records.values() if isinstance(records, dict) else records
+    return [r for r in iterable if isinstance(r, dict) and r.get(field) == value]
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+def _format_path(path: Tuple) -> str:
+    text = ''
+    for part in path:
+        if isinstance(part, int):
+            text += f"[{part}]"
+        else:
+            text += f".{part}" if text else str(part)
+    return text
+
+
+def to_plain(value: Any) -> Any:
+    """Deep-copy a (possibly tracked) context value into plain dicts and lists."""
+    if hasattr(value, 'to_plain'):
+        return value.to_plain()
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in dict.items(value)}
+    if isinstance(value, list):
+        return [to_plain(v) for v in list.__iter__(value)]
+    return copy.deepcopy(value)
+
+
+class _TrackedMixin:
+    """Shared behaviour of containers whose mutations are journaled by a ContextStore."""
+
+    __slots__ = ()
+
+    def _wrap(self, key, value):
+        # Plain containers are converted the first time they are reached through the context
+        if isinstance(value, (TrackedDict, TrackedList)) and value._store is self._store:
+            return value
+        if isinstance(value, dict):
+            return TrackedDict(value, self._store, self._child_location(key, value))
+        if isinstance(value, list):
+            return TrackedList(value, self._store, self._child_location(key, value))
+        return value
+
+    def _child_location(self, key, value) -> Tuple:
+        if self._location is None:
+            return (key, None, ())
+        table, record_key, path = self._location
+        if record_key is None and not path:
+            return (table, self._record_key(key, value), ())
+        return (table, record_key, path + (key,))
+
+    def _record_key(self, key, value):
+        return key
+
+    def describe(self, key, value) -> Tuple[Any, Any, str]:
+        """Return the (table, record key, field path) a mutation of `key` refers to."""
+        if self._location is None:
+            return key, None, ''
+        table, record_key, path = self._location
+        if record_key is None and not path:
+            return table, (self._record_key(key, value) if key is not None else None), ''
+        return table, record_key, _format_path(path + ((key,) if key is not None else ()))
+
+    # Indexes
+
+    def _is_table(self) -> bool:
+        return self._location is not None and self._location[1] is None and not self._location[2]
+
+    def _is_record(self) -> bool:
+        return self._location is not None and self._location[1] is not None and not self._location[2]
+
+    def _build_index(self, field: str, normalized: bool) -> Dict[Any, List]:
+        index: Dict[Any, List] = {}
+        for key, record in self._record_items():
+            self._index_add(index, field, normalized, key, record)
+        return index
+
+    @staticmethod
+    def _index_value(record, field: str, normalized: bool) -> Any:
+        if not isinstance(record, dict):
+            return MISSING
+        value = dict.get(record, field, MISSING)
+        if value is MISSING or not _hashable(value):
+            return MISSING
+        return normalize_name(value) if normalized else value
+
+    @classmethod
+    def _index_add(cls, index: Dict[Any, List], field: str, normalized: bool, key, record) -> None:
+        value = cls._index_value(record, field, normalized)
+        if value is not MISSING:
+            index.setdefault(value, []).append(key)
+
+    @classmethod
+    def _index_remove(cls, index: Dict[Any, List], field: str, normalized: bool, key, record) -> None:
+        value = cls._index_value(record, field, normalized)
+        keys = index.get(value) if value is not MISSING else None
+        if keys and key in keys:
+            keys.remove(key)
+            if not keys:
+                del index[value]
+
+    def _reindex(self, key, old, new) -> None:
+        """Move the index entries of one record after it was replaced, added or removed."""
+        for (field, normalized), index in self._indexes.items():
+            if old is not MISSING:
+                self._index_remove(index, field, normalized, key, old)
+            if new is not MISSING:
+                self._index_add(index, field, normalized, key, new)
+
+    def _field_changed(self, field: str) -> None:
+        # Called when a field of one of this table's records was set or deleted
+        if self._indexes:
+            self._indexes.pop((field, False), None)
+            self._indexes.pop((field, True), None)
+
+    def _before_change(self, key=None) -> None:
+        # Forks that still share the table keep a copy of the record about to change (or of
+        # the whole table when records of a list are added, removed or replaced)
+        if not self._store._forks:
+            return
+        if self._location is None:
+            self._store.preserve_for_forks(key)
+        else:
+            table, record_key, _ = self._location
+            self._store.preserve_for_forks(table, record_key if record_key is not None else key)
+
+    def _touch(self) -> None:
+        if self._location is None:
+            return
+        table_name, record_key, path = self._location
+        self._store.table_changed(table_name, record_key)
+        # Records of external tables (e.g. SQLite) are copies that must be written back
+        if record_key is not None:
+            table = dict.get(self._store.data, table_name)
+            if getattr(table, 'external', False):
+                table.write_back(record_key, path, self)
+
+    def _notify_table(self, field) -> None:
+        if self._is_record():
+            table = dict.get(self._store.data, self._location[0])
+            if isinstance(table, _TrackedMixin) and table._store is self._store:
+                table._field_changed(field)
+
+    def record_items(self) -> Iterator[Tuple[Any, Any]]:
+        """Yield (record key, record) pairs of this table without wrapping the records."""
+        return ((self._record_key(key, value), value) for key, value in self._record_items())
+
+    def find_keys(self, field: str, value: Any, normalized: bool = False) -> List[Any]:
+        """Return the keys (dict keys or list positions) of the records whose `field` equals `value`.
+
+        With `normalized`, values are compared after normalize_name(), so names match
+        regardless of case, Unicode form and extra whitespace.
+        """
+        if not _hashable(value):
+            return [key for key, record in self._tracked_items()
+                    if isinstance(record, dict) and record.get(field) == value]
+        target = normalize_name(value) if normalized else value
+        if not self._is_table():
+            return [key for key, record in self._tracked_items()
+                    if self._index_value(record, field, normalized) == target]
+        with self._store.lock:
+            if self._indexes is None:
+                self._indexes = {}
+            index = self._indexes.get((field, normalized))
+            if index is None:
+                index = self._indexes[(field, normalized)] = self._build_index(field, normalized)
+            # Records changed behind the context's back are filtered out rather than trusted
+            return [key for key in index.get(target, ())
+                    if self._index_value(self[key], field, normalized) == target]
+
+    def record_keys(self, field: str = None, value: Any = None, normalized: bool = False) -> List[Any]:
+        """Return the record keys of this table, or of its records whose `field` equals `value`.
+
+        Unlike find_keys, records of list tables are given by primary key (as in
+        record_items) rather than by position. Matches come from the field index.
+        """
+        if field is None:
+            return [key for key, _ in self.record_items()]
+        with self._store.lock:
+            return [self._record_key(key, self[key]) for key in self.find_keys(field, value, normalized)]
+
+    def find_all(self, field: str, value: Any, normalized: bool = False) -> List[Any]:
+        """Return every record of this table whose `field` equals `value`."""
+        with self._store.lock:
+            return [self[key] for key in self.find_keys(field, value, normalized)]
+
+    def find(self, field: str, value: Any, default: Any = None, normalized: bool = False) -> Any:
+        """Return the first record of this table whose `field` equals `value`."""
+        records = self.find_all(field, value, normalized)
+        return records[0] if records else default
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return to_plain(self)
+
+
+class TrackedDict(_TrackedMixin, dict):
+    """A dict that reports every mutation to its ContextStore."""
+
+    __slots__ = ('_store', '_location', '_indexes')
+
+    def __init__(self, data: Mapping, store: 'ContextStore', location: Optional[Tuple]):
+        dict.__init__(self, data)
+        self._store = store
+        self._location = location
+        self._indexes: Optional[Dict[Tuple[str, bool], Dict[Any, List]]] = None
+
+    def _record_items(self):
+        return dict.items(self)
+
+    def _tracked_items(self):
+        return self.items()
+
+    def __reduce_ex__(self, protocol):
+        return (dict, (to_plain(self),))
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        wrapped = self._wrap(key, value)
+        if wrapped is not value:
+            dict.__setitem__(self, key, wrapped)
+        return wrapped
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self) -> dict:
+        return dict(dict.items(self))
+
+    # Mutations
+
+    def _raw_set(self, key, value) -> None:
+        self._before_change(key)
+        old = dict.get(self, key, MISSING)
+        if value is MISSING:
+            dict.__delitem__(self, key)
+        else:
+            dict.__setitem__(self, key, value)
+        if self._indexes:
+            self._reindex(key, old, value)
+        self._notify_table(key)
+        self._touch()
+
+    def _raw_replace(self, items: Dict) -> None:
+        for key in (set(dict.keys(self)) | set(items)) if self._location is None else (None,):
+            self._before_change(key)
+        dict.clear(self)
+        dict.update(self, items)
+        self._indexes = None
+        for key in items:
+            self._notify_table(key)
+        self._touch()
+
+    def _undo(self, op: str, key, old, new) -> None:
+        if op == 'replace':
+            self._raw_replace(old)
+        else:
+            self._raw_set(key, old)
+
+    def __setitem__(self, key, value):
+        with self._store.lock:
+            old = dict.get(self, key, MISSING)
+            self._raw_set(key, value)
+            self._store.record(self, 'set', key, old, value)
+
+    def __delitem__(self, key):
+        with self._store.lock:
+            old = dict.__getitem__(self, key)
+            self._raw_set(key, MISSING)
+            self._store.record(self, 'set', key, old, MISSING)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = dict.__getitem__(self, key)
+        del self[key]
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): dictionary is empty')
+        key = next(reversed(dict.keys(self)))
+        return key, self.pop(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        with self._store.lock:
+            old = self.copy()
+            self._raw_replace({})
+            self._store.record(self, 'replace', None, old, {})
+
+
+class TrackedList(_TrackedMixin, list):
+    """A list that reports every mutation to its ContextStore."""
+
+    __slots__ = ('_store', '_location', '_indexes', 'primary_key')
+
+    def __init__(self, data: Iterable, store: 'ContextStore', location: Optional[Tuple]):
+        list.__init__(self, data)
+        self._store = store
+        self._location = location
+        self._indexes: Optional[Dict[Tuple[str, bool], Dict[Any, List]]] = None
+        # Only top-level tables address their records by primary key, which is indexed up front
+        self.primary_key = infer_primary_key(list.__iter__(self)) if self._is_table() else None
+        if self.primary_key:
+            self._indexes = {(self.primary_key, False): self._build_index(self.primary_key, False)}
+
+    def _record_items(self):
+        return enumerate(list.__iter__(self))
+
+    def _tracked_items(self):
+        return enumerate(self)
+
+    def __reduce_ex__(self, protocol):
+        return (list, (to_plain(self),))
+
+    def _record_key(self, index, value):
+        if self.primary_key and isinstance(value, dict) and self.primary_key in value:
+            return dict.__getitem__(value, self.primary_key)
+        return f"#{index}"
+
+    def _index(self, index: int) -> int:
+        size = list.__len__(self)
+        normalized = index + size if index < 0 else index
+        if not 0 <= normalized < size:
+            raise IndexError('list index out of range')
+        return normalized
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self._index(index)
+        value = list.__getitem__(self, index)
+        wrapped = self._wrap(index, value)
+        if wrapped is not value:
+            list.__setitem__(self, index, wrapped)
+        return wrapped
+
+    def __iter__(self):
+        index = 0
+        while index < list.__len__(self):
+            yield self[index]
+            index += 1
+
+    def copy(self) -> list:
+        return list(list.__iter__(self))
+
+    # Mutations
+
+    # Index entries are positions: appends and pops at the end keep them valid,
+    # anything that shifts records drops the indexes so they are rebuilt on next use
+
+    def _raw_insert(self, index: int, values: List) -> None:
+        self._before_change()
+        appending = index == list.__len__(self)
+        list.__setitem__(self, slice(index, index), values)
+        if self._indexes and appending:
+            for offset, value in enumerate(values):
+                self._reindex(index + offset, MISSING, value)
+        elif self._indexes:
+            self._indexes = None
+        self._touch()
+
+    def _raw_delete(self, index: int, count: int = 1) -> None:
+        self._before_change()
+        if self._indexes and index + count == list.__len__(self):
+            for offset in range(count):
+                self._reindex(index + offset, list.__getitem__(self, index + offset), MISSING)
+        elif self._indexes:
+            self._indexes = None
+        list.__delitem__(self, slice(index, index + count))
+        self._touch()
+
+    def _raw_set(self, index: int, value) -> None:
+        self._before_change()
+        old = list.__getitem__(self, index)
+        list.__setitem__(self, index, value)
+        if self._indexes:
+            self._reindex(index, old, value)
+        self._touch()
+
+    def _raw_replace(self, values: List) -> None:
+        self._before_change()
+        list.__setitem__(self, slice(None), values)
+        self._indexes = None
+        self._touch()
+
+    def _undo(self, op: str, index, old, new) -> None:
+        if op == 'insert':
+            self._raw_delete(index, len(new))
+        elif op == 'delete':
+            self._raw_insert(index, [old])
+        elif op == 'set':
+            self._raw_set(index, old)
+        else:
+            self._raw_replace(old)
+
+    def _record_inserts(self, index: int, values: List) -> None:
+        # One journal entry per inserted item so diffs can address each record
+        for offset, value in enumerate(values):
+            self._store.record(self, 'insert', index + offset, MISSING, [value])
+
+    def append(self, value):
+        with self._store.lock:
+            index = list.__len__(self)
+            self._raw_insert(index, [value])
+            self._record_inserts(index, [value])
+
+    def extend(self, values):
+        values = list(values)
+        with self._store.lock:
+            index = list.__len__(self)
+            self._raw_insert(index, values)
+            self._record_inserts(index, values)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def insert(self, index, value):
+        with self._store.lock:
+            size = list.__len__(self)
+            index = max(0, index + size) if index < 0 else min(index, size)
+            self._raw_insert(index, [value])
+            self._record_inserts(index, [value])
+
+    def pop(self, index=-1):
+        with self._store.lock:
+            if not list.__len__(self):
+                raise IndexError('pop from empty list')
+            index = self._index(index)
+            value = list.__getitem__(self, index)
+            self._raw_delete(index)
+            self._store.record(self, 'delete', index, value, MISSING)
+        return value
+
+    def remove(self, value):
+        with self._store.lock:
+            self.pop(list.index(self, value))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            updated = self.copy()
+            updated[index] = value
+            self._replace(updated)
+            return
+        with self._store.lock:
+            index = self._index(index)
+            old = list.__getitem__(self, index)
+            self._raw_set(index, value)
+            self._store.record(self, 'set', index, old, value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            updated = self.copy()
+            del updated[index]
+            self._replace(updated)
+            return
+        self.pop(index)
+
+    def _replace(self, values: List) -> None:
+        with self._store.lock:
+            old = self.copy()
+            self._raw_replace(values)
+            self._store.record(self, 'replace', None, old, list(values))
+
+    def clear(self):
+        self._replace([])
+
+    def sort(self, *, key=None, reverse=False):
+        self._replace(sorted(self.copy(), key=key, reverse=reverse))
+
+    def reverse(self):
+        self._replace(self.copy()[::-1])
+
+    def __imul__(self, count):
+        self._replace(self.copy() * count)
+        return self
+
+
+def _copy_shared(table: Any, preserved: Dict[Any, Any]) -> Any:
+    """Copy a table a fork shared with its parent, as it was when the fork was created.
+
+    `preserved` holds the records the parent has changed since, as they were before.
+    Plain records are shared rather than copied: the context only ever changes tracked
+    copies of them in place, so only the parent's tracked records are deep-copied.
+    """
+    if getattr(table, 'lazy', False) or not isinstance(table, (dict, list)):
+        return to_plain(table)
+    if isinstance(table, dict):
+        copied = dict(dict.items(table))
+        for key, value in preserved.items():
+            if value is MISSING:
+                copied.pop(key, None)
+            else:
+                copied[key] = value
+        items = list(copied.items())
+    else:
+        copied = list(list.__iter__(table))
+        for index, value in preserved.items():
+            copied[index] = value
+        items = list(enumerate(copied))
+    for key, value in items:
+        if isinstance(value, _TrackedMixin):
+            copied[key] = to_plain(value)
+    return copied
+
+
+# The store whose view of the data tool calls on this thread should see (see ContextStore.activate)
+_ACTIVE_STORE: ContextVar[Optional['ContextStore']] = ContextVar('active_context_store', default=None)
+
+
+class ContextRoot(TrackedDict):
+    """The top-level tables of a ContextStore.
+
+    While a fork of the store is active on the current thread, every access is routed
+    to the fork's tables, so code that reaches the context through a shared reference
+    (such as st.session_state.context) sees the isolated fork. A fork's own tables are
+    copied from its parent the first time they are accessed, and tables that are still
+    lazy placeholders (values with a true `lazy` attribute) are loaded the same way.
+    """
+
+    __slots__ = ()
+
+    def _target(self) -> Optional['ContextRoot']:
+        active = _ACTIVE_STORE.get()
+        if active is not None and active.parent is self._store:
+            return active.data
+        return None
+
+    def _materialize(self, key) -> None:
+        pending = self._store.pending_tables
+        if key in pending:
+            with self._store.parent.lock:
+                shared = dict.__getitem__(self, key)
+                preserved = self._store._preserved.pop(key, {})
+                # External tables copy themselves without loading every record
+                if hasattr(shared, 'fork_copy'):
+                    dict.__setitem__(self, key, shared.fork_copy(self._store))
+                else:
+                    dict.__setitem__(self, key, _copy_shared(shared, preserved))
+            pending.discard(key)
+        elif getattr(dict.get(self, key), 'lazy', False):
+            # Large tables streamed from the data file are parsed on first access
+            with self._store.lock:
+                value = dict.get(self, key)
+                if getattr(value, 'lazy', False):
+                    dict.__setitem__(self, key, value.load())
+
+    def __getitem__(self, key):
+        target = self._target()
+        if target is not None:
+            return target[key]
+        self._materialize(key)
+        return TrackedDict.__getitem__(self, key)
+
+    def _raw_set(self, key, value) -> None:
+        self._store.pending_tables.discard(key)
+        TrackedDict._raw_set(self, key, value)
+        self._store.table_changed(key, None)
+
+    def _raw_replace(self, items: Dict) -> None:
+        changed = set(dict.keys(self)) | set(items)
+        TrackedDict._raw_replace(self, items)
+        for key in changed:
+            self._store.table_changed(key, None)
+
+    def pop(self, key, *default):
+        target = self._target()
+        if target is not None:
+            return target.pop(key, *default)
+        self._materialize(key)
+        return TrackedDict.pop(self, key, *default)
+
+
+def _routed(name: str):
+    base = getattr(TrackedDict, name)
+
+    def method(self, *args, **kwargs):
+        target = self._target()
+        if target is not None:
+            return getattr(target, name)(*args, **kwargs)
+        return base(self, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+for _name in ('__setitem__', '__delitem__', '__contains__', '__iter__', '__len__', 'keys',
+              'get', 'values', 'items', 'setdefault', 'update', 'clear', 'copy'):
+    setattr(ContextRoot, _name, _routed(_name))
+
+
+# The transaction open on this thread, which collects the journal entries it makes
+_ACTIVE_TRANSACTION: ContextVar[Optional['Transaction']] = ContextVar('active_transaction', default=None)
+
+
+class Transaction:
+    """A group of context mutations that can be rolled back as a unit.
+
+    The transaction keeps the journal entries made on its own thread, so other writers
+    can keep changing the store while it is open and a rollback undoes only its entries.
+    """
+
+    def __init__(self, store: 'ContextStore'):
+        self.store = store
+        self.mark = store.snapshot()
+        self.entries: List[Tuple] = []
+        self.rolled_back = False
+
+    def rollback(self) -> int:
+        """Undo every mutation made in the transaction. Returns how many were undone."""
+        undone = self.store._undo_entries(self.mark, self.entries)
+        self.entries = []
+        self.rolled_back = True
+        return undone
+
+    def changes(self) -> List[Dict[str, Any]]:
+        return self.store._summarize(list(self.entries))
+
+
+def _inverse(op: str, key, old, new) -> Tuple:
+    # The journal entry of the mutation that undoes (op, key, old, new)
+    if op == 'insert':
+        return 'delete', key, new[0], MISSING
+    if op == 'delete':
+        return 'insert', key, MISSING, [old]
+    return op, key, new, old
+
+
+# Most recent mutation events kept in memory by each store
+MAX_EVENTS = 100000
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class EventLog:
+    """Append-only log of context mutation events, for auditing and replay.
+
+    Each event records the table, record key, field, operation, old and new value, the
+    run that made it and whether it undid an earlier change. Values are kept by
+    reference rather than copied (see _event_value). Only the most recent `max_events`
+    events are kept.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self._events = deque(maxlen=max_events)
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            event['seq'] = self._next_seq
+            self._next_seq += 1
+            self._events.append(event)
+        return event
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still kept."""
+        with self._lock:
+            return self._events[0]['seq'] if self._events else self._next_seq
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def events(self, since: int = 0, table: Any = None, run_id: Any = None,
+               limit: int = None) -> List[Dict[str, Any]]:
+        """Return the events from sequence number `since` on, optionally for one table or run.
+
+        With `limit`, only the most recent `limit` matching events are returned; they
+        are found by walking back from the newest event, so the log is never copied.
+        """
+        def matches(event):
+            return ((table is None or event['table'] == table)
+                    and (run_id is None or event['run_id'] == run_id))
+
+        with self._lock:
+            if limit:
+                matching = []
+                for event in reversed(self._events):
+                    if event['seq'] < since or len(matching) >= limit:
+                        break
+                    if matches(event):
+                        matching.append(event)
+                matching.reverse()
+                return matching
+            start = max(0, since - (self._events[0]['seq'] if self._events else self._next_seq))
+            return [event for event in islice(self._events, start, None) if matches(event)]
+
+
+def _event_value(value: Any, copy_tracked: bool = True) -> Any:
+    # Values are logged by reference. Plain values handed to a tracked container are
+    # never changed through the context afterwards (tracked containers wrap shallow
+    # copies of them), so only records and fields that are still tracked are copied;
+    # whole tables (copy_tracked=False) never are.
+    if value is MISSING:
+        return None
+    if isinstance(value, _SCALARS):
+        return value
+    if getattr(value, 'external', False) or getattr(value, 'lazy', False):
+        # Stored or not yet parsed tables are not kept in the log
+        return None
+    if copy_tracked and isinstance(value, (TrackedDict, TrackedList)):
+        return to_plain(value)
+    return value
+
+
+def _resolve_container(data: Any, location: Optional[Tuple]) -> Any:
+    # Find the container a mutation event was made on, by table, record key and path
+    if location is None:
+        return data
+    table_name, record_key, path = location
+    container = data[table_name]
+    if record_key is not None:
+        if isinstance(container, Mapping):
+            container = container[record_key]
+        elif getattr(container, 'external', False):
+            container = container.record(record_key)
+        elif isinstance(record_key, str) and record_key.startswith('#'):
+            container = container[int(record_key[1:])]
+        else:
+            container = find_record(container, container.primary_key, record_key)
+            if container is None:
+                raise KeyError(record_key)
+    for key in path:
+        container = container[key]
+    return container
+
+
+def replay_event(data: Any, event: Dict[str, Any]) -> None:
+    """Apply a logged mutation event to `data` (tables by name, e.g. a store's data).
+
+    Events address list items by position, so a sequence of events replays correctly
+    onto data in the state they were originally made on.
+    """
+    if not event.get('replayable', True):
+        raise ValueError(f"Event {event['seq']} on {event['table']} cannot be replayed")
+    container = _resolve_container(data, event['location'])
+    op, item, new = event['op'], event['item'], copy.deepcopy(event['new'])
+    if isinstance(container, Mapping):
+        if op == 'delete':
+            del container[item]
+        elif op == 'replace':
+            container.clear()
+            container.update(new)
+        else:
+            container[item] = new
+        return
+    if getattr(container, 'external', False) and op != 'replace':
+        # Rows of stored lists are journaled as (row ID, position, position key)
+        item = item[1]
+    if op == 'insert':
+        container.insert(item, new)
+    elif op == 'delete':
+        container.pop(item)
+    elif op == 'replace':
+        container[:] = new
+    else:
+        container[item] = new
+
+
+class ContextStore:
+    """Owns a use case's context and journals every mutation made through it.
+
+    Snapshots are just journal positions, so taking one is O(1) and all unchanged
+    data stays shared. Rolling back replays the inverse of the journaled mutations,
+    which makes reset-to-initial and undo-last-run proportional to the changes made
+    rather than to the size of the data.
+    """
+
+    def __init__(self, data: Mapping, parent: 'ContextStore' = None):
+        self.lock = threading.RLock()
+        self.parent = parent
+        self._journal: List[Tuple] = []
+        self._runs: List[Tuple[str, int]] = []
+        self._listeners: List[Callable[[Any, Any], None]] = []
+        # Every mutation (and rollback) as an event, and a version per table that
+        # increases with every change to it, so views can tell which tables changed
+        self.events = EventLog()
+        self._versions: Dict[Any, int] = {}
+        self._current_run: Optional[str] = None
+        self._run_events: Dict[str, int] = {}
+        self._undone_runs: List[str] = []
+        # Data derived from the tables (e.g. columnar views), kept in sync through listeners
+        self.derived: Dict[Any, Any] = {}
+        self.data = ContextRoot(data, self, None)
+        # Tables of a fork still shared with the parent, copied on first access or
+        # before the parent changes them
+        self.pending_tables = set(data) if parent is not None else set()
+        # Records of pending tables the parent changed since, as they were before
+        self._preserved: Dict[Any, Dict[Any, Any]] = {}
+        self._forks = weakref.WeakSet()
+
+    def fork(self) -> 'ContextStore':
+        """Create an isolated copy-on-write view of the current data.
+
+        Tables are shared with this store until the fork first accesses them, and then
+        only the records this store has changed in place are copied (see _copy_shared).
+        Before this store changes a record of a table a fork still shares, the record is
+        copied for the fork, so the fork keeps seeing the data as it was when it was
+        forked and forking is cheap even for large data. Call release() on the fork
+        once it is no longer used.
+        """
+        with self.lock:
+            fork = ContextStore(dict(dict.items(self.data)), parent=self)
+            self._forks.add(fork)
+            return fork
+
+    def preserve_for_forks(self, table: Any, record_key: Any = None) -> None:
+        """Keep what is about to change in `table` for every live fork that still shares it.
+
+        With a `record_key`, only that record is copied, as it is now, for the forks.
+        Otherwise (or when the record cannot be located) the forks take their own copy
+        of the table.
+        """
+        with self.lock:
+            forks = [fork for fork in self._forks if table in fork.pending_tables]
+            if not forks:
+                return
+            key, value = self._shared_record(table, record_key) if record_key is not None else (None, None)
+            for fork in forks:
+                if key is None:
+                    fork.data._materialize(table)
+                elif key not in fork._preserved.setdefault(table, {}):
+                    fork._preserved[table][key] = to_plain(value) if value is not MISSING else MISSING
+
+    def _shared_record(self, table: Any, record_key: Any) -> Tuple[Any, Any]:
+        # The key (or list position) and current value of a record of one of this store's own tables
+        records = dict.get(self.data, table)
+        if isinstance(records, dict):
+            return record_key, dict.get(records, record_key, MISSING)
+        # Records of lists are located by primary key; positions (#index keys) may be stale
+        if isinstance(records, TrackedList) and records.primary_key:
+            positions = records.find_keys(records.primary_key, record_key)
+            if len(positions) == 1:
+                return positions[0], list.__getitem__(records, positions[0])
+        return None, None
+
+    def release(self) -> None:
+        """Detach a fork from its parent, which then stops copying tables for it."""
+        if self.parent is not None:
+            with self.parent.lock:
+                self.parent._forks.discard(self)
+
+    @contextmanager
+    def activate(self) -> Iterator['ContextStore']:
+        """Route accesses to the parent's data on this thread to this fork's data."""
+        token = _ACTIVE_STORE.set(self)
+        try:
+            yield self
+        finally:
+            _ACTIVE_STORE.reset(token)
+
+    def record(self, container, op: str, key, old, new) -> None:
+        """Append a mutation to the journal and the event log; called by tracked containers."""
+        with self.lock:
+            entry = (container, op, key, old, new)
+            self._journal.append(entry)
+            txn = _ACTIVE_TRANSACTION.get()
+            if txn is not None and txn.store is self:
+                txn.entries.append(entry)
+            self._log_event(container, op, key, old, new)
+
+    def _log_event(self, container, op: str, key, old, new, undo: bool = False) -> None:
+        if op == 'insert':
+            new = new[0]
+        elif op == 'set' and new is MISSING:
+            op = 'delete'
+        table, record_key, field = container.describe(key, new if new is not MISSING else old)
+        location = container._location
+        self.events.append({
+            'time': time.time(),
+            'run_id': self._current_run,
+            'table': table,
+            'key': record_key,
+            'field': field,
+            'op': op,
+            'old': _event_value(old) if location is not None else None,
+            'new': _event_value(new, copy_tracked=location is not None),
+            'undo': undo,
+            'location': location,
+            'item': key,
+            'replayable': location is not None or not (getattr(new, 'external', False) or getattr(new, 'lazy', False))
+        })
+
+    def add_listener(self, listener: Callable[[Any, Any], None], weak: bool = False) -> None:
+        """Call `listener(table, record_key)` after every change to a table, including rollbacks.
+
+        `record_key` is None when the table itself changed (records added, removed,
+        replaced or reordered, or the whole table swapped). With `weak`, a bound method
+        is only weakly referenced and is dropped once its object is garbage collected.
+        """
+        with self.lock:
+            # The list is replaced rather than changed, so notifications can iterate it unlocked
+            self._listeners = self._listeners + [weakref.WeakMethod(listener) if weak else listener]
+
+    def remove_listener(self, listener: Callable[[Any, Any], None]) -> None:
+        """Stop calling a listener added with add_listener."""
+        with self.lock:
+            self._listeners = [
+                entry for entry in self._listeners
+                if entry != listener and not (isinstance(entry, weakref.WeakMethod) and entry() == listener)
+            ]
+
+    def table_changed(self, table: Any, record_key: Any = None) -> None:
+        self._versions[table] = self._versions.get(table, 0) + 1
+        dead = False
+        for entry in self._listeners:
+            listener = entry() if isinstance(entry, weakref.WeakMethod) else entry
+            if listener is None:
+                dead = True
+            else:
+                listener(table, record_key)
+        if dead:
+            with self.lock:
+                self._listeners = [entry for entry in self._listeners
+                                   if not (isinstance(entry, weakref.WeakMethod) and entry() is None)]
+
+    def version(self, table: Any) -> int:
+        """Return a number that increases whenever table `table` changes."""
+        return self._versions.get(table, 0)
+
+    def table(self, name: Any) -> Any:
+        """Return this store's own table `name`, regardless of which fork is active."""
+        with self.lock:
+            self.data._materialize(name)
+            return TrackedDict.__getitem__(self.data, name)
+
+    def head(self, name: Any, limit: int) -> List[Any]:
+        """Return the first `limit` records of table `name`, without loading a lazy or external table."""
+        with self.lock:
+            table = dict.get(self.data, name)
+        if hasattr(table, 'head'):
+            return table.head(limit)
+        if isinstance(table, Mapping):
+            return list(islice(dict.values(table), limit))
+        if isinstance(table, list):
+            return list(islice(list.__iter__(table), limit))
+        return []
+
+    def table_kind(self, name: Any, sample: int = 20) -> Optional[str]:
+        """Return 'dict' or 'list' if table `name` is a table of records (objects), else None.
+
+        Only the first `sample` records are checked, so this is cheap for any table size.
+        """
+        with self.lock:
+            table = dict.get(self.data, name)
+        if hasattr(table, 'head'):
+            # Lazy and external tables know their kind without loading their records
+            kind = table.kind
+        elif isinstance(table, Mapping):
+            kind = 'dict'
+        elif isinstance(table, list):
+            kind = 'list'
+        else:
+            return None
+        records = self.head(name, sample) if kind else []
+        return kind if records and all(isinstance(record, Mapping) for record in records) else None
+
+    def snapshot(self) -> int:
+        """Return a mark that `rollback` and `changes_since` accept."""
+        with self.lock:
+            return len(self._journal)
+
+    def rollback(self, mark: int) -> None:
+        """Undo every mutation recorded after `mark`."""
+        with self.lock:
+            while len(self._journal) > mark:
+                container, op, key, old, new = self._journal.pop()
+                container._undo(op, key, old, new)
+                self._log_undo(container, op, key, old, new)
+            self._runs = [(run_id, run_mark) for run_id, run_mark in self._runs if run_mark <= mark]
+
+    @contextmanager
+    def transaction(self) -> Iterator[Transaction]:
+        """Run a block of mutations atomically: an exception rolls all of them back.
+
+        The store lock is only taken for each mutation, not for the whole block, so a
+        long tool call does not stall other writers or forks copying their tables.
+        """
+        txn = Transaction(self)
+        outer = _ACTIVE_TRANSACTION.get()
+        token = _ACTIVE_TRANSACTION.set(txn)
+        try:
+            yield txn
+        except BaseException:
+            txn.rollback()
+            raise
+        finally:
+            _ACTIVE_TRANSACTION.reset(token)
+            # The changes kept by a nested transaction are part of the enclosing one
+            if outer is not None and outer.store is self:
+                outer.entries.extend(txn.entries)
+
+    def _undo_entries(self, mark: int, entries: List[Tuple]) -> int:
+        with self.lock:
+            if len(self._journal) - mark == len(entries) and all(
+                    a is b for a, b in zip(self._journal[mark:], entries)):
+                # Nothing else was written meanwhile, so the journal can just be truncated
+                self.rollback(mark)
+                return len(entries)
+            # Other writers' entries follow the mark; undo just these (unless a rollback
+            # already did) as new journal entries, so marks taken since stay valid
+            live = {id(entry) for entry in self._journal[mark:]}
+            undone = 0
+            for entry in reversed(entries):
+                if id(entry) not in live:
+                    continue
+                container, op, key, old, new = entry
+                container._undo(op, key, old, new)
+                self._log_undo(container, op, key, old, new)
+                self._journal.append((container, *_inverse(op, key, old, new)))
+                undone += 1
+            return undone
+
+    def _log_undo(self, container, op: str, key, old, new) -> None:
+        # Log a rollback as the inverse mutation
+        if op == 'insert':
+            self._log_event(container, 'delete', key, new[0], MISSING, undo=True)
+        elif op == 'delete':
+            self._log_event(container, 'insert', key, MISSING, [old], undo=True)
+        else:
+            self._log_event(container, op, key, new, old, undo=True)
+
+    def reset(self) -> None:
+        """Restore the data as it was when the store was created."""
+        self.rollback(0)
+
+    def begin_run(self, run_id: str) -> int:
+        """Remember where a run starts so it can be diffed and undone later.
+
+        Changes are attributed to the run in the event log until end_run().
+        """
+        with self.lock:
+            mark = len(self._journal)
+            self._runs.append((run_id, mark))
+            self._current_run = run_id
+            self._run_events[run_id] = self.events.first_seq + len(self.events)
+            self._undone_runs = []
+            return mark
+
+    def end_run(self) -> None:
+        """Stop attributing changes to the current run."""
+        with self.lock:
+            self._current_run = None
+
+    @property
+    def last_run(self) -> Optional[str]:
+        with self.lock:
+            return self._runs[-1][0] if self._runs else None
+
+    def undo_last_run(self) -> Optional[str]:
+        """Roll back the most recent run (and anything after it). Returns its run ID."""
+        with self.lock:
+            if not self._runs:
+                return None
+            run_id, mark = self._runs[-1]
+            self.rollback(mark)
+            self._undone_runs.append(run_id)
+            return run_id
+
+    @property
+    def undone_run(self) -> Optional[str]:
+        """The most recently undone run that can still be replayed, if any."""
+        with self.lock:
+            return self._undone_runs[-1] if self._undone_runs else None
+
+    def run_events(self, run_id: str) -> List[Dict[str, Any]]:
+        """Return the changes a run made, in order, without the rollbacks of them."""
+        with self.lock:
+            return [event for event in self.events.events(run_id=run_id) if not event['undo']]
+
+    def replay_run(self, run_id: str) -> int:
+        """Apply the changes of an undone run again, as a new undoable run.
+
+        The events are replayed in one transaction, so the run is redone completely or
+        not at all. Returns how many changes were replayed.
+        """
+        with self.lock:
+            if self._run_events.get(run_id, -1) < self.events.first_seq:
+                raise ValueError(f"The changes of run {run_id} are no longer in the event log")
+            events = self.run_events(run_id)
+            runs, undone = list(self._runs), list(self._undone_runs)
+            self.begin_run(f"{run_id}-replay")
+            try:
+                with self.transaction():
+                    for event in events:
+                        replay_event(self.data, event)
+            except BaseException:
+                # Nothing was applied, so the run can still be replayed later
+                self._runs, self._undone_runs = runs, undone
+                raise
+            finally:
+                self.end_run()
+            self._undone_runs = [undone_run for undone_run in undone if undone_run != run_id]
+            return len(events)
+
+    def replace_data(self, data: Mapping) -> None:
+        """Swap in new tables (e.g. generated data) as journaled, undoable mutations."""
+        with self.lock:
+            for key in [k for k in self.data if k not in data]:
+                del self.data[key]
+            for key, value in data.items():
+                self.data[key] = value
+
+    def changes_since(self, mark: int) -> List[Dict[str, Any]]:
+        """Summarize the mutations recorded after `mark`, one row per changed value."""
+        with self.lock:
+            entries = self._journal[mark:]
+        return self._summarize(entries)
+
+    def _summarize(self, entries: List[Tuple]) -> List[Dict[str, Any]]:
+        changes: Dict[Tuple, Dict[str, Any]] = {}
+        for container, op, key, old, new in entries:
+            if op == 'insert':
+                old, new = MISSING, new[0]
+            value = new if new is not MISSING else old
+            table, record_key, field = container.describe(key, value)
+            # Positional paths are only comparable within the same container
+            change = changes.setdefault((id(container), table, record_key, field), {
+                'table': table, 'key': record_key, 'field': field, 'old': old
+            })
+            change['new'] = new
+
+        summary = []
+        for change in changes.values():
+            old, new = change['old'], change['new']
+            if old is MISSING and new is MISSING or old == new:
+                continue
+            change['change'] = 'added' if old is MISSING else 'removed' if new is MISSING else 'modified'
+            change['old'] = None if old is MISSING else to_plain(old)
+            change['new'] = None if new is MISSING else to_plain(new)
+            summary.append(change)
+        return summary
@@ -1,8 +1,20 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+import numpy as np
 from openai import AzureOpenAI
 import streamlit as st
+from context_store import to_plain
+from integrity import check_integrity
+from schema import infer_schema, describe_schema, merge_rows, generation_levels
+from synthetic_data import SPEC_FORMAT, infer_specs, merge_specs, specs_signature, synthesize
+
+# Upper bound on concurrent per-table generation requests
+GENERATION_WORKERS = 8
+# Model-written generator specs, cached in each use case directory
+GENERATOR_SPEC_FILE = "generator_spec.json"
 
 class DataGenerator:
     def __init__(self, client: AzureOpenAI):
@@ -12,44 +24,184 @@ class DataGenerator:
         """Generate more data using OpenAI for all tables in a single call."""
         try:
             from prompts import DATA_GENERATION_PROMPT
-            
+
             prompt = DATA_GENERATION_PROMPT.format(
                 num_items=num_items,
-                data=json.dumps(data, indent=2)
+                data=json.dumps(data, indent=2, default=to_plain)
             )
 
             response = self.client.chat.completions.create(
                 model=self.client.deployment_name,
                 messages=[
                     {
-                        "role": "system", 
+                        "role": "system",
                         "content": "You are a helpful assistant that generates realistic data. Only respond with valid JSON data that follows the exact same structure as the input."
                     },
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7
             )
-            
+
             # Parse the generated data
             generated_data = json.loads(response.choices[0].message.content)
-            
+
             # Ensure we have all the original keys
             for key in data:
                 if key not in generated_data:
                     generated_data[key] = data[key]
-            
+
             # Update session state context instead of file
-            st.session_state.context = generated_data
-            
+            self.update_session_state(generated_data)
+
             return generated_data
-            
+
+        except Exception as e:
+            st.error(f"Error generating data: {str(e)}")
+            return None
+
+    def generate_new_rows(self, data: Dict[str, Any], num_items: int) -> Dict[str, Any]:
+        """Generate only new rows per record table and merge them into the data.
+
+        Each table (or group of tables referencing each other) gets its own request
+        with a compact description of the table: examples, latest keys and the keys of
+        the tables it references. Tables that do not depend on each other are requested
+        concurrently; tables they reference are generated and merged first so their new
+        keys can be used. Rows that reuse a key or reference a missing record are
+        rejected. Returns a report of the added and rejected rows.
+        """
+        try:
+            schema = infer_schema(data)
+            report = {'added': {}, 'rejected': []}
+            for level in generation_levels(schema):
+                prompts = [self.new_rows_prompt(data, schema, tables, num_items) for tables in level]
+                rows: Dict[str, Any] = {}
+                with ThreadPoolExecutor(max_workers=min(len(level), GENERATION_WORKERS)) as pool:
+                    futures = [pool.submit(self.request_rows, prompt) for prompt in prompts]
+                    for tables, future in zip(level, futures):
+                        try:
+                            reply = future.result()
+                        except Exception as e:
+                            report['rejected'].extend({'table': name, 'key': None, 'reason': f"generation failed: {str(e)}"}
+                                                      for name in tables)
+                            continue
+                        rows.update({name: reply[name] for name in tables if name in reply})
+
+                accepted, rejected = merge_rows(data, schema, rows, limit=num_items)
+                self.add_rows(data, schema, accepted)
+                for table, pairs in accepted.items():
+                    report['added'][table] = [key for key, _ in pairs]
+                report['rejected'].extend(rejected)
+            return report
+
         except Exception as e:
             st.error(f"Error generating data: {str(e)}")
             return None
 
+    def new_rows_prompt(self, data: Dict[str, Any], schema: Dict[str, Dict[str, Any]],
+                        tables: List[str], num_items: int) -> str:
+        """Build the request for new rows of `tables`."""
+        from prompts import DELTA_DATA_GENERATION_PROMPT
+
+        return DELTA_DATA_GENERATION_PROMPT.format(
+            num_items=num_items,
+            schema=json.dumps(describe_schema(data, schema, tables), indent=2)
+        )
+
+    def request_rows(self, prompt: str,
+                     system: str = "You are a helpful assistant that generates realistic data. Only respond with valid JSON containing the new records.") -> Dict[str, Any]:
+        """Ask the model for a JSON object (new rows by default). Safe to call from worker threads."""
+        response = self.client.chat.completions.create(
+            model=self.client.deployment_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system
+                },
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.7
+        )
+        return json.loads(response.choices[0].message.content)
+
+    def generate_sampled_rows(self, data: Dict[str, Any], num_items: int, spec_path: Path,
+                              seed: int = None) -> Dict[str, Any]:
+        """Add `num_items` rows per record table, sampled locally from model-written specs.
+
+        The model is asked once for the distributions, vocabularies and correlations of
+        each table; the specs are cached in `spec_path` and reused until the tables'
+        fields change, so any number of rows costs at most one call. Rows go through
+        the same key and reference checks as model-written rows. Returns a report of
+        the added and rejected rows and the seed they were sampled with.
+        """
+        try:
+            specs = self.distribution_specs(data, spec_path)
+            if seed is None:
+                seed = int(np.random.SeedSequence().entropy % (1 << 32))
+            sampled = synthesize(data, num_items, seed=seed, specs=specs, keep_existing=False)
+            schema = infer_schema(data)
+            accepted, rejected = merge_rows(data, schema, {name: sampled[name] for name in specs})
+            self.add_rows(data, schema, accepted)
+            return {
+                'added': {table: [key for key, _ in pairs] for table, pairs in accepted.items()},
+                'rejected': rejected,
+                'seed': seed
+            }
+
+        except Exception as e:
+            st.error(f"Error generating data: {str(e)}")
+            return None
+
+    def distribution_specs(self, data: Dict[str, Any], spec_path: Path) -> Dict[str, Dict[str, Any]]:
+        """Return generator specs for the record tables, asking the model only when not cached."""
+        from prompts import DISTRIBUTION_SPEC_PROMPT
+
+        inferred = infer_specs(data)
+        signature = specs_signature(inferred)
+        spec_path = Path(spec_path)
+        if spec_path.exists():
+            with open(spec_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('signature') == signature:
+                return merge_specs(cached.get('tables'), inferred)
+
+        schema = infer_schema(data)
+        examples = describe_schema(data, schema)['tables']
+        tables = {
+            name: {'examples': examples[name]['examples'], 'inferred_spec': spec['fields']}
+            for name, spec in inferred.items()
+        }
+        proposed = self.request_rows(
+            DISTRIBUTION_SPEC_PROMPT.format(spec_format=SPEC_FORMAT, tables=json.dumps(tables, indent=2)),
+            system="You are a helpful assistant that models realistic data. Only respond with valid JSON generator specs."
+        )
+        with open(spec_path, 'w') as f:
+            json.dump({'signature': signature, 'tables': proposed}, f, indent=2)
+        return merge_specs(proposed, inferred)
+
+    def add_rows(self, data: Dict[str, Any], schema: Dict[str, Dict[str, Any]],
+                 rows: Dict[str, List[Tuple[Any, Any]]]) -> None:
+        """Add validated rows to their tables, as one undoable change."""
+        store = st.session_state.get('context_store')
+        with store.transaction() if store is not None else nullcontext():
+            for table, pairs in rows.items():
+                target = data[table]
+                for key, record in pairs:
+                    if schema[table]['kind'] == 'dict':
+                        target[key] = record
+                    else:
+                        target.append(record)
+        st.session_state.integrity_report = check_integrity(data)
+
     def update_session_state(self, data: Dict[str, Any]) -> None:
         """Update the session state with new data."""
         try:
-            st.session_state.context = data
+            store = st.session_state.get('context_store')
+            if store is not None:
+                # Swap the tables in place so the change can be undone like any other
+                store.replace_data(data)
+            else:
+                st.session_state.context = data
+            st.session_state.integrity_report = check_integrity(st.session_state.context)
         except Exception as e:
-            st.error(f"Error updating session state: {str(e)}")
\ No newline at end of file
+            st.error(f"Error updating session state: {str(e)}")
@@ -0,0 +1,527 @@
+import gc
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+import uuid
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Tables larger than this (in bytes of JSON) are parsed on first access rather than up front
+LAZY_TABLE_BYTES = 1 << 20
+TEMPLATE_SAMPLE_RECORDS = 10
+
+_CACHE_MAGIC = b'AGDCACHE2'
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(rb'[^,\]}\s]+')
+# Strings are matched whole so that brackets inside them are skipped
+_STRUCTURE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+_OPENERS = (ord('{'), ord('['))
+_CLOSERS = (ord('}'), ord(']'))
+# Bracket depth change per byte value, used to scan the file with NumPy
+_DEPTH_DELTA = np.zeros(256, dtype=np.int8)
+_DEPTH_DELTA[list(_OPENERS)] = 1
+_DEPTH_DELTA[list(_CLOSERS)] = -1
+_SCAN_CHUNK = 1 << 24
+_DECODER = json.JSONDecoder()
+
+
+class DataFileChanged(RuntimeError):
+    """The data file changed on disk after it was indexed, so its offsets no longer apply."""
+
+
+def source_signature(path: Path) -> str:
+    """Identify a data.json revision by its size and modification time."""
+    stat = Path(path).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _skip_whitespace(buffer, pos: int) -> int:
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def _value_end(buffer, start: int) -> int:
+    """Return the offset just past the JSON value that starts at `start`."""
+    first = buffer[start]
+    if first in _OPENERS:
+        depth = 0
+        for match in _STRUCTURE.finditer(buffer, start):
+            char = buffer[match.start()]
+            if char in _OPENERS:
+                depth += 1
+            elif char in _CLOSERS:
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+        raise ValueError(f"Unterminated JSON value starting at byte {start}")
+    match = (_STRING if first == ord('"') else _SCALAR).match(buffer, start)
+    if match is None:
+        raise ValueError(f"Invalid JSON value at byte {start}")
+    return match.end()
+
+
+def iter_members(buffer, start: int) -> Iterator[Tuple[Optional[str], int, int]]:
+    """Yield (key, start, end) byte spans of the members of the object or array at `start`.
+
+    Only the structure is scanned (strings are skipped with a regex), so large values
+    can be located without parsing them. Keys are None for array items.
+    """
+    is_object = buffer[start] == ord('{')
+    if buffer[start] not in _OPENERS:
+        raise ValueError(f"Expected a JSON object or array at byte {start}")
+    pos = _skip_whitespace(buffer, start + 1)
+    if buffer[pos] in _CLOSERS:
+        return
+    while True:
+        key = None
+        if is_object:
+            match = _STRING.match(buffer, pos)
+            if match is None:
+                raise ValueError(f"Expected a key at byte {pos}")
+            key = json.loads(match.group())
+            pos = _skip_whitespace(buffer, match.end())
+            if buffer[pos] != ord(':'):
+                raise ValueError(f"Expected ':' at byte {pos}")
+            pos = _skip_whitespace(buffer, pos + 1)
+        end = _value_end(buffer, pos)
+        yield key, pos, end
+        pos = _skip_whitespace(buffer, end)
+        if buffer[pos] == ord(','):
+            pos = _skip_whitespace(buffer, pos + 1)
+        elif buffer[pos] in _CLOSERS:
+            return
+        else:
+            raise ValueError(f"Expected ',' or a closing bracket at byte {pos}")
+
+
+def _loads(raw) -> Any:
+    """json.loads for UTF-8 bytes, without its per-call encoding detection."""
+    return _DECODER.decode(raw.decode('utf-8'))
+
+
+def _key(raw) -> str:
+    # Most keys have no escapes and need no JSON decoding
+    return raw[1:-1].decode('utf-8') if b'\\' not in raw else _loads(raw)
+
+
+def _is_escaped(data: np.ndarray, pos: int) -> bool:
+    backslashes = 0
+    while pos - backslashes > 0 and data[pos - backslashes - 1] == ord('\\'):
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _root_separators(buffer, start: int) -> List[int]:
+    """Return the offsets of the commas and the closing bracket of the container at `start`.
+
+    The file is scanned in chunks with vectorized NumPy operations: quotes are located
+    to mask out strings, and the bracket depth at every comma is a cumulative sum.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    separators: List[int] = []
+    depth = 0
+    quote_count = 0
+    for offset in range(start, len(data), _SCAN_CHUNK):
+        chunk = data[offset:offset + _SCAN_CHUNK]
+        quotes = np.flatnonzero(chunk == ord('"')) + offset
+        maybe_escaped = quotes[(quotes > 0) & (data[np.maximum(quotes - 1, 0)] == ord('\\'))]
+        if len(maybe_escaped):
+            escaped = [pos for pos in maybe_escaped.tolist() if _is_escaped(data, pos)]
+            quotes = np.setdiff1d(quotes, escaped, assume_unique=True)
+        deltas = _DEPTH_DELTA[chunk]
+        tokens = np.flatnonzero((deltas != 0) | (chunk == ord(','))) + offset
+        # A token is outside strings when an even number of quotes precedes it
+        tokens = tokens[(quote_count + np.searchsorted(quotes, tokens)) % 2 == 0]
+        depths = depth + np.cumsum(deltas[tokens - offset], dtype=np.int64)
+        commas = data[tokens] == ord(',')
+        ends = tokens[(commas & (depths == 1)) | (~commas & (depths == 0))]
+        separators.extend(ends.tolist())
+        if len(depths):
+            depth = int(depths[-1])
+        quote_count += len(quotes)
+        if depth <= 0 and separators:
+            break
+    for i, pos in enumerate(separators):
+        if data[pos] != ord(','):
+            return separators[:i + 1]
+    raise ValueError(f"Unterminated JSON value starting at byte {start}")
+
+
+def _container_members(buffer, start: int) -> Iterator[Tuple[Optional[str], int, int]]:
+    """Yield (key, start, end) byte spans of the members of the container at `start`.
+
+    Like iter_members, but the separators are located with the vectorized scan, which
+    is much faster for containers with many members. Keys are None for array items.
+    """
+    is_object = buffer[start] == ord('{')
+    member_start = start + 1
+    for separator in _root_separators(buffer, start):
+        pos = _skip_whitespace(buffer, member_start)
+        member_start = separator + 1
+        if pos == separator:
+            continue
+        key = None
+        if is_object:
+            match = _STRING.match(buffer, pos)
+            if match is None:
+                raise ValueError(f"Expected a key at byte {pos}")
+            key = _key(match.group())
+            pos = _skip_whitespace(buffer, match.end())
+            if buffer[pos] != ord(':'):
+                raise ValueError(f"Expected ':' at byte {pos}")
+            pos = _skip_whitespace(buffer, pos + 1)
+        end = separator
+        while end > pos and buffer[end - 1] in b' \t\r\n':
+            end -= 1
+        yield key, pos, end
+
+
+def iter_root_members(buffer) -> Iterator[Tuple[str, int, int]]:
+    """Yield (name, start, end) byte spans of the tables of a JSON object file."""
+    root = _skip_whitespace(buffer, 0)
+    if buffer[root] != ord('{'):
+        raise ValueError("The data file must contain a JSON object of tables")
+    return _container_members(buffer, root)
+
+
+def _record_kind(buffer, start: int) -> Optional[str]:
+    """Return 'dict' or 'list' if the table at `start` is a container of records, else None."""
+    if buffer[start] not in _OPENERS:
+        return None
+    first = next(iter_members(buffer, start), None)
+    if first is None or buffer[first[1]] not in _OPENERS:
+        return None
+    return 'dict' if buffer[start] == ord('{') else 'list'
+
+
+def _parse(raw, loads=json.loads) -> Any:
+    # Parsing creates a container per record; pausing the cyclic GC avoids repeated scans of them
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return loads(raw)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _map_file(path: Path) -> mmap.mmap:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class LazyTable:
+    """Placeholder for a table that is parsed the first time the context reaches it."""
+
+    lazy = True
+    __slots__ = ('source', 'name')
+
+    def __init__(self, source: 'DataFile', name: str):
+        self.source = source
+        self.name = name
+
+    def __repr__(self):
+        return f"<LazyTable {self.name!r}>"
+
+    @property
+    def kind(self) -> Optional[str]:
+        return self.source.record_kind(self.name)
+
+    def head(self, limit: int) -> List[Any]:
+        """Return the first `limit` records of a table of records, parsing only those."""
+        if self.kind is None:
+            return []
+        return [record for _, record in islice(self.source.iter_records(self.name), limit)]
+
+    def record_count(self) -> int:
+        """Return the number of records of a table of records, without parsing them."""
+        return self.source.record_count(self.name)
+
+    def page(self, offset: int, limit: int) -> Any:
+        """Return `limit` records from position `offset` on, shaped like the table (see SqliteTable.page)."""
+        records = self.source.iter_records(self.name, offset, offset + limit)
+        if self.kind == 'dict':
+            return dict(records)
+        return [record for _, record in records]
+
+    def load(self) -> Any:
+        return self.source.read(self.name)
+
+    def to_plain(self) -> Any:
+        return self.load()
+
+
+class DataFile:
+    """The top-level tables of a JSON data file, indexed once and loaded one at a time.
+
+    The file is memory-mapped and scanned for the byte span of each table, so loading
+    never holds more than one parsed table besides the result. Tables of records (a
+    JSON object or array whose members are objects or arrays) can also be streamed
+    record by record with iter_records, parsing one record at a time.
+
+    With a cache directory, the tables are also written to a binary cache that is
+    memory-mapped on later loads and rebuilt whenever the data file changes. Every
+    record is pickled on its own, with an index of the record keys and byte offsets
+    per table, so read_record unpickles a single record and iter_records streams a
+    table without unpickling it whole. Other tables are pickled as one value.
+    """
+
+    def __init__(self, path: Path, cache_dir: Optional[str] = None):
+        self.path = Path(path)
+        self.signature = source_signature(self.path)
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        # Per table: 'dict' or 'list' for tables of records, None otherwise
+        self._kinds: Dict[str, Optional[str]] = {}
+        # Cached tables of records: the byte span of their index of keys and offsets
+        self._index_spans: Dict[str, Tuple[int, int]] = {}
+        self._indexes: Dict[str, Tuple[Optional[List[str]], List[int], List[int], Dict[Any, int]]] = {}
+        self._cache: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        if cache_dir:
+            cache_path = Path(cache_dir) / f"{self.path.parent.name}.cache"
+            try:
+                if not self._open_cache(cache_path):
+                    self._build_cache(cache_path)
+                    self._open_cache(cache_path)
+            except (OSError, ValueError, struct.error, pickle.PickleError):
+                # The cache only speeds loading up; fall back to reading the JSON directly
+                self._cache = None
+                self._kinds = {}
+                self._index_spans = {}
+        if self._cache is None:
+            self._index()
+
+    def _index(self) -> None:
+        buffer = _map_file(self.path)
+        try:
+            self._spans = {}
+            for name, start, end in iter_root_members(buffer):
+                self._spans[name] = (start, end)
+                self._kinds[name] = _record_kind(buffer, start)
+        finally:
+            buffer.close()
+
+    def _open_cache(self, cache_path: Path) -> bool:
+        if not cache_path.exists():
+            return False
+        buffer = _map_file(cache_path)
+        header_offset = struct.unpack_from('<Q', buffer, len(_CACHE_MAGIC))[0]
+        if buffer[:len(_CACHE_MAGIC)] != _CACHE_MAGIC or header_offset >= len(buffer):
+            buffer.close()
+            return False
+        header = json.loads(buffer[header_offset:])
+        if header['signature'] != self.signature:
+            buffer.close()
+            return False
+        for name, kind, offset, length, index_offset, index_length in header['tables']:
+            self._spans[name] = (offset, offset + length)
+            self._kinds[name] = kind
+            if kind is not None:
+                self._index_spans[name] = (index_offset, index_offset + index_length)
+        self._cache = buffer
+        return True
+
+    def _build_cache(self, cache_path: Path) -> None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        buffer = _map_file(self.path)
+        try:
+            with open(temp_path, 'wb') as out:
+                out.write(_CACHE_MAGIC + struct.pack('<Q', 0))
+                tables = []
+                for name, start, end in iter_root_members(buffer):
+                    kind = _record_kind(buffer, start)
+                    offset = out.tell()
+                    if kind is None:
+                        pickle.dump(_parse(buffer[start:end]), out, protocol=pickle.HIGHEST_PROTOCOL)
+                        tables.append([name, None, offset, out.tell() - offset, 0, 0])
+                        continue
+                    # Records are parsed and pickled one at a time, so the table is never held whole
+                    keys, offsets = [], [0]
+                    for key, record_start, record_end in _container_members(buffer, start):
+                        out.write(pickle.dumps(json.loads(buffer[record_start:record_end]),
+                                               protocol=pickle.HIGHEST_PROTOCOL))
+                        keys.append(key)
+                        offsets.append(out.tell() - offset)
+                    length = out.tell() - offset
+                    index = (keys if kind == 'dict' else None, np.array(offsets, dtype=np.int64))
+                    pickle.dump(index, out, protocol=pickle.HIGHEST_PROTOCOL)
+                    tables.append([name, kind, offset, length, offset + length, out.tell() - offset - length])
+                # The header goes last so tables can be written as they are parsed
+                header_offset = out.tell()
+                out.write(json.dumps({'signature': self.signature, 'tables': tables}).encode())
+                out.seek(len(_CACHE_MAGIC))
+                out.write(struct.pack('<Q', header_offset))
+            os.replace(temp_path, cache_path)
+        finally:
+            buffer.close()
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _record_index(self, name: str) -> Tuple[Optional[List[str]], List[int], List[int], Dict[Any, int]]:
+        """Return the keys (None for arrays), record start and end offsets and key positions of a table.
+
+        Offsets point into the cache if there is one and into the data file otherwise, where
+        they are found by scanning the table once.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            if self._cache is not None:
+                start = self._spans[name][0]
+                index_start, index_end = self._index_spans[name]
+                keys, offsets = pickle.loads(self._cache[index_start:index_end])
+                bounds = (offsets + start).tolist()
+                starts, ends = bounds[:-1], bounds[1:]
+            else:
+                buffer = self._open_source()
+                try:
+                    members = list(_container_members(buffer, self._spans[name][0]))
+                finally:
+                    buffer.close()
+                keys = [key for key, _, _ in members] if self._kinds[name] == 'dict' else None
+                starts = [record_start for _, record_start, _ in members]
+                ends = [record_end for _, _, record_end in members]
+            positions = {key: i for i, key in enumerate(keys)} if keys is not None else {}
+            index = self._indexes[name] = (keys, starts, ends, positions)
+        return index
+
+    def _open_source(self) -> mmap.mmap:
+        if source_signature(self.path) != self.signature:
+            raise DataFileChanged(f"{self.path} changed since it was loaded; select the use case again to reload it")
+        return _map_file(self.path)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._spans)
+
+    def size(self, name: str) -> int:
+        """The size of a table in the data file (or cache), in bytes."""
+        start, end = self._spans[name]
+        return end - start
+
+    def record_kind(self, name: str) -> Optional[str]:
+        """Return 'dict' or 'list' for tables of records, which iter_records can stream, else None."""
+        return self._kinds[name]
+
+    def read(self, name: str) -> Any:
+        """Parse one table into fresh plain dicts and lists."""
+        start, end = self._spans[name]
+        if self._cache is not None:
+            if self._kinds[name] is None:
+                return _parse(self._cache[start:end], pickle.loads)
+            records = self.iter_records(name)
+            if self._kinds[name] == 'dict':
+                return _parse(records, dict)
+            return _parse((record for _, record in records), list)
+        with self._lock:
+            buffer = self._open_source()
+            try:
+                return _parse(buffer[start:end])
+            finally:
+                buffer.close()
+
+    def record_count(self, name: str) -> int:
+        """Return the number of records of a table of records, locating them without parsing them."""
+        if self._kinds[name] is None:
+            raise ValueError(f"Table {name} is not a table of records")
+        with self._lock:
+            return len(self._record_index(name)[1])
+
+    def iter_records(self, name: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+        """Yield the (key, record) pairs of a table of records, parsing one record at a time.
+
+        Keys are the member names of object tables and the positions of array tables.
+        With `start` and `stop`, only the records at those positions are parsed.
+        """
+        if self._kinds[name] is None:
+            raise ValueError(f"Table {name} is not a table of records")
+        with self._lock:
+            keys, starts, ends, _ = self._record_index(name)
+            buffer = self._cache if self._cache is not None else self._open_source()
+        loads = pickle.loads if self._cache is not None else _loads
+        try:
+            for i in range(start, min(len(starts), len(starts) if stop is None else stop)):
+                yield (keys[i] if keys is not None else i), loads(buffer[starts[i]:ends[i]])
+        finally:
+            if buffer is not self._cache:
+                buffer.close()
+
+    def read_record(self, name: str, key: Any) -> Any:
+        """Parse one record of a table of records, by member name (objects) or position (arrays).
+
+        Only that record's bytes are parsed (or unpickled, with the cache); the record offsets
+        of a table are located the first time one of its records is read. Raises KeyError if
+        there is no such record.
+        """
+        if self._kinds[name] is None:
+            raise ValueError(f"Table {name} is not a table of records")
+        with self._lock:
+            keys, starts, ends, positions = self._record_index(name)
+            if keys is not None:
+                position = positions.get(key)
+            else:
+                position = key if isinstance(key, int) and 0 <= key < len(starts) else None
+            if position is None:
+                raise KeyError(key)
+            if self._cache is not None:
+                return pickle.loads(self._cache[starts[position]:ends[position]])
+            buffer = self._open_source()
+            try:
+                return _loads(buffer[starts[position]:ends[position]])
+            finally:
+                buffer.close()
+
+    def load(self, lazy_threshold: int = LAZY_TABLE_BYTES) -> Dict[str, Any]:
+        """Return the tables, with those larger than `lazy_threshold` bytes left as LazyTables."""
+        return {
+            name: LazyTable(self, name) if self.size(name) > lazy_threshold else self.read(name)
+            for name in self._spans
+        }
+
+
+_DATA_FILES: Dict[Tuple[str, Optional[str]], DataFile] = {}
+_DATA_FILES_LOCK = threading.Lock()
+
+
+def open_data_file(path: Path, cache_dir: Optional[str] = None) -> DataFile:
+    """Return the index of a data file, shared until the file changes."""
+    key = (str(Path(path).resolve()), cache_dir)
+    with _DATA_FILES_LOCK:
+        data_file = _DATA_FILES.get(key)
+        if data_file is None or data_file.signature != source_signature(path):
+            data_file = _DATA_FILES[key] = DataFile(path, cache_dir)
+        return data_file
+
+
+def sample_data(path: Path, limit: int = TEMPLATE_SAMPLE_RECORDS) -> Dict[str, Any]:
+    """Read a data file keeping only the first `limit` records of each table.
+
+    Only the sampled records are parsed, so even very large files can serve as
+    templates. Tables whose members are plain values (settings) are kept whole.
+    """
+    buffer = _map_file(Path(path))
+    try:
+        sample = {}
+        for name, start, end in iter_root_members(buffer):
+            members = iter_members(buffer, start) if buffer[start] in _OPENERS else iter(())
+            first = next(members, None)
+            if first is None or buffer[first[1]] not in _OPENERS:
+                sample[name] = json.loads(buffer[start:end])
+                continue
+            records = [first] + [member for _, member in zip(range(limit - 1), members)]
+            if buffer[start] == ord('{'):
+                sample[name] = {key: json.loads(buffer[s:e]) for key, s, e in records}
+            else:
+                sample[name] = [json.loads(buffer[s:e]) for _, s, e in records]
+        return sample
+    finally:
+        buffer.close()
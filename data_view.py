@@ -1,53 +1,324 @@
 import streamlit as st
 import pandas as pd
+import json
 import math
-from data_generator import DataGenerator
-
-def flatten_dict(d, parent_key='', sep='_'):
-    """Flatten nested dictionaries, keeping arrays intact."""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
+import time
+from pathlib import Path
+from data_generator import DataGenerator, GENERATOR_SPEC_FILE
+from sqlite_store import SqliteTable
+from integrity import check_integrity
+from context_store import to_plain
+
+PAGE_SIZES = [25, 50, 100, 500]
+DEFAULT_PAGE_SIZE = 50
+MAX_SAMPLED_ROWS = 100000
+MAX_REPORTED_REJECTIONS = 20
+CHANGE_LOG_ROWS = 200
+# Logged values with more items (e.g. whole tables) are summarized in the change log
+CHANGE_LOG_MAX_ITEMS = 20
+# Columns with at most this many distinct values are filtered by picking values
+MAX_FILTER_CHOICES = 50
+GENERATION_MODES = {
+    "New rows": "The model writes the new rows of each table from a summary of the table",
+    "Sample locally": "The model describes each table's distributions once; any number of rows is then sampled locally",
+    "Regenerate all data": "The model rewrites all data with the new rows added"
+}
+
+def _is_dict(value):
+    return isinstance(value, dict)
+
+def normalize_records(records, sep='_', index=None):
+    """Build a frame from records, flattening nested objects into `parent_child` columns.
+
+    Like `pd.json_normalize`, but column by column: the records go through the
+    DataFrame constructor once, then only columns holding objects are expanded, each
+    with one more constructor call. Lists stay intact in their cells; a column mixing
+    objects with other values keeps the other values under its own name.
+    """
+    df = pd.DataFrame(records, index=index)
+    if df.empty:
+        return df
+    pieces = []
+    flattened = False
+    for column in df.columns:
+        values = df[column]
+        nested = values.map(_is_dict) if values.dtype == object else None
+        if nested is None or not nested.any():
+            pieces.append(values)
+            continue
+        flattened = True
+        if not nested.all():
+            pieces.append(values.where(~nested))
+        expanded = normalize_records([value if is_dict else {} for value, is_dict in zip(values, nested)],
+                                     sep=sep, index=df.index)
+        pieces.append(expanded.add_prefix(f"{column}{sep}"))
+    return pd.concat(pieces, axis=1) if flattened else df
+
+def _table_rows(data):
+    # (record, id, parent id) of every row of a keyed table, in one pass over the table
+    records, ids, parents = [], [], []
+    for key, value in dict.items(data):
+        if isinstance(value, dict):
+            records.append(value)
+            ids.append(key)
+            parents.append(None)
+        elif isinstance(value, list) and value and all(isinstance(item, dict) for item in list.__iter__(value)):
+            records.extend(list.__iter__(value))
+            ids.extend([None] * len(value))
+            parents.extend([key] * len(value))
         else:
-            items.append((new_key, v))
-    return dict(items)
+            records.append({'value': value})
+            ids.append(key)
+            parents.append(None)
+    return records, ids, parents
 
 def convert_to_dataframe(data, parent_key=''):
-    """Convert nested JSON data to pandas DataFrame with improved type handling."""
+    """Convert a table to a flat pandas DataFrame (None if it is not tabular).
+
+    Keyed tables give one row per record with its key in `id`; values holding a list
+    of records give a row per item with the key in `parent_id`, and other values a
+    row with the value in `value`, so mixed tables are shown whole. Lists give a row
+    per item, and a dict of plain values a single row.
+    """
     if isinstance(data, dict):
-        if all(not isinstance(v, (dict, list)) for v in data.values()):
-            processed_data = {k: str(v) if isinstance(v, (int, float)) else v 
-                            for k, v in data.items()}
-            return pd.DataFrame([processed_data])
-        
-        rows = []
-        for key, value in data.items():
-            if isinstance(value, dict):
-                flattened = flatten_dict(value)
-                flattened['id'] = key
-                rows.append(flattened)
-            elif isinstance(value, list):
-                if value and isinstance(value[0], dict):
-                    df = pd.DataFrame(value)
-                    df['parent_id'] = key
-                    return df
-                else:
-                    return pd.DataFrame({key: [str(x) for x in value]})
-        
-        if rows:
-            return pd.DataFrame(rows)
-        
-    elif isinstance(data, list):
-        if data and isinstance(data[0], dict):
-            flattened_data = [flatten_dict(item) for item in data]
-            return pd.DataFrame(flattened_data)
-        return pd.DataFrame({parent_key: [str(x) for x in data]})
-    
+        if all(not isinstance(v, (dict, list)) for v in dict.values(data)):
+            return pd.DataFrame([dict(dict.items(data))])
+        records, ids, parents = _table_rows(data)
+        df = normalize_records(records)
+        if any(key is not None for key in ids):
+            df['id'] = ids
+        if any(parent is not None for parent in parents):
+            df['parent_id'] = parents
+        return df
+
+    if isinstance(data, list):
+        items = list(list.__iter__(data))
+        if items and all(isinstance(item, dict) for item in items):
+            return normalize_records(items)
+        if items and any(isinstance(item, dict) for item in items):
+            return normalize_records([item if isinstance(item, dict) else {'value': item} for item in items])
+        return pd.DataFrame({parent_key: items})
+
     return None
 
-def create_grid_layout(items_list):
+def cell_text(value):
+    """Render a cell that cannot keep its own type (lists, dicts, mixed columns) as text."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+def typed_frame(df):
+    """Keep native column dtypes, turning only columns Arrow cannot serialize into text.
+
+    Numeric, boolean and string columns are sent as they are; columns holding lists,
+    dicts or a mix of types are rendered as text.
+    """
+    for column in df.columns[df.dtypes == object]:
+        kinds = set(df[column].dropna().map(type))
+        if len(kinds) > 1 or not kinds <= {str, bool}:
+            df[column] = df[column].map(cell_text)
+    return df
+
+def build_table_frame(key, value):
+    """Convert a table to the frame shown in the grid (None if it is not tabular)."""
+    df = convert_to_dataframe(value, key)
+    return typed_frame(df) if df is not None else None
+
+def table_frame(key, value, store=None):
+    """Return (version, display frame) of a table, rebuilding the frame only when the table has changed.
+
+    Frames are cached on the context store together with the table's version, which
+    increases with every change to the table (including undo and reset), so reruns
+    triggered by unrelated widgets reuse the frames of unchanged tables. The version
+    is the one the frame was built at, for caches derived from the frame.
+    """
+    if store is None:
+        return None, build_table_frame(key, value)
+    cache_key = ('frame', key)
+    version = store.version(key)
+    cached = store.derived.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached
+    frame = build_table_frame(key, value)
+    with store.lock:
+        store.derived[cache_key] = (version, frame)
+    return version, frame
+
+def page_selector(key, total_rows, page_size):
+    """Show a page picker for a table of `total_rows` and return the offset of the chosen page."""
+    pages = max(1, math.ceil(total_rows / page_size))
+    if pages == 1:
+        return 0
+    if st.session_state.get(f"page_{key}", 1) > pages:
+        # A search or filter left fewer pages than the one shown
+        st.session_state[f"page_{key}"] = 1
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"page_{key}")
+    offset = (page - 1) * page_size
+    st.caption(f"Rows {offset + 1}–{min(offset + page_size, total_rows)} of {total_rows}")
+    return offset
+
+def search_text(key, df, version=None, store=None):
+    """Return the lowercased text of each row of a table frame, for search.
+
+    Columns are joined with vectorized string operations. The text is cached under
+    `version`, the table version the frame was built at (see table_frame), so typing
+    a search does not rebuild it and it always lines up with the frame.
+    """
+    cache_key = ('search', key)
+    cached = store.derived.get(cache_key) if store is not None and version is not None else None
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    text = pd.Series('', index=df.index, dtype=object)
+    for column in df.columns:
+        values = df[column]
+        part = values.astype(str).str.lower().where(values.notna(), '')
+        text = text.str.cat(part, sep='\x1f')
+    if store is not None and version is not None:
+        with store.lock:
+            store.derived[cache_key] = (version, text)
+    return text
+
+def filter_frame(df, search=None, filters=None, text=None):
+    """Return the rows of a table frame matching `search` and every column filter.
+
+    `search` is a case-insensitive substring of any column (looked up in `text`, the
+    frame's search_text, when given). `filters` maps columns to a (low, high) range, a
+    list of allowed values or a substring. Each condition is a vectorized mask over the
+    whole column; only the matching rows are returned.
+    """
+    mask = pd.Series(True, index=df.index)
+    if search:
+        if text is None:
+            text = search_text(None, df)
+        mask &= text.str.contains(search.lower(), regex=False)
+    for column, condition in (filters or {}).items():
+        values = df[column]
+        if isinstance(condition, tuple):
+            mask &= values.between(*condition).fillna(False).astype(bool)
+        elif isinstance(condition, list):
+            mask &= values.isin(condition)
+        else:
+            matched = values.astype(str).str.contains(condition, case=False, regex=False)
+            mask &= matched.where(values.notna(), False).astype(bool)
+    return df if mask.all() else df[mask]
+
+def column_filter(key, df, column):
+    """Show the widget filtering one column and return its condition (None when unset)."""
+    values = df[column]
+    label = str(column)
+    widget_key = f"filter_{key}_{column}"
+    if pd.api.types.is_bool_dtype(values):
+        chosen = st.multiselect(label, [True, False], key=widget_key)
+        return chosen or None
+    if pd.api.types.is_numeric_dtype(values):
+        low, high = values.min(), values.max()
+        if pd.isna(low) or low == high:
+            st.caption(f"{column}: nothing to filter")
+            return None
+        if pd.api.types.is_integer_dtype(values):
+            low, high = int(low), int(high)
+        else:
+            low, high = float(low), float(high)
+        chosen = st.slider(label, low, high, (low, high), key=widget_key)
+        return None if chosen == (low, high) else chosen
+    distinct = values.dropna().unique()
+    if len(distinct) <= MAX_FILTER_CHOICES:
+        chosen = st.multiselect(label, sorted(distinct.tolist(), key=str), key=widget_key)
+        return chosen or None
+    return st.text_input(label, key=widget_key, placeholder="Contains…") or None
+
+def table_filters(key, columns, df=None):
+    """Show the search box and column filters of a table; return (search, filters).
+
+    With a frame, each chosen column gets a filter suited to its type; without one
+    (SQLite tables), a chosen field is matched against an exact value.
+    """
+    search_col, columns_col = st.columns(2)
+    with search_col:
+        search = st.text_input("Search", key=f"search_{key}", placeholder="Search all columns…")
+    with columns_col:
+        chosen = st.multiselect("Filter columns", list(columns), key=f"filter_cols_{key}")
+    filters = {}
+    for column in chosen:
+        if df is not None:
+            condition = column_filter(key, df, column)
+        else:
+            condition = st.text_input(f"{column} equals", key=f"filter_{key}_{column}") or None
+            if condition is not None:
+                try:
+                    condition = json.loads(condition)
+                except json.JSONDecodeError:
+                    pass
+        if condition is not None:
+            filters[column] = condition
+    return search.strip(), filters
+
+def display_table(key, value, store=None, page_size=DEFAULT_PAGE_SIZE):
+    """Render one page of a table; only the rows of that page are sent to the browser.
+
+    Searches and filters run where the data lives: SQL queries for SQLite tables and
+    vectorized masks over the cached frame otherwise, so only matching rows are paged.
+    """
+    if getattr(value, 'lazy', False):
+        display_lazy_table(key, value, store, page_size)
+        return
+    if isinstance(value, SqliteTable):
+        # Query just the page from SQLite instead of building a frame of the whole table
+        st.caption("Stored in SQLite")
+        sample = build_table_frame(key, value.page(0, page_size))
+        search, filters = table_filters(key, sample.columns if sample is not None else [])
+        if search or filters:
+            total = value.count(search, filters)
+            st.caption(f"{total} matching rows")
+        else:
+            total = len(value)
+        offset = page_selector(key, total, page_size)
+        df = build_table_frame(key, value.search(search, filters, offset, page_size))
+        if df is not None:
+            df.index = range(offset, offset + len(df))
+            st.dataframe(df, use_container_width=True)
+        return
+    version, df = table_frame(key, value, store)
+    if df is None:
+        st.json(value)
+        return
+    search, filters = table_filters(key, df.columns, df)
+    if search or filters:
+        text = search_text(key, df, version, store) if search else None
+        df = filter_frame(df, search, filters, text)
+        st.caption(f"{len(df)} matching rows")
+    offset = page_selector(key, len(df), page_size)
+    st.dataframe(df.iloc[offset:offset + page_size], use_container_width=True)
+
+def display_lazy_table(key, value, store=None, page_size=DEFAULT_PAGE_SIZE):
+    """Render one page of a table not loaded yet, parsing only that page from the data file.
+
+    Searching and filtering need the whole table, so they are offered once it is loaded.
+    """
+    st.caption("Not loaded yet: read from the data file when a workflow first uses it")
+    if store is not None and st.button("Load for search and filters", key=f"load_{key}"):
+        store.table(key)
+        st.rerun()
+    if value.kind is None:
+        st.caption("Not a table of records, so it is only shown once loaded")
+        return
+    offset = page_selector(key, value.record_count(), page_size)
+    df = build_table_frame(key, value.page(offset, page_size))
+    if df is not None:
+        df.index = range(offset, offset + len(df))
+        st.dataframe(df, use_container_width=True)
+
+def displayed_tables(store):
+    """Return (name, table) of every table, leaving tables that are not loaded yet unloaded."""
+    tables = []
+    for name in store.data:
+        table = dict.get(store.data, name)
+        tables.append((name, table if getattr(table, 'lazy', False) else store.data[name]))
+    return tables
+
+def create_grid_layout(items_list, store=None, page_size=DEFAULT_PAGE_SIZE):
     """Create a grid layout with 2 columns."""
     n_rows = math.ceil(len(items_list) / 2)
     
@@ -60,15 +331,60 @@ def create_grid_layout(items_list):
                 with cols[col]:
                     with st.expander(f"📊 {key.title()}", expanded=True):
                         try:
-                            df = convert_to_dataframe(value, key)
-                            if df is not None:
-                                df = df.astype(str)
-                                st.dataframe(df, use_container_width=True)
-                            else:
-                                st.json(value)
+                            display_table(key, value, store, page_size)
                         except Exception as e:
                             st.error(f"Error displaying {key}: {str(e)}")
-                            st.json(value)
+                            if not isinstance(value, SqliteTable) and not getattr(value, 'lazy', False):
+                                st.json(value)
+
+def display_integrity_report():
+    """Show the references between tables that point at missing records."""
+    with st.expander("🔗 Referential Integrity", expanded=False):
+        st.info("References between tables (e.g. an order's customer) are checked on request and after data generation. Checking reads every table, including those not loaded yet.")
+        report = st.session_state.get('integrity_report')
+        if st.button("Check References" if report is None else "Re-check References"):
+            with st.spinner("Checking references..."):
+                report = st.session_state.integrity_report = check_integrity(st.session_state.context)
+        if report is None:
+            return
+        references = ", ".join(f"{ref['table']}.{ref['field']} → {ref['target']}" for ref in report['references'])
+        st.caption(f"References: {references or 'none found'}")
+        if not report['violation_count']:
+            st.success(f"All {report['checked']} references resolve")
+            return
+        st.warning(f"{report['violation_count']} of {report['checked']} references point at missing records")
+        st.dataframe(pd.DataFrame(report['violations']).astype(str), use_container_width=True)
+
+def change_text(value):
+    """Render a logged value for the change log, summarizing whole tables."""
+    if isinstance(value, (dict, list)) and len(value) > CHANGE_LOG_MAX_ITEMS:
+        return f"{type(value).__name__} of {len(value)} items"
+    return cell_text(to_plain(value))
+
+def display_change_log(store):
+    """Show the most recent changes to the data, e.g. made by tool functions."""
+    if store is None:
+        return
+    with st.expander("📜 Change Log", expanded=False):
+        st.info("Every change to the data is logged with the run that made it, so it can be audited and undone runs can be replayed.")
+        tables = sorted({str(name) for name in store.data})
+        table = st.selectbox("Table", ["All tables"] + tables, key="change_log_table")
+        events = store.events.events(table=None if table == "All tables" else table, limit=CHANGE_LOG_ROWS)
+        if not events:
+            st.caption("No changes yet")
+            return
+        rows = [{
+            'time': time.strftime('%H:%M:%S', time.localtime(event['time'])),
+            'run': event['run_id'] or '',
+            'table': event['table'],
+            'key': event['key'],
+            'field': event['field'],
+            'change': f"undo {event['op']}" if event['undo'] else event['op'],
+            'old': change_text(event['old']),
+            'new': change_text(event['new'])
+        } for event in reversed(events)]
+        st.caption(f"The {len(rows)} most recent changes, newest first")
+        st.dataframe(pd.DataFrame(rows).astype(str), use_container_width=True)
 
 def display_data_tab(data, use_case, tools, functions):
     """Display the data view tab content."""
@@ -80,8 +396,13 @@ def display_data_tab(data, use_case, tools, functions):
         # Display the data
         st.subheader("Sample Data")
         st.info("Sample Data simulating Databases and External connections. The AI Agents will have access to this data and the ability to update it.")
-        items_list = list(st.session_state.context.items())
-        create_grid_layout(items_list)
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                 key="page_size")
+        store = st.session_state.get('context_store')
+        items_list = displayed_tables(store) if store is not None else list(st.session_state.context.items())
+        create_grid_layout(items_list, store, page_size)
+        display_integrity_report()
+        display_change_log(st.session_state.get('context_store'))
         
    
         
@@ -91,21 +412,69 @@ def display_data_tab(data, use_case, tools, functions):
         st.info("Refresh the Data Tables or add more datapoints.")
         if st.button("↻ Refresh Data", use_container_width=True):
             st.rerun()
+        generation_mode = st.radio(
+            "Generation mode",
+            list(GENERATION_MODES),
+            help="\n\n".join(f"**{mode}**: {description}" for mode, description in GENERATION_MODES.items())
+        )
+        sampled = generation_mode == "Sample locally"
         num_items = st.number_input(
             "Number of datapoints to generate",
             min_value=1,
-            max_value=10,
-            value=1,
+            max_value=MAX_SAMPLED_ROWS if sampled else 10,
+            value=1000 if sampled else 1,
             help="Number of items to generate per table"
         )
         data_generator = DataGenerator(st.session_state.get('client'))
         if st.button("Generate More Data", use_container_width=True):
             with st.spinner("Generating new data..."):
-                updated_data = data_generator.generate_more_data(st.session_state.context, num_items)
-                if updated_data:
-                    st.session_state.context = updated_data
+                if generation_mode == "Regenerate all data":
+                    updated_data = data_generator.generate_more_data(st.session_state.context, num_items)
+                    if updated_data:
+                        st.rerun()
+                else:
+                    if sampled:
+                        report = data_generator.generate_sampled_rows(
+                            st.session_state.context, num_items,
+                            Path("use_cases") / use_case / GENERATOR_SPEC_FILE
+                        )
+                    else:
+                        report = data_generator.generate_new_rows(st.session_state.context, num_items)
+                    if report is not None:
+                        st.session_state.generation_report = report
+                        st.rerun()
+
+        report = st.session_state.pop('generation_report', None)
+        if report is not None:
+            added = sum(len(keys) for keys in report['added'].values())
+            st.success(f"Added {added} rows to {len(report['added'])} tables"
+                       + (f" (seed {report['seed']})" if 'seed' in report else ""))
+            if report['rejected']:
+                st.warning(f"Rejected {len(report['rejected'])} generated rows")
+                for row in report['rejected'][:MAX_REPORTED_REJECTIONS]:
+                    st.caption(f"{row['table']} {row['key'] if row['key'] is not None else ''}: {row['reason']}")
+
+        store = st.session_state.get('context_store')
+        if store is not None:
+            st.markdown("### Undo Changes")
+            st.info("Roll back the changes made by the last agentic workflow run, or restore the data as it was loaded.")
+            last_run = store.last_run
+            if st.button("↶ Undo Last Run", use_container_width=True, disabled=last_run is None,
+                         help=f"Undo the changes of run {last_run}" if last_run else "No run to undo"):
+                store.undo_last_run()
+                st.rerun()
+            undone_run = store.undone_run
+            if st.button("↷ Replay Undone Run", use_container_width=True, disabled=undone_run is None,
+                         help=f"Apply the changes of run {undone_run} again" if undone_run else "No undone run to replay"):
+                try:
+                    store.replay_run(undone_run)
                     st.rerun()
-    
+                except Exception as e:
+                    st.error(f"Error replaying run {undone_run}: {str(e)}")
+            if st.button("⟲ Reset Data", use_container_width=True):
+                store.reset()
+                st.rerun()
+
 
     # Display tools below the data
     st.markdown("---")
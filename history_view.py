@@ -0,0 +1,92 @@
+import streamlit as st
+import pandas as pd
+import time
+from scenario_processor import get_run_history, render_message, display_process_summary
+
+OUTCOMES = ["completed", "cancelled", "failed"]
+
+def display_run(record: dict) -> None:
+    """Render a stored run exactly as it was logged, without replaying it."""
+    st.markdown(f"**Scenario:** {record.get('scenario')}")
+    if record.get('error'):
+        st.error(f"Run failed: {record['error']}")
+
+    plan_col, exec_col = st.columns([1, 1])
+    with plan_col:
+        st.markdown("### Planning")
+    with exec_col:
+        st.markdown("### Execution")
+    for message in record.get('log', []):
+        render_message(message, plan_col, exec_col)
+
+    if record.get('operation_counts'):
+        display_process_summary(record)
+
+    st.markdown("### Context Changes")
+    context_diff = record.get('context_diff') or []
+    if context_diff:
+        st.dataframe(
+            pd.DataFrame(context_diff).astype(str),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.write("This run did not change the data.")
+
+def display_history_tab(use_case: str):
+    """Display the browser of past scenario runs."""
+    st.subheader("Run History")
+    st.info("Every scenario run is stored with its plan, messages, metrics and data changes. Select a run to load it.")
+
+    history = get_run_history()
+    filter_col, outcome_col, limit_col = st.columns([2, 2, 1])
+    with filter_col:
+        scope = st.radio(
+            "Use cases",
+            ["Current use case", "All use cases"],
+            horizontal=True,
+            key="history_scope"
+        )
+    with outcome_col:
+        outcome = st.selectbox("Outcome", ["All"] + OUTCOMES, key="history_outcome")
+    with limit_col:
+        limit = st.number_input("Runs", min_value=10, max_value=1000, value=50, step=10, key="history_limit")
+
+    runs = history.query(
+        use_case=use_case if scope == "Current use case" else None,
+        outcome=None if outcome == "All" else outcome,
+        limit=int(limit)
+    )
+    if not runs:
+        st.write("No runs recorded yet.")
+        return
+
+    runs_df = pd.DataFrame(runs)
+    runs_df['created_at'] = pd.to_datetime(runs_df['created_at'], unit='s')
+    st.dataframe(
+        runs_df.drop(columns=['scenario_hash']),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    labels = {
+        run['run_id']: f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['created_at']))} · "
+                       f"{run['outcome']} · {run['scenario']}"
+        for run in runs
+    }
+    run_id = st.selectbox(
+        "Open run",
+        list(labels),
+        format_func=lambda value: labels[value],
+        key="history_run"
+    )
+
+    start_time = time.perf_counter()
+    record = history.get(run_id)
+    load_ms = (time.perf_counter() - start_time) * 1000
+    if record is None:
+        st.warning(f"Run {run_id} could not be found.")
+        return
+
+    st.caption(f"Loaded run `{run_id}` in {load_ms:.1f} ms")
+    display_run(record)
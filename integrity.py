@@ -0,0 +1,172 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from context_store import infer_primary_key
+
+# Share of a field's distinct values that must be keys of a table for the field to be
+# taken as a reference to it; the rest are reported as dangling
+REFERENCE_MIN_SHARE = 0.5
+# Records per table sampled to infer references, and violations kept in a report
+INFERENCE_SAMPLE_RECORDS = 1000
+MAX_REPORTED_VIOLATIONS = 1000
+
+# Path steps into list items and into the keys of a dict (e.g. {"COMP_X200": 1})
+ITEMS = '[]'
+DICT_KEYS = '{}'
+
+Path = Tuple[str, ...]
+
+
+def table_kind(value: Any) -> Any:
+    """Return 'dict' for keyed record tables, 'list' for listed ones and None otherwise."""
+    if getattr(value, 'external', False):
+        # External (e.g. SQLite) tables only ever hold records
+        return 'dict' if isinstance(value, Mapping) else 'list'
+    if isinstance(value, dict):
+        return 'dict' if value and all(isinstance(v, dict) for v in dict.values(value)) else None
+    if isinstance(value, list):
+        return 'list' if value and all(isinstance(v, dict) for v in list.__iter__(value)) else None
+    return None
+
+
+def _table_records(table: Any, kind: str) -> Iterable[Tuple[Any, Any]]:
+    if hasattr(table, 'record_items'):
+        return table.record_items()
+    if kind == 'dict':
+        return table.items()
+    primary_key = infer_primary_key(table)
+    return ((record.get(primary_key) if primary_key else f"#{index}", record)
+            for index, record in enumerate(table))
+
+
+def _leaves(value: Any, path: Path = ()) -> Iterable[Tuple[Path, str]]:
+    # Every string in a record with the path leading to it, including dict keys
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, list):
+        for item in list.__iter__(value):
+            yield from _leaves(item, path + (ITEMS,))
+    elif isinstance(value, dict):
+        for key, item in dict.items(value):
+            if path:
+                yield path + (DICT_KEYS,), key
+            yield from _leaves(item, path + (key,))
+
+
+def values_at(record: Any, path: Path) -> List[str]:
+    """Return the strings found at `path` in a record."""
+    values = [record]
+    for step in path:
+        found = []
+        for value in values:
+            if step == ITEMS and isinstance(value, list):
+                found.extend(list.__iter__(value))
+            elif step == DICT_KEYS and isinstance(value, dict):
+                found.extend(dict.keys(value))
+            elif isinstance(value, dict) and step in value:
+                found.append(dict.get(value, step))
+        values = found
+    return [value for value in values if isinstance(value, str)]
+
+
+def format_path(path: Path) -> str:
+    """Render a path like 'medical_history[].treating_doctor' or 'components_needed{}'."""
+    text = ''
+    for step in path:
+        text += step if step in (ITEMS, DICT_KEYS) else (f".{step}" if text else step)
+    return text
+
+
+def table_key_sets(data: Mapping) -> Dict[str, Set[Any]]:
+    """Build the hash set of keys of every record table (the build side of the joins)."""
+    keys = {}
+    for name, table in data.items():
+        kind = table_kind(table)
+        if kind is not None:
+            keys[name] = {key for key, _ in _table_records(table, kind)}
+    return keys
+
+
+def reference_target(values: Set[Any], keys: Mapping[str, Set[Any]], exclude: Any = None) -> Any:
+    """Return the table whose keys make up the largest share of `values`, if at least REFERENCE_MIN_SHARE.
+
+    `keys` maps tables to their key sets; the table `exclude` (the one holding the
+    values) is never its own target. Returns None when no table qualifies.
+    """
+    best, best_share = None, 0.0
+    if not values:
+        return None
+    for target, target_keys in keys.items():
+        if target == exclude:
+            continue
+        share = len(values & target_keys) / len(values)
+        if share > best_share:
+            best, best_share = target, share
+    return best if best_share >= REFERENCE_MIN_SHARE else None
+
+
+def infer_references(data: Mapping, keys: Dict[str, Set[Any]] = None) -> List[Tuple[str, Path, str]]:
+    """Infer (table, path, referenced table) relationships between record tables.
+
+    Any string field, list of strings or dict keys at any depth of a record may
+    reference another table. A path is taken as a reference when at least half of its
+    distinct values are keys of that table, so references that are partly dangling
+    are still found.
+    """
+    keys = table_key_sets(data) if keys is None else keys
+    references = []
+    for name in keys:
+        table = data[name]
+        values: Dict[Path, Set[str]] = {}
+        for count, (key, record) in enumerate(_table_records(table, table_kind(table))):
+            if count >= INFERENCE_SAMPLE_RECORDS:
+                break
+            for path, value in _leaves(record):
+                # A list table's own key field is not a reference
+                if not (len(path) == 1 and value == key):
+                    values.setdefault(path, set()).add(value)
+        for path, distinct in values.items():
+            target = reference_target(distinct, keys, exclude=name)
+            if target is not None:
+                references.append((name, path, target))
+    return references
+
+
+def check_integrity(data: Mapping, references: List[Tuple[str, Path, str]] = None) -> Dict[str, Any]:
+    """Find references to records that do not exist.
+
+    Each referenced table's keys are loaded into a hash set once, then every
+    referencing table is scanned once, probing the set with the values of all its
+    references. Returns the references checked, the number of values probed and the
+    violations (table, record key, field, value and referenced table).
+    """
+    keys = table_key_sets(data)
+    references = infer_references(data, keys) if references is None else references
+    by_table: Dict[str, List[Tuple[Path, str]]] = {}
+    for table, path, target in references:
+        by_table.setdefault(table, []).append((path, target))
+
+    checked = 0
+    violation_count = 0
+    violations = []
+    for name, table_references in by_table.items():
+        table = data[name]
+        for key, record in _table_records(table, table_kind(table)):
+            for path, target in table_references:
+                target_keys = keys[target]
+                for value in values_at(record, path):
+                    checked += 1
+                    if value in target_keys:
+                        continue
+                    violation_count += 1
+                    if len(violations) < MAX_REPORTED_VIOLATIONS:
+                        violations.append({'table': name, 'key': key, 'field': format_path(path),
+                                           'value': value, 'target': target})
+
+    return {
+        'references': [{'table': table, 'field': format_path(path), 'target': target}
+                       for table, path, target in references],
+        'checked': checked,
+        'violation_count': violation_count,
+        'violations': violations
+    }
@@ -0,0 +1,189 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a queue that already holds its maximum of pending jobs."""
+
+
+class Job:
+    """A unit of background work with a message log the UI can poll."""
+
+    def __init__(self, job_id: str, label: str, metadata: Dict[str, Any] = None):
+        self.id = job_id
+        self.label = label
+        self.metadata = metadata or {}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._messages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._cancel_callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> bool:
+        """Request cancellation; the job stops at its next cancellation point."""
+        with self._lock:
+            if self.done or self.cancelled:
+                return False
+            self._cancel_event.set()
+            callbacks = list(self._cancel_callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        return True
+
+    def on_cancel(self, callback: Callable[[], Any]) -> None:
+        """Register a callback to run when cancellation is requested."""
+        with self._lock:
+            if not self.cancelled:
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled()
+
+    def run_interruptible(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call a blocking function, raising JobCancelled as soon as the job is cancelled.
+
+        The call runs on a helper thread so a cancel request does not have to wait for it;
+        the abandoned call's result is discarded.
+        """
+        self.raise_if_cancelled()
+        outcome = {}
+        finished = threading.Event()
+
+        def target():
+            try:
+                outcome['result'] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                finished.set()
+
+        threading.Thread(target=target, name=f"job-{self.id}-call", daemon=True).start()
+        while not finished.wait(CANCEL_POLL_INTERVAL):
+            self.raise_if_cancelled()
+        if 'error' in outcome:
+            # A call aborted by cancellation fails with a connection error; report the cancel instead
+            self.raise_if_cancelled()
+            raise outcome['error']
+        return outcome['result']
+
+    def add_message(self, message_type: str, content: str, arguments: dict = None) -> Dict[str, Any]:
+        """Append a progress message to the job's log."""
+        message = {
+            'type': message_type,
+            'content': content,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'arguments': arguments
+        }
+        with self._lock:
+            self._messages.append(message)
+        return message
+
+    def get_messages(self, start: int = 0) -> List[Dict[str, Any]]:
+        """Return a copy of the messages logged so far, from `start` onwards."""
+        with self._lock:
+            return list(self._messages[start:])
+
+
+class JobQueue:
+    """Runs jobs on a worker pool and keeps their state independent of Streamlit reruns."""
+
+    def __init__(self, max_workers: int = 4, max_finished_jobs: int = 100,
+                 max_pending: int = None, name: str = 'job'):
+        self.max_finished_jobs = max_finished_jobs
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        """Return how many jobs are queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def submit(self, label: str, fn: Callable[..., Any], *args,
+               metadata: Dict[str, Any] = None, **kwargs) -> Job:
+        """Queue `fn(job, *args, **kwargs)` for background execution and return its job.
+
+        Raises QueueFull if the queue already holds `max_pending` unfinished jobs.
+        """
+        job = Job(uuid.uuid4().hex[:12], label, metadata)
+        with self._lock:
+            if self.max_pending is not None and sum(1 for j in self._jobs.values() if not j.done) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs are already queued or running")
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by ID; returns None once it has been evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation of a job; returns False if it is unknown or already finished."""
+        job = self.get(job_id)
+        return job.cancel() if job else False
+
+    def list_jobs(self) -> List[Job]:
+        """Return all known jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancelled else COMPLETED
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.add_message('error', f"Job failed: {str(e)}", arguments={
+                'error_type': type(e).__name__,
+                'traceback': traceback.format_exc()
+            })
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _evict_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
@@ -15,6 +15,37 @@ Rules:
 5. Do not use any markdown formatting, just return pure JSON.
 """
 
+DELTA_DATA_GENERATION_PROMPT = """Please generate {num_items} new records for each table described below.
+Return ONLY the new records, never the existing ones.
+
+Tables (kind, key field, example records, latest keys and references to other tables):
+{schema}
+
+Rules:
+1. Return a JSON object with one entry per table described above.
+2. For "dict" tables the entry is an object mapping each new key to its record. For "list" tables it is an array of new records.
+3. New keys must follow the pattern of the latest keys and must not reuse an existing key.
+4. Use the same fields, data types and nesting as the example records.
+5. A field listed under "references" must only hold keys of the referenced table: keys from "referenced_keys" or keys of records you create in this response. Paths reach into nested values: "items[].product_id" is a field of each item of the "items" list, and "components{{}}" means the keys of the "components" object.
+6. Generate realistic and diverse values that are consistent with the examples.
+7. Do not use any markdown formatting, just return pure JSON.
+"""
+
+DISTRIBUTION_SPEC_PROMPT = """Please write a data generator spec for each table described below, so that realistic records can be sampled locally in large numbers.
+
+Spec format:
+{spec_format}
+Tables (example records and the spec inferred from the existing records):
+{tables}
+
+Rules:
+1. Return a JSON object mapping each table name to {{"fields": {{field: <field spec>}}}}, covering the same fields as the inferred spec.
+2. Keep "ref" and "sequence" fields as they are inferred.
+3. Replace the few observed values with realistic distributions: ranges, means and spreads for numbers, and vocabularies of 20 to 100 realistic values (names, descriptions, addresses, categories) for text.
+4. Use "correlated_with" and "correlation" where numeric or boolean fields of a record plausibly move together.
+5. Do not use any markdown formatting, just return pure JSON.
+"""
+
 # O1 Planning Prompt
 O1_PLANNING_PROMPT = """You are a planner. The first input you will receive will be a complex task/scenario that needs to be carefully reasoned through to solve. 
 Your task is to review the challenge, and create a plan to handle it.
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_HISTORY_PATH = "run_history"
+
+# Every log record is MAGIC + payload length + zlib-compressed JSON payload
+RECORD_MAGIC = b"RUN1"
+RECORD_HEADER = struct.Struct("<4sI")
+
+INDEX_COLUMNS = ('run_id', 'use_case', 'scenario_hash', 'scenario', 'created_at',
+                 'outcome', 'function_calls', 'duration')
+
+
+def scenario_hash(scenario: str) -> str:
+    """Stable short hash of a scenario text, ignoring case and surrounding whitespace."""
+    normalized = ' '.join((scenario or '').split()).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def _json_default(value: Any) -> Any:
+    # SDK objects (e.g. tool calls) are pydantic models
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    return str(value)
+
+
+class RunHistoryStore:
+    """Append-only compressed log of scenario runs with a SQLite index for fast lookup.
+
+    Records are never rewritten: a run is appended to the log once and the index stores
+    its byte offset, so loading a past run is a single seek and decompress.
+    """
+
+    def __init__(self, base_path: str = DEFAULT_HISTORY_PATH):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.base_path / "runs.log"
+        self.index_path = self.base_path / "index.sqlite"
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    use_case TEXT,
+                    scenario_hash TEXT,
+                    scenario TEXT,
+                    created_at REAL,
+                    outcome TEXT,
+                    function_calls INTEGER,
+                    duration REAL,
+                    log_offset INTEGER,
+                    log_length INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_use_case ON runs (use_case, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_scenario_hash ON runs (scenario_hash, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_outcome ON runs (outcome, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, record: Dict[str, Any]) -> str:
+        """Persist a run record and index it. Returns the run ID."""
+        record = dict(record)
+        record.setdefault('created_at', time.time())
+        record.setdefault('scenario_hash', scenario_hash(record.get('scenario', '')))
+        payload = zlib.compress(json.dumps(record, default=_json_default).encode('utf-8'))
+        operation_counts = record.get('operation_counts') or {}
+
+        with self._lock:
+            with open(self.log_path, 'ab') as f:
+                offset = f.tell()
+                f.write(RECORD_HEADER.pack(RECORD_MAGIC, len(payload)))
+                f.write(payload)
+            self._index(record, operation_counts.get('function_calls', 0), offset, len(payload))
+        return record['run_id']
+
+    def _index(self, record: Dict[str, Any], function_calls: int, offset: int, length: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record['run_id'], record.get('use_case'), record['scenario_hash'],
+                    record.get('scenario'), record['created_at'], record.get('outcome'),
+                    function_calls,
+                    (record.get('planning_time') or 0.0) + (record.get('execution_time') or 0.0),
+                    offset + RECORD_HEADER.size, length
+                )
+            )
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Load a full run record by ID without scanning the log."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT log_offset, log_length FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        offset, length = row
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            payload = f.read(length)
+        return json.loads(zlib.decompress(payload))
+
+    def query(self, use_case: Optional[str] = None, outcome: Optional[str] = None,
+              scenario: Optional[str] = None, since: Optional[float] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Return index rows of matching runs, newest first."""
+        clauses, params = [], []
+        if use_case:
+            clauses.append("use_case = ?")
+            params.append(use_case)
+        if outcome:
+            clauses.append("outcome = ?")
+            params.append(outcome)
+        if scenario:
+            clauses.append("scenario_hash = ?")
+            params.append(scenario_hash(scenario))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(INDEX_COLUMNS)} FROM runs {where} "
+                f"ORDER BY created_at DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [dict(zip(INDEX_COLUMNS, row)) for row in rows]
+
+    def rebuild_index(self) -> int:
+        """Recreate the index from the log, e.g. after the index file was lost. Returns the run count."""
+        count = 0
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM runs")
+            if not self.log_path.exists():
+                return 0
+            with open(self.log_path, 'rb') as f:
+                while True:
+                    offset = f.tell()
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    magic, length = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+                    if magic != RECORD_MAGIC or len(payload) < length:
+                        # Truncated tail from an interrupted write
+                        break
+                    record = json.loads(zlib.decompress(payload))
+                    operation_counts = record.get('operation_counts') or {}
+                    self._index(record, operation_counts.get('function_calls', 0), offset, length)
+                    count += 1
+        return count
@@ -1,40 +1,57 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+import os
+import threading
+from contextlib import contextmanager
 import time
 import json
-from typing import List, Dict, Tuple
+from typing import List, Dict, Any, Iterator
+from openai import DefaultHttpxClient
+from job_queue import Job, JobQueue, JobCancelled, COMPLETED, FAILED, CANCELLED
+from run_history import RunHistoryStore, DEFAULT_HISTORY_PATH
+from context_store import ContextStore
+from context_provider import bind_context
+from tracing import tracer
 from prompts import O1_PLANNING_PROMPT, GPT4_EXECUTION_PROMPT
 
-def process_message(message_type: str, content: str, arguments: dict = None) -> None:
-    """Add a message to the session state message log and display it."""
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
-        
-    message = {
-        'type': message_type,
-        'content': content,
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-        'arguments': arguments
-    }
-    
-    st.session_state.messages.append(message)
-    
-    # Create layout if it doesn't exist
-    if 'layout_container' not in st.session_state:
-        st.session_state.layout_container = st.container()
-        with st.session_state.layout_container:
-            st.session_state.plan_col, st.session_state.exec_col = st.columns([1, 1])
-            with st.session_state.plan_col:
-                st.markdown("### Planning")
-            with st.session_state.exec_col:
-                st.markdown("### Execution")
-    
-    # Display message
+JOB_POLL_INTERVAL = 1.0
+# Batch runs get their own workers so a large batch cannot starve interactive runs
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS') or 4)
+MAX_PENDING_BATCH_RUNS = int(os.getenv('MAX_PENDING_BATCH_RUNS') or 2000)
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue for interactive runs, shared by every session and rerun."""
+    return JobQueue()
+
+@st.cache_resource
+def get_batch_queue() -> JobQueue:
+    """Return the process-wide queue for batch runs, separate from the interactive one.
+
+    Its workers and the number of runs it holds are bounded, so batches of every
+    session together never use more than BATCH_WORKERS threads.
+    """
+    return JobQueue(max_workers=BATCH_WORKERS, max_finished_jobs=MAX_PENDING_BATCH_RUNS,
+                    max_pending=MAX_PENDING_BATCH_RUNS, name='batch')
+
+@st.cache_resource
+def get_run_history() -> RunHistoryStore:
+    """Return the process-wide store of past scenario runs."""
+    return RunHistoryStore(os.getenv('RUN_HISTORY_PATH') or DEFAULT_HISTORY_PATH)
+
+def render_message(message: Dict[str, Any], plan_col, exec_col) -> None:
+    """Display a single logged message in the planning or execution column."""
+    message_type = message['type']
+    content = message['content']
+    arguments = message['arguments']
+
     if message_type == 'plan':
-        with st.session_state.plan_col:
+        with plan_col:
             with st.expander(f"{message['timestamp']} - Plan", expanded=True):
                 st.markdown(content)
     else:
-        with st.session_state.exec_col:
+        with exec_col:
             with st.expander(f"{message['timestamp']} - {message_type.upper()}", expanded=True):
                 if message_type == 'function':
                     func_name, content = content.split(':', 1)
@@ -62,109 +79,152 @@ def process_message(message_type: str, content: str, arguments: dict = None) ->
                 else:
                     st.write(content)
 
-def call_o1(scenario: str, o1_mini_client, tools) -> str:
+def bind_cancellation(client, job: Job):
+    """Give the client a private connection pool that is closed when the job is cancelled."""
+    http_client = DefaultHttpxClient()
+    job.on_cancel(http_client.close)
+    scoped_client = client.with_options(http_client=http_client)
+    scoped_client.deployment_name = client.deployment_name
+    return scoped_client, http_client
+
+def call_o1(scenario: str, o1_mini_client, tools, job: Job) -> str:
     """Generate a plan using O1-Mini."""
     prompt = f"{O1_PLANNING_PROMPT}\n\nTools:\n{tools}\n\nScenario:\n{scenario}\n\nPlease provide the next steps in your plan."
-    
-    status_container = st.empty()
-    with status_container.container():
-        st.info("🤖 Calling O1-Mini for planning...")
-        progress_bar = st.progress(0)
-        
-        for i in range(100):
-            time.sleep(0.01)
-            progress_bar.progress(i + 1)
-            
-        response = o1_mini_client.chat.completions.create(
+
+    with tracer.span('planning', **{'llm.model': o1_mini_client.deployment_name,
+                                    'llm.prompt_chars': len(prompt)}) as span:
+        job.add_message('status', "🤖 Calling O1-Mini for planning...")
+        response = job.run_interruptible(
+            o1_mini_client.chat.completions.create,
             model=o1_mini_client.deployment_name,
             messages=[{'role': 'user', 'content': prompt}]
         )
-        
-        st.success("✅ Planning completed!")
-        time.sleep(1)
-    
-    status_container.empty()
-    plan = response.choices[0].message.content
-    process_message('plan', plan)
+
+        plan = response.choices[0].message.content
+        span.set_attribute('plan_chars', len(plan or ''))
+
+    job.add_message('plan', plan)
     return plan
 
-def call_gpt4o(plan: str, tools: List[Dict], client, function_mapping: Dict) -> List[Dict]:
-    """Execute the plan using GPT-4."""
+def is_failed_result(result: Any) -> bool:
+    """Tool functions report expected failures by returning a dict with an `error` key."""
+    return isinstance(result, dict) and ('error' in result or result.get('success') is False)
+
+def execute_tool_call(tool_call, function_mapping: Dict, job: Job,
+                      context_store: ContextStore = None) -> Dict[str, Any]:
+    """Run a single tool call and return the tool message answering it.
+
+    With a context store, the call runs in a transaction: if it raises or returns an
+    error, every change it made to the context is rolled back so it is safe to retry.
+    """
+    function_name = tool_call.function.name
+
+    with tracer.span('tool', **{'tool.name': function_name,
+                                'tool.argument_bytes': len(tool_call.function.arguments or '')}) as span:
+        arguments = tool_call.function.arguments
+        txn = None
+        try:
+            arguments = json.loads(arguments)
+            job.add_message('status', f"Executing function: {function_name}")
+            if context_store is not None:
+                with context_store.transaction() as txn:
+                    function_response = function_mapping[function_name](**arguments)
+                    if is_failed_result(function_response) and txn.rollback():
+                        job.add_message('status', f"Rolled back the changes made by {function_name}")
+                span.set_attribute('tool.rolled_back', txn.rolled_back)
+            else:
+                function_response = function_mapping[function_name](**arguments)
+            content = json.dumps(function_response)
+            job.add_message(
+                'function',
+                f"{function_name}: {content}",
+                arguments=arguments
+            )
+
+        except Exception as e:
+            import traceback
+            span.record_exception(e)
+            # Only a failure inside the transaction rolled anything back
+            span.set_attribute('tool.rolled_back', txn is not None and txn.rolled_back)
+            error_details = {
+                'function': function_name,
+                'error_message': str(e),
+                'error_type': type(e).__name__,
+                'traceback': traceback.format_exc(),
+                'arguments': arguments
+            }
+            job.add_message(
+                'error',
+                f"Error in {function_name}: {str(e)}",
+                arguments=error_details
+            )
+            content = json.dumps({"error": error_details})
+
+        span.set_attribute('tool.result_bytes', len(content))
+
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call.id,
+        "content": content
+    }
+
+def call_gpt4o(plan: str, tools: List[Dict], client, function_mapping: Dict, job: Job,
+               context_store: ContextStore = None) -> List[Dict]:
+    """Execute the plan using GPT-4. Returns the messages so far if the job is cancelled."""
     messages = [{'role': 'system', 'content': GPT4_EXECUTION_PROMPT.format(plan=plan)}]
     step_counter = 1
-    status_container = st.empty()
-    
-    while True:
-        with status_container:
-            st.info(f"🤖 Execution Step {step_counter}")
-        
-        response = client.chat.completions.create(
-            model=client.deployment_name,
-            messages=messages,
-            tools=tools,
-            parallel_tool_calls=False
-        )
-        
-        assistant_message = response.choices[0].message
-        messages.append({
-            "role": "assistant", 
-            "content": assistant_message.content, 
-            "tool_calls": assistant_message.tool_calls
-        })
-        
-        if assistant_message.content:
-            process_message('assistant', assistant_message.content)
-
-        if not assistant_message.tool_calls:
-            continue
-
-        # Process tool calls
-        tool_responses = []
-        for tool_call in assistant_message.tool_calls:
-            if tool_call.function.name == 'instructions_complete':
-                status_container.empty()
-                return messages
-
-            function_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            
+
+    while not job.cancelled:
+        with tracer.span('execution.step', step=step_counter):
+            job.add_message('status', f"🤖 Execution Step {step_counter}")
+
             try:
-                process_message('status', f"Executing function: {function_name}")
-                function_response = function_mapping[function_name](**arguments)
-                process_message(
-                    'function', 
-                    f"{function_name}: {json.dumps(function_response)}", 
-                    arguments=arguments
-                )
-                
-                tool_responses.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(function_response)
-                })
-                
-            except Exception as e:
-                import traceback
-                error_details = {
-                    'function': function_name,
-                    'error_message': str(e),
-                    'error_type': type(e).__name__,
-                    'traceback': traceback.format_exc(),
-                    'arguments': arguments
-                }
-                process_message(
-                    'error', 
-                    f"Error in {function_name}: {str(e)}", 
-                    arguments=error_details
-                )
-                tool_responses.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps({"error": error_details})
-                })
-
-        messages.extend(tool_responses)
-        step_counter += 1
+                with tracer.span('llm.request', **{'llm.model': client.deployment_name,
+                                                   'llm.message_count': len(messages)}):
+                    response = job.run_interruptible(
+                        client.chat.completions.create,
+                        model=client.deployment_name,
+                        messages=messages,
+                        tools=tools,
+                        parallel_tool_calls=False
+                    )
+            except JobCancelled:
+                break
+
+            assistant_message = response.choices[0].message
+            messages.append({
+                "role": "assistant",
+                "content": assistant_message.content,
+                "tool_calls": assistant_message.tool_calls
+            })
+
+            if assistant_message.content:
+                job.add_message('assistant', assistant_message.content)
+
+            if not assistant_message.tool_calls:
+                continue
+
+            # Process tool calls
+            tool_responses = []
+            for tool_call in assistant_message.tool_calls:
+                if tool_call.function.name == 'instructions_complete':
+                    return messages
+
+                # Answer every pending tool call so the message history stays well-formed
+                if job.cancelled:
+                    tool_responses.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": json.dumps({"error": "Skipped: the run was cancelled."})
+                    })
+                    continue
+
+                tool_responses.append(execute_tool_call(tool_call, function_mapping, job, context_store))
+
+            messages.extend(tool_responses)
+            step_counter += 1
+
+    return messages
 
 def count_operations(messages: List[Dict]) -> Dict[str, int]:
     """Count different types of operations from the message history."""
@@ -209,44 +269,235 @@ def add_scenario_selector(sample_scenarios: list) -> str:
         
     return scenario
 
-def process_scenario(scenario: str, o1_mini_client, client, tools: List[Dict], 
-                    function_mapping: Dict) -> Tuple[List[Dict], str]:
-    """Process a scenario by generating and executing a plan."""
-    process_container = st.empty()
-    
-    with process_container.container():
-        # Planning phase
-        process_message('status', 'Generating plan...')
-        start_time = time.time()
-        plan = call_o1(scenario, o1_mini_client, tools)
-        planning_time = time.time() - start_time
-        
-        # Execution phase
-        process_message('status', 'Executing plan...')
-        start_time = time.time()
-        messages = call_gpt4o(plan, tools, client, function_mapping)
-        execution_time = time.time() - start_time
-        
-        # Count operations
+@contextmanager
+def tool_context(context_store: ContextStore = None) -> Iterator[None]:
+    """Bind the run's context, so get_context() in tool functions returns it on this thread."""
+    if context_store is None:
+        yield
+        return
+    # Activating also routes st.session_state.context to a forked store's data
+    with context_store.activate(), bind_context(context_store.data):
+        yield
+
+@contextmanager
+def script_context(script_ctx=None) -> Iterator[None]:
+    """Attach a session's ScriptRunContext to this thread, and restore the previous one after.
+
+    Worker threads are reused across runs of different sessions, so the context must not
+    outlive the run it was attached for.
+    """
+    if script_ctx is None:
+        yield
+        return
+    thread = threading.current_thread()
+    previous = get_script_run_ctx(suppress_warning=True)
+    add_script_run_ctx(thread, script_ctx)
+    try:
+        yield
+    finally:
+        if previous is not None:
+            add_script_run_ctx(thread, previous)
+        elif hasattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME):
+            delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+
+def process_scenario(job: Job, scenario: str, o1_mini_client, client, tools: List[Dict],
+                     function_mapping: Dict, history: RunHistoryStore = None,
+                     context_store: ContextStore = None, script_ctx=None,
+                     isolated: bool = False) -> Dict[str, Any]:
+    """Process a scenario by generating and executing a plan. Runs on a job queue worker.
+
+    An isolated run forks the context store when it starts rather than when it is
+    submitted, so there are never more live forks than queue workers.
+    """
+    if isolated and context_store is not None:
+        context_store = context_store.fork()
+    # Tool functions of use cases that still read st.session_state need the submitting session
+    with script_context(script_ctx):
+        # A journal mark is all that is needed to diff (and later undo) this run's changes
+        mark = context_store.begin_run(job.id) if context_store is not None else None
+        try:
+            with tool_context(context_store):
+                result = run_scenario(job, scenario, o1_mini_client, client, tools, function_mapping,
+                                      context_store)
+        except Exception as e:
+            if history is not None:
+                save_run(history, job, {'scenario': scenario, 'outcome': FAILED, 'error': str(e)},
+                         context_store.changes_since(mark) if context_store is not None else [])
+            raise
+        finally:
+            if context_store is not None:
+                context_store.end_run()
+                # A finished fork no longer needs the parent to preserve its shared tables
+                context_store.release()
+        context_diff = context_store.changes_since(mark) if context_store is not None else []
+        result['context_changes'] = len(context_diff)
+        if history is not None:
+            save_run(history, job, result, context_diff)
+        return result
+
+def save_run(history: RunHistoryStore, job: Job, result: Dict[str, Any],
+             context_diff: List[Dict[str, Any]]) -> None:
+    """Persist a finished run with its log and the changes it made to the context."""
+    try:
+        history.append({
+            **result,
+            'run_id': job.id,
+            'use_case': job.metadata.get('use_case'),
+            'log': job.get_messages(),
+            'context_diff': context_diff
+        })
+    except Exception as e:
+        job.add_message('error', f"Could not save run history: {str(e)}")
+
+def run_scenario(job: Job, scenario: str, o1_mini_client, client, tools: List[Dict],
+                 function_mapping: Dict, context_store: ContextStore = None) -> Dict[str, Any]:
+    """Plan and execute a scenario, returning its plan, messages and metrics."""
+    o1_mini_client, o1_mini_http = bind_cancellation(o1_mini_client, job)
+    client, client_http = bind_cancellation(client, job)
+    plan = None
+    messages = []
+    execution_time = 0.0
+
+    with tracer.span('scenario.run', **{'job.id': job.id,
+                                        'use_case': job.metadata.get('use_case'),
+                                        'scenario_chars': len(scenario or '')}) as run_span:
+        # UI renders of this job are recorded as children of the run span
+        job.metadata['span'] = run_span
+        try:
+            # Planning phase
+            job.add_message('status', 'Generating plan...')
+            start_time = time.time()
+            try:
+                plan = call_o1(scenario, o1_mini_client, tools, job)
+            except JobCancelled:
+                pass
+            planning_time = time.time() - start_time
+
+            # Execution phase
+            if plan is not None:
+                job.add_message('status', 'Executing plan...')
+                start_time = time.time()
+                messages = call_gpt4o(plan, tools, client, function_mapping, job, context_store)
+                execution_time = time.time() - start_time
+        finally:
+            o1_mini_http.close()
+            client_http.close()
+
         operation_counts = count_operations(messages)
-        
-        # Show completion summary
+        run_span.set_attribute('run.cancelled', job.cancelled)
+        run_span.set_attribute('run.function_calls', operation_counts['function_calls'])
+
+    job.add_message('status', 'Run cancelled.' if job.cancelled else 'Processing complete.')
+    return {
+        'scenario': scenario,
+        'plan': plan,
+        'messages': messages,
+        'planning_time': planning_time,
+        'execution_time': execution_time,
+        'operation_counts': operation_counts,
+        'cancelled': job.cancelled,
+        'outcome': CANCELLED if job.cancelled else COMPLETED
+    }
+
+def submit_scenario(scenario: str, tools: List[Dict], function_mapping: Dict,
+                    isolated: bool = False, metadata: Dict[str, Any] = None,
+                    queue: JobQueue = None) -> Job:
+    """Submit a scenario run to a background job queue (the interactive one by default).
+
+    An isolated run works on a copy-on-write fork of the context, taken when the run
+    starts, so its changes are not visible to the session or to other runs.
+    """
+    context_store = st.session_state.get('context_store')
+    return (queue or get_job_queue()).submit(
+        scenario,
+        process_scenario,
+        metadata={'use_case': st.session_state.current_use_case, **(metadata or {})},
+        scenario=scenario,
+        o1_mini_client=st.session_state.o1_mini_client,
+        client=st.session_state.client,
+        tools=tools,
+        function_mapping=function_mapping,
+        history=get_run_history(),
+        context_store=context_store,
+        script_ctx=get_script_run_ctx(),
+        isolated=isolated
+    )
+
+def get_requested_job() -> Job:
+    """Return the job referenced in the URL, if it is still known to the queue."""
+    job_id = st.query_params.get('job')
+    return get_job_queue().get(job_id) if job_id else None
+
+def display_unavailable_job(job_id: str) -> None:
+    """Explain why a scenario run referenced by the session or URL cannot be shown."""
+    st.warning(f"Scenario run {job_id} is no longer available. Runs are kept in memory only, "
+               "so older runs and runs from before the app restarted are dropped. "
+               "Its result may still be in the Run History tab.")
+
+def display_process_summary(result: Dict[str, Any]) -> None:
+    """Show the metrics of a finished scenario run."""
+    operation_counts = result['operation_counts']
+    if result.get('cancelled'):
+        st.warning("🛑 Run cancelled. The summary below covers the steps completed before cancellation.")
+    else:
         st.success("✨ Processing Complete!")
-        st.write("📊 Process Summary:")
-        col1, col2, col3, col4, col5 = st.columns(5)
-        with col1:
-            st.metric("Planning Time", f"{planning_time:.2f}s")
-        with col2:
-            st.metric("Execution Time", f"{execution_time:.2f}s")
-        with col3:
-            st.metric("Function Calls", operation_counts['function_calls'])
-        with col4:
-            st.metric("Assistant Messages", operation_counts['assistant_messages'])
-        with col5:
-            st.metric("Tool Messages", operation_counts['tool_messages'])
-            
-    process_message('status', 'Processing complete.')
-    return messages, plan
+    st.write("📊 Process Summary:")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("Planning Time", f"{result['planning_time']:.2f}s")
+    with col2:
+        st.metric("Execution Time", f"{result['execution_time']:.2f}s")
+    with col3:
+        st.metric("Function Calls", operation_counts['function_calls'])
+    with col4:
+        st.metric("Assistant Messages", operation_counts['assistant_messages'])
+    with col5:
+        st.metric("Tool Messages", operation_counts['tool_messages'])
+
+def display_job(job: Job) -> None:
+    """Render the messages and outcome of a scenario job."""
+    with tracer.span('ui.render', parent=job.metadata.get('span'),
+                     **{'job.id': job.id, 'job.status': job.status}) as span:
+        _display_job(job)
+        span.set_attribute('message_count', len(job.get_messages()))
+
+def _display_job(job: Job) -> None:
+    if not job.done:
+        info_col, cancel_col = st.columns([4, 1])
+        with info_col:
+            if job.cancelled:
+                st.info(f"🛑 Cancelling scenario run... (job `{job.id}`)")
+            else:
+                st.info(f"⏳ Processing scenario... (job `{job.id}`)")
+        with cancel_col:
+            if st.button("Cancel", key=f"cancel_job_{job.id}", disabled=job.cancelled, use_container_width=True):
+                job.cancel()
+
+    plan_col, exec_col = st.columns([1, 1])
+    with plan_col:
+        st.markdown("### Planning")
+    with exec_col:
+        st.markdown("### Execution")
+
+    messages = job.get_messages()
+    for message in messages:
+        render_message(message, plan_col, exec_col)
+
+    if job.status in (COMPLETED, CANCELLED) and job.result:
+        st.session_state.messages = messages
+        display_process_summary(job.result)
+    elif job.status == CANCELLED:
+        st.warning("🛑 Run cancelled.")
+    elif job.status == FAILED:
+        st.error(f"Processing failed: {job.error}")
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def poll_job(job_id: str) -> None:
+    """Re-render a running job until it finishes, without rerunning the whole app."""
+    job = get_job_queue().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    display_job(job)
 
 def display_scenario_tab(tools: List[Dict], function_mapping: Dict, sample_scenarios: List[str]):
     """Display the scenario processing tab content."""
@@ -255,17 +506,24 @@ def display_scenario_tab(tools: List[Dict], function_mapping: Dict, sample_scena
 
     # Add scenario selector
     scenario = add_scenario_selector(sample_scenarios)
-    
-    # Reset the layout container when starting a new scenario
+
     if st.button("Process Scenario", key="process_scenario_button"):
-        if 'layout_container' in st.session_state:
-            del st.session_state.layout_container
-        
-        with st.spinner("Processing scenario..."):
-            messages, plan = process_scenario(
-                scenario=scenario,
-                o1_mini_client=st.session_state.o1_mini_client,
-                client=st.session_state.client,
-                tools=tools,
-                function_mapping=function_mapping
-            )
\ No newline at end of file
+        job = submit_scenario(scenario, tools, function_mapping)
+        st.session_state.active_job_id = job.id
+        # Keep the job ID in the URL so a page refresh can reattach to it
+        st.query_params['job'] = job.id
+
+    job_id = st.session_state.get('active_job_id') or st.query_params.get('job')
+    if not job_id:
+        return
+
+    job = get_job_queue().get(job_id)
+    if job is None:
+        display_unavailable_job(job_id)
+        return
+
+    st.session_state.active_job_id = job.id
+    if job.done:
+        display_job(job)
+    else:
+        poll_job(job.id)
@@ -0,0 +1,232 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from context_store import infer_primary_key, to_plain
+from integrity import format_path, infer_references, table_kind, values_at
+
+# How many example records and existing keys describe a table to the model
+SCHEMA_SAMPLE_RECORDS = 2
+SCHEMA_SAMPLE_KEYS = 50
+
+
+def is_record_table(value: Any) -> bool:
+    """Tables of JSON objects (keyed or listed) hold records; other values are settings."""
+    return table_kind(value) is not None
+
+
+def _records(value: Any) -> Iterable[Any]:
+    if hasattr(value, 'record_items'):
+        return (record for _, record in value.record_items())
+    if isinstance(value, dict):
+        return dict.values(value)
+    return iter(value)
+
+
+def _keys(value: Any, kind: str, primary_key: Any) -> Set[Any]:
+    if kind == 'dict':
+        return set(value.keys())
+    if primary_key is None:
+        return set()
+    return {record.get(primary_key) for record in _records(value) if isinstance(record, dict)}
+
+
+def infer_schema(data: Mapping) -> Dict[str, Dict[str, Any]]:
+    """Describe the record tables of `data`: their kind, key, fields and references.
+
+    `references` maps paths into the records (see integrity.infer_references), such
+    as medical_history[].treating_doctor or the keys of components_needed{}, to the
+    table they reference; the integrity report and generation share this one graph.
+    Settings (non-record values) are left out.
+    """
+    schema: Dict[str, Dict[str, Any]] = {}
+    for name, value in data.items():
+        kind = table_kind(value)
+        if kind is None:
+            continue
+        records = list(_records(value))
+        primary_key = infer_primary_key(records) if kind == 'list' else None
+        fields: Dict[str, None] = {}
+        for record in records:
+            fields.update(dict.fromkeys(record))
+        schema[name] = {
+            'kind': kind,
+            'primary_key': primary_key,
+            'fields': list(fields),
+            'references': {},
+            'size': len(records)
+        }
+
+    for name, path, target in infer_references(data):
+        schema[name]['references'][path] = target
+    return schema
+
+
+def infer_foreign_keys(data: Mapping) -> List[Tuple[str, str, str]]:
+    """Return the (table, field path, referenced table) relationships between record tables."""
+    return [(name, format_path(path), target)
+            for name, table in infer_schema(data).items()
+            for path, target in table['references'].items()]
+
+
+def table_keys(data: Mapping, schema: Dict[str, Dict[str, Any]], name: str) -> Set[Any]:
+    """Return the keys (dict keys or primary key values) of a record table."""
+    table = schema[name]
+    return _keys(data[name], table['kind'], table['primary_key'])
+
+
+def _ordered_keys(value: Any, kind: str, primary_key: Any) -> List[Any]:
+    if kind == 'dict':
+        return list(value.keys())
+    if primary_key is None:
+        return []
+    return [record.get(primary_key) for record in _records(value) if isinstance(record, dict)]
+
+
+def describe_schema(data: Mapping, schema: Dict[str, Dict[str, Any]],
+                    tables: Iterable[str] = None) -> Dict[str, Any]:
+    """Summarize tables for a generation prompt: examples, key patterns and references.
+
+    Rather than every row, each table is described by a few example records and its
+    latest keys; `referenced_keys` lists the keys new rows may reference.
+    """
+    names = list(tables if tables is not None else schema)
+    described = {}
+    for name in names:
+        table = schema[name]
+        value = data[name]
+        if table['kind'] == 'dict':
+            examples = {key: to_plain(value[key]) for key, _ in zip(value.keys(), range(SCHEMA_SAMPLE_RECORDS))}
+        else:
+            examples = [to_plain(record) for _, record in zip(range(SCHEMA_SAMPLE_RECORDS), _records(value))]
+        entry = {
+            'kind': table['kind'],
+            'key_field': table['primary_key'] if table['kind'] == 'list' else '(the object key)',
+            'record_count': table['size'],
+            'examples': examples,
+            'references': {format_path(path): target for path, target in table['references'].items()}
+        }
+        keys = _ordered_keys(value, table['kind'], table['primary_key'])
+        if keys:
+            entry['last_keys'] = [str(key) for key in keys[-5:]]
+        described[name] = entry
+
+    targets = {target for name in names for target in schema[name]['references'].values()}
+    referenced_keys = {
+        target: [str(key) for key in _ordered_keys(data[target], schema[target]['kind'],
+                                                   schema[target]['primary_key'])[-SCHEMA_SAMPLE_KEYS:]]
+        for target in sorted(targets)
+    }
+    return {'tables': described, 'referenced_keys': referenced_keys}
+
+
+def merge_rows(data: Mapping, schema: Dict[str, Dict[str, Any]], rows: Mapping[str, Any],
+               limit: int = None) -> Tuple[Dict[str, List[Tuple[Any, Any]]], List[Dict[str, Any]]]:
+    """Validate generated rows against the existing data before they are added.
+
+    `rows` holds, per table, an object of new key -> record (keyed tables) or a list of
+    new records. Rows are rejected if they are malformed, reuse an existing key, or
+    hold a value at any of the table's reference paths (nested ones included) that is
+    a key neither in the data nor among the accepted new rows. Unlike the integrity
+    report, which tolerates existing dangling references, new rows must be fully valid.
+    Returns the accepted (key, record) pairs per table and the rejected rows with reasons.
+    """
+    accepted: Dict[str, List[Tuple[Any, Any]]] = {}
+    rejected: List[Dict[str, Any]] = []
+    known = {name: table_keys(data, schema, name) for name in schema}
+
+    def reject(table, key, reason):
+        rejected.append({'table': table, 'key': key, 'reason': reason})
+
+    for name, new_rows in rows.items():
+        table = schema.get(name)
+        if table is None:
+            reject(name, None, 'not a record table')
+            continue
+        if table['kind'] == 'dict':
+            pairs = list(new_rows.items()) if isinstance(new_rows, Mapping) else []
+        else:
+            pairs = [(None, record) for record in new_rows] if isinstance(new_rows, list) else []
+        if not pairs and new_rows:
+            reject(name, None, f"expected {'an object of records' if table['kind'] == 'dict' else 'a list of records'}")
+        for key, record in pairs[:limit] if limit is not None else pairs:
+            if not isinstance(record, dict):
+                reject(name, key, 'not a JSON object')
+                continue
+            if table['kind'] == 'list' and table['primary_key']:
+                key = record.get(table['primary_key'])
+                if key is None:
+                    reject(name, None, f"missing key field {table['primary_key']}")
+                    continue
+            if key is not None and key in known[name]:
+                reject(name, key, 'key already exists')
+                continue
+            if key is not None:
+                known[name].add(key)
+            accepted.setdefault(name, []).append((key, record))
+        for key, _ in (pairs[limit:] if limit is not None else []):
+            reject(name, key, 'more rows than requested')
+
+    # Drop rows with dangling references until none are left, since dropping a row
+    # can leave rows that referenced it dangling in turn
+    changed = True
+    while changed:
+        changed = False
+        for name, pairs in accepted.items():
+            references = schema[name]['references']
+            kept = []
+            for key, record in pairs:
+                missing = [(path, value) for path, target in references.items()
+                           for value in values_at(record, path)
+                           if value not in known[target]]
+                if not missing:
+                    kept.append((key, record))
+                    continue
+                path, value = missing[0]
+                if key is not None:
+                    known[name].discard(key)
+                reject(name, key, f"{format_path(path)} references unknown {references[path]} key {value}")
+                changed = True
+            accepted[name] = kept
+    return {name: pairs for name, pairs in accepted.items() if pairs}, rejected
+
+
+def generation_levels(schema: Dict[str, Dict[str, Any]]) -> List[List[List[str]]]:
+    """Order record tables so that referenced tables are generated first.
+
+    Dependencies come from the path-aware references of the schema, so a table is
+    generated after the tables its nested fields or dict keys reference as well (e.g.
+    products after components). Returns levels of table groups: the groups of a level
+    do not reference each other and can be generated concurrently once the earlier
+    levels are merged. Tables that reference each other in a cycle form a single
+    group and are generated together.
+    """
+    def reachable(name: str) -> Set[str]:
+        seen, pending = set(), [name]
+        while pending:
+            for target in schema[pending.pop()]['references'].values():
+                if target in schema and target not in seen:
+                    seen.add(target)
+                    pending.append(target)
+        return seen
+
+    reach = {name: reachable(name) for name in schema}
+    groups: List[List[str]] = []
+    grouped: Set[str] = set()
+    for name in schema:
+        if name not in grouped:
+            group = [other for other in schema
+                     if other == name or (other in reach[name] and name in reach[other])]
+            groups.append(group)
+            grouped.update(group)
+
+    levels: List[List[List[str]]] = []
+    done: Set[str] = set()
+    while groups:
+        ready = [group for group in groups
+                 if all(target in done or target in group
+                        for name in group for target in reach[name])]
+        levels.append(ready)
+        for group in ready:
+            done.update(group)
+        groups = [group for group in groups if group not in ready]
+    return levels
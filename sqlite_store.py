@@ -0,0 +1,788 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+from collections.abc import MutableMapping, MutableSequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from context_store import ContextStore, TrackedDict, MISSING, normalize_name, to_plain
+from data_loader import DataFile
+
+DEFAULT_DATABASE_DIR = "context_db"
+# Bumped whenever the table layout changes, so existing databases are reimported
+STORAGE_FORMAT = 2
+
+# Digits of the position keys that order listed tables, in sorting order
+_POSITION_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+_POSITION_WIDTH = 8
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _field_expression(field: str, normalized: bool) -> str:
+    # Inlined rather than bound so that queries match the expression indexes
+    path = '$."' + field.replace('"', '\\"') + '"'
+    expression = "json_extract(doc, '" + path.replace("'", "''") + "')"
+    return f"normalize_name({expression})" if normalized else expression
+
+
+def _sql_normalize(value: Any) -> Optional[str]:
+    return None if value is None else normalize_name(value)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _position_key(index: int) -> str:
+    """The position key of the record at `index` of an imported list."""
+    digits = []
+    index += 1
+    while index:
+        index, digit = divmod(index, len(_POSITION_DIGITS))
+        digits.append(_POSITION_DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(_POSITION_WIDTH, '0')
+
+
+def _position_between(low: Optional[str], high: Optional[str]) -> str:
+    """Return a position key that sorts strictly between `low` and `high` (None for the ends).
+
+    Keys are fractions in base 36, so there is always room for another one and inserting
+    a record never renumbers the others. Generated keys never end in the lowest digit,
+    which keeps every pair of neighbouring keys apart.
+    """
+    low = low or ''
+    digits = []
+    i = 0
+    while True:
+        low_digit = _POSITION_DIGITS.index(low[i]) if i < len(low) else 0
+        high_digit = _POSITION_DIGITS.index(high[i]) if high is not None else len(_POSITION_DIGITS)
+        if high_digit - low_digit > 1:
+            digits.append(_POSITION_DIGITS[(low_digit + high_digit) // 2])
+            return ''.join(digits)
+        digits.append(_POSITION_DIGITS[low_digit])
+        if high_digit > low_digit:
+            # Past this digit the key is already below `high`
+            high = None
+        i += 1
+
+
+class SqliteDatabase:
+    """A use case's record tables stored as JSON documents in one SQLite file.
+
+    The tables imported from data.json are a pristine copy that is never changed:
+    every session (and every fork) layers its own overlay table of changed rows over
+    them (see SqliteTable), so changes never leak between sessions, starting a session
+    copies nothing and reimporting only happens when data.json changes.
+    The database runs in WAL mode so sessions can read while a run writes, and every
+    thread gets its own connection. Lookups by field use expression indexes created
+    on first use, so only the records a tool touches are ever loaded into memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self.conn
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS _tables (
+                name TEXT PRIMARY KEY,
+                sql_name TEXT,
+                kind TEXT,
+                primary_key TEXT
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS _meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Overlays (of sessions and forks), imported tables replaced while still in use,
+        # and the process that owns them
+        conn.execute("CREATE TABLE IF NOT EXISTS _scratch (sql_name TEXT PRIMARY KEY, pid INTEGER)")
+        # Per imported table: the live tables reading it and its row count and highest row ID
+        self._users: Dict[str, int] = {}
+        self._retired = set()
+        # Reentrant, as release() runs from garbage collection on whatever thread
+        self._users_lock = threading.RLock()
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._drop_stale_copies()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.create_function('normalize_name', 1, _sql_normalize, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def _drop_stale_copies(self) -> None:
+        # Overlays are dropped when their store is garbage collected; these outlived their process
+        rows = self.conn.execute("SELECT sql_name, pid FROM _scratch").fetchall()
+        for sql_name, pid in rows:
+            if not _process_alive(pid):
+                self.drop_table(sql_name)
+
+    def import_data(self, source: DataFile) -> bool:
+        """Import the record tables of a data file, unless already imported from the same revision.
+
+        Records are streamed from the file one at a time, so no table is ever held in
+        memory. Returns True if the tables were (re)imported.
+        """
+        signature = f"{STORAGE_FORMAT}:{source.signature}"
+        with self._lock:
+            conn = self.conn
+            row = conn.execute("SELECT value FROM _meta WHERE key = 'signature'").fetchone()
+            if row and row[0] == signature:
+                return False
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (sql_name,) in conn.execute("SELECT sql_name FROM _tables").fetchall():
+                    with self._users_lock:
+                        in_use = bool(self._users.get(sql_name))
+                        if in_use:
+                            # Sessions still read it through their overlays; dropped after the last one
+                            self._retired.add(sql_name)
+                    if in_use:
+                        conn.execute("INSERT OR REPLACE INTO _scratch VALUES (?, ?)", (sql_name, os.getpid()))
+                    else:
+                        conn.execute(f"DROP TABLE IF EXISTS {_quote(sql_name)}")
+                conn.execute("DELETE FROM _tables")
+
+                for position, name in enumerate(source.names):
+                    kind = source.record_kind(name)
+                    if kind is None:
+                        continue
+                    sql_name = f"t{position}_{uuid.uuid4().hex[:8]}"
+                    self._create_table(conn, sql_name, kind)
+                    first, invalid = [], []
+
+                    def rows():
+                        for key, record in source.iter_records(name):
+                            if not isinstance(record, dict):
+                                # Tables of arrays or mixed values are not record tables
+                                invalid.append(key)
+                                return
+                            if not first:
+                                first.append(record)
+                            if kind == 'dict':
+                                yield key, json.dumps(record), None
+                            else:
+                                yield None, json.dumps(record), _position_key(key)
+
+                    conn.executemany(f"INSERT INTO {_quote(sql_name)} (key, doc, pos) VALUES (?, ?, ?)", rows())
+                    if invalid:
+                        conn.execute(f"DROP TABLE {_quote(sql_name)}")
+                        continue
+                    primary_key = self._infer_primary_key(conn, sql_name, first[0]) if kind == 'list' else None
+                    if primary_key:
+                        self.ensure_index(sql_name, primary_key, False, conn)
+                    conn.execute("INSERT INTO _tables VALUES (?, ?, ?, ?)", (name, sql_name, kind, primary_key))
+
+                conn.execute("INSERT OR REPLACE INTO _meta VALUES ('signature', ?)", (signature,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return True
+
+    @staticmethod
+    def _infer_primary_key(conn: sqlite3.Connection, sql_name: str, first: Dict[str, Any]) -> Optional[str]:
+        # Like infer_primary_key, but counted in SQLite so the records are not loaded
+        for field in first:
+            if field != 'id' and not field.endswith('_id'):
+                continue
+            path = '$."' + field.replace('"', '\\"') + '"'
+            total, present, distinct, nested = conn.execute(
+                f"SELECT COUNT(*), COUNT(json_type(doc, ?)), COUNT(DISTINCT json_extract(doc, ?)), "
+                f"COUNT(CASE WHEN json_type(doc, ?) IN ('object', 'array') THEN 1 END) FROM {_quote(sql_name)}",
+                (path, path, path)
+            ).fetchone()
+            if total == present == distinct and not nested:
+                return field
+        return None
+
+    @staticmethod
+    def _create_table(conn: sqlite3.Connection, sql_name: str, kind: str) -> None:
+        # rid identifies a row, key holds the dict key of keyed tables and pos the
+        # position of records in listed tables (see _position_between)
+        conn.execute(f"""
+            CREATE TABLE {_quote(sql_name)} (
+                rid INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                doc TEXT NOT NULL,
+                pos TEXT
+            )
+        """)
+        if kind == 'list':
+            conn.execute(f"CREATE INDEX {_quote(f'ix_{sql_name}_pos')} ON {_quote(sql_name)} (pos)")
+
+    def create_overlay(self, seed: str = None) -> str:
+        """Create an overlay table for the changes to an imported table and return its name.
+
+        An overlay row replaces the imported row with the same rid; a NULL doc marks it
+        deleted. With `seed`, the overlay starts with the rows of that overlay.
+        """
+        overlay = f"overlay_{uuid.uuid4().hex[:12]}"
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Keys are not unique here: a deleted key can be added again under a new rid
+            conn.execute(f"CREATE TABLE {_quote(overlay)} (rid INTEGER PRIMARY KEY, key TEXT, doc TEXT, pos TEXT)")
+            conn.execute(f"CREATE INDEX {_quote(f'ix_{overlay}_key')} ON {_quote(overlay)} (key)")
+            conn.execute(f"CREATE INDEX {_quote(f'ix_{overlay}_pos')} ON {_quote(overlay)} (pos)")
+            if seed is not None:
+                conn.execute(f"INSERT INTO {_quote(overlay)} SELECT rid, key, doc, pos FROM {_quote(seed)}")
+            conn.execute("INSERT INTO _scratch VALUES (?, ?)", (overlay, os.getpid()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return overlay
+
+    def base_stats(self, sql_name: str) -> Tuple[int, int]:
+        """Return the row count and highest row ID of an imported table, which never change."""
+        stats = self._stats.get(sql_name)
+        if stats is None:
+            count, max_rid = self.conn.execute(f"SELECT COUNT(*), MAX(rid) FROM {_quote(sql_name)}").fetchone()
+            stats = self._stats[sql_name] = (count, max_rid or 0)
+        return stats
+
+    def acquire(self, sql_name: str) -> None:
+        """Note that a table reads imported table `sql_name`, which must then outlive a reimport."""
+        with self._users_lock:
+            self._users[sql_name] = self._users.get(sql_name, 0) + 1
+
+    def release(self, sql_name: str, overlay: str) -> None:
+        """Drop a table's overlay, and its imported table if that was replaced and no longer read."""
+        self.drop_table(overlay)
+        with self._users_lock:
+            self._users[sql_name] -= 1
+            unused = not self._users[sql_name]
+            if unused:
+                del self._users[sql_name]
+                unused = sql_name in self._retired
+                self._retired.discard(sql_name)
+        if unused:
+            self.drop_table(sql_name)
+
+    def ensure_index(self, sql_name: str, field: str, normalized: bool,
+                     conn: sqlite3.Connection = None) -> None:
+        """Create the expression index used to look records up by `field`."""
+        conn = conn or self.conn
+        index_name = f"ix_{sql_name}_{uuid.uuid5(uuid.NAMESPACE_OID, f'{field}:{normalized}').hex[:12]}"
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {_quote(index_name)} "
+            f"ON {_quote(sql_name)} ({_field_expression(field, normalized)})"
+        )
+
+    def drop_table(self, sql_name: str) -> None:
+        try:
+            self.conn.execute(f"DROP TABLE IF EXISTS {_quote(sql_name)}")
+            self.conn.execute("DELETE FROM _scratch WHERE sql_name = ?", (sql_name,))
+        except sqlite3.Error:
+            pass
+
+    def attach(self, store: ContextStore) -> List[str]:
+        """Serve the imported tables of `store` from the database instead of memory.
+
+        The store gets its own overlay of every table (dropped once the store is garbage
+        collected), so its changes, undo and reset never touch the imported data or
+        other sessions, and attaching takes the same time for any number of records.
+        """
+        # Under the import lock, so a reimport cannot drop the tables before they are in use
+        with self._lock:
+            rows = self.conn.execute("SELECT name, sql_name, kind, primary_key FROM _tables").fetchall()
+            tables = [
+                (SqliteDictTable if kind == 'dict' else SqliteListTable)(
+                    self, name, sql_name, self.create_overlay(), store, primary_key
+                )
+                for name, sql_name, kind, primary_key in rows
+            ]
+        with store.lock:
+            for table in tables:
+                # Attached as the baseline, not as a journaled change
+                dict.__setitem__(store.data, table.name, table)
+        return [table.name for table in tables]
+
+
+class SqliteRecord(TrackedDict):
+    """A record loaded from an SQLite table; its changes are written back to the row."""
+
+    __slots__ = ('__weakref__',)
+
+
+class _RowsView:
+    """A lazily streamed keys/values/items view over an SQLite table."""
+
+    def __init__(self, table: 'SqliteTable', mode: str):
+        self._table = table
+        self._mode = mode
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __iter__(self) -> Iterator[Any]:
+        for rid, key, doc in self._table._rows():
+            if self._mode == 'keys':
+                yield key
+                continue
+            record = self._table._record(rid, key, doc)
+            yield record if self._mode == 'values' else (key, record)
+
+
+class SqliteTable:
+    """Table API shared by keyed and listed SQLite tables.
+
+    Records are handed out as tracked dicts, so changes are journaled by the context
+    store (and can be rolled back) exactly like in-memory records.
+
+    The imported table is never written to: changed, added and deleted rows go to the
+    table's own overlay (a NULL doc marking a deleted row), and reads see the imported
+    rows the overlay does not replace, followed by the overlay's live rows. Both sides
+    are indexed alike, so SQLite looks rows up through the indexes of each.
+    """
+
+    external = True
+    # Column that orders the rows
+    _order = 'rid'
+
+    def __init__(self, db: SqliteDatabase, name: str, sql_name: str, overlay: str, store: ContextStore,
+                 primary_key: str = None):
+        self._db = db
+        self.name = name
+        self._sql_name = sql_name
+        self._overlay_name = overlay
+        self._overlay = _quote(overlay)
+        self._sql = (f"(SELECT rid, key, doc, pos FROM {_quote(sql_name)} WHERE rid NOT IN (SELECT rid FROM {self._overlay}) "
+                     f"UNION ALL SELECT rid, key, doc, pos FROM {self._overlay} WHERE doc IS NOT NULL)")
+        self._store = store
+        self._location = (name, None, ())
+        self.primary_key = primary_key
+        self._indexed = set()
+        # Keeps record identity stable while a tool holds on to a record
+        self._records = weakref.WeakValueDictionary()
+        db.acquire(sql_name)
+        weakref.finalize(self, db.release, sql_name, overlay)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}: {len(self)} records>"
+
+    def __len__(self) -> int:
+        # Counting through the union would scan the imported table; imported row IDs run
+        # from 1 to the highest one, so overlay rows up to it replace an imported row
+        count, max_rid = self._db.base_stats(self._sql_name)
+        replaced, live = self._db.conn.execute(
+            f"SELECT COUNT(CASE WHEN rid <= ? THEN 1 END), COUNT(doc) FROM {self._overlay}", (max_rid,)
+        ).fetchone()
+        return count - replaced + live
+
+    def _ensure_index(self, field: str, normalized: bool) -> None:
+        if (field, normalized) not in self._indexed:
+            self._db.ensure_index(self._sql_name, field, normalized)
+            self._db.ensure_index(self._overlay_name, field, normalized)
+            self._indexed.add((field, normalized))
+
+    def _rows(self, where: str = '', params: Tuple = ()) -> Iterator[Tuple[int, Any, str]]:
+        return self._db.conn.execute(f"SELECT rid, key, doc FROM {self._sql} {where} ORDER BY {self._order}", params)
+
+    def _record(self, rid: int, key: Any, doc: str) -> SqliteRecord:
+        value = json.loads(doc)
+        record_key = self._record_key(rid, key, value)
+        record = self._records.get(record_key)
+        if record is None:
+            record = SqliteRecord(value, self._store, (self.name, record_key, ()))
+            self._records[record_key] = record
+        return record
+
+    def write_back(self, record_key: Any, path: Tuple, container: Any) -> None:
+        """Persist a change made inside one of this table's records."""
+        rid = self._rid_for(record_key)
+        if rid is None:
+            return
+        record = self._records.get(record_key)
+        if not path or record is not None:
+            doc = to_plain(container if not path else record)
+        else:
+            row = self._db.conn.execute(f"SELECT doc FROM {self._sql} WHERE rid = ?", (rid,)).fetchone()
+            doc = json.loads(row[0])
+            node = doc
+            for part in path[:-1]:
+                node = node[part]
+            node[path[-1]] = to_plain(container)
+        self._put(rid, json.dumps(doc))
+
+    def _select_where(self, field: str, value: Any, normalized: bool) -> Iterator[Tuple[int, Any, str]]:
+        self._ensure_index(field, normalized)
+        target = normalize_name(value) if normalized else value
+        return self._rows(f"WHERE {_field_expression(field, normalized)} = ?", (target,))
+
+    def find_all(self, field: str, value: Any, normalized: bool = False) -> List[SqliteRecord]:
+        """Return every record whose `field` equals `value`, using an expression index."""
+        return [self._record(*row) for row in self._select_where(field, value, normalized)]
+
+    def find(self, field: str, value: Any, default: Any = None, normalized: bool = False) -> Any:
+        """Return the first record whose `field` equals `value`."""
+        for row in self._select_where(field, value, normalized):
+            return self._record(*row)
+        return default
+
+    def record_items(self) -> Iterator[Tuple[Any, Any]]:
+        """Yield (record key, record) pairs as plain dicts, without caching the records."""
+        for rid, key, doc in self._rows():
+            value = json.loads(doc)
+            yield self._record_key(rid, key, value), value
+
+    @property
+    def kind(self) -> str:
+        return 'dict' if isinstance(self, Mapping) else 'list'
+
+    def record_keys(self, field: str = None, value: Any = None, normalized: bool = False) -> List[Any]:
+        """Return the record keys of this table, or of its records whose `field` equals `value`.
+
+        The keys are selected in SQLite (through an expression index when filtering), so
+        no record is parsed.
+        """
+        if isinstance(self, Mapping):
+            column = 'key'
+        elif self.primary_key:
+            column = f"COALESCE({_field_expression(self.primary_key, False)}, '#' || rid)"
+        else:
+            column = "'#' || rid"
+        where, params = '', ()
+        if field is not None:
+            self._ensure_index(field, normalized)
+            where = f"WHERE {_field_expression(field, normalized)} = ?"
+            params = (normalize_name(value) if normalized else value,)
+        rows = self._db.conn.execute(f"SELECT {column} FROM {self._sql} {where} ORDER BY {self._order}", params)
+        return [key for (key,) in rows]
+
+    def head(self, limit: int) -> List[Dict[str, Any]]:
+        """Return the first `limit` records as plain dicts, e.g. for previews."""
+        rows = self._db.conn.execute(f"SELECT doc FROM {self._sql} ORDER BY {self._order} LIMIT ?", (limit,))
+        return [json.loads(doc) for (doc,) in rows]
+
+    def page(self, offset: int, limit: int) -> Any:
+        """Return `limit` records from position `offset` on as plain data shaped like the table.
+
+        Keyed tables give a dict of record key -> record, listed tables a list, so pages
+        can be displayed like in-memory tables without loading the rest.
+        """
+        return self.search(offset=offset, limit=limit)
+
+    def _match(self, text: Optional[str], filters: Optional[Mapping[str, Any]]) -> Tuple[str, List[Any]]:
+        # WHERE clause and parameters of a search; field filters use expression indexes
+        clauses, params = [], []
+        if text:
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            clauses.append("(CAST(key AS TEXT) LIKE ? ESCAPE '\\' OR doc LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        for field, value in (filters or {}).items():
+            self._ensure_index(field, False)
+            clauses.append(f"{_field_expression(field, False)} = ?")
+            params.append(value)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, text: str = None, filters: Mapping[str, Any] = None) -> int:
+        """Count the records a search() with the same arguments would find."""
+        where, params = self._match(text, filters)
+        return self._db.conn.execute(f"SELECT COUNT(*) FROM {self._sql} {where}", params).fetchone()[0]
+
+    def search(self, text: str = None, filters: Mapping[str, Any] = None,
+               offset: int = 0, limit: int = 50) -> Any:
+        """Return one page of the records matching a search, shaped like page().
+
+        `text` matches record keys and anywhere in the records' JSON (case-insensitive
+        for ASCII); `filters` maps top-level fields to the value they must equal. The
+        query runs in SQLite, so only the matching page is loaded.
+        """
+        where, params = self._match(text, filters)
+        rows = self._db.conn.execute(
+            f"SELECT key, doc FROM {self._sql} {where} ORDER BY {self._order} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        if isinstance(self, Mapping):
+            return {key: json.loads(doc) for key, doc in rows}
+        return [json.loads(doc) for _, doc in rows]
+
+    def fork_copy(self, store: ContextStore) -> 'SqliteTable':
+        """Copy this table for a forked store, which only copies the overlay of changed rows."""
+        return type(self)(self._db, self.name, self._sql_name, self._db.create_overlay(self._overlay_name),
+                          store, self.primary_key)
+
+    def __deepcopy__(self, memo):
+        return self.to_plain()
+
+    # Raw row operations, shared by mutations and their rollback
+
+    def _before_change(self) -> None:
+        # Forks that still share the table get their own copy before it changes
+        if self._store._forks:
+            self._store.preserve_for_forks(self.name)
+
+    def _put(self, rid: int, doc: Optional[str]) -> None:
+        # Replace a row in the overlay, keeping its key and position
+        self._db.conn.execute(
+            f"INSERT OR REPLACE INTO {self._overlay} (rid, key, doc, pos) "
+            f"SELECT rid, key, ?, pos FROM {self._sql} WHERE rid = ?", (doc, rid)
+        )
+
+    def _raw_insert(self, key: Any, value: Any, rid: int = None, pos: str = None) -> int:
+        self._before_change()
+        if rid is None:
+            # Past the imported rows, so a new row never replaces one of them
+            max_rid = self._db.base_stats(self._sql_name)[1]
+            rid = max(max_rid, self._db.conn.execute(f"SELECT MAX(rid) FROM {self._overlay}").fetchone()[0] or 0) + 1
+        self._db.conn.execute(
+            f"INSERT OR REPLACE INTO {self._overlay} (rid, key, doc, pos) VALUES (?, ?, ?, ?)",
+            (rid, key, json.dumps(to_plain(value)), pos)
+        )
+        self._store.table_changed(self.name, None)
+        return rid
+
+    def _raw_update(self, rid: int, value: Any) -> None:
+        self._before_change()
+        self._put(rid, json.dumps(to_plain(value)))
+        self._store.table_changed(self.name, None)
+
+    def _raw_delete(self, rid: int) -> None:
+        self._before_change()
+        if rid > self._db.base_stats(self._sql_name)[1]:
+            # Only ever added in the overlay
+            self._db.conn.execute(f"DELETE FROM {self._overlay} WHERE rid = ?", (rid,))
+        else:
+            self._put(rid, None)
+        self._store.table_changed(self.name, None)
+
+    def _forget(self, record_key: Any) -> None:
+        self._records.pop(record_key, None)
+
+
+class SqliteDictTable(SqliteTable, MutableMapping):
+    """A keyed table (record ID -> record) stored in SQLite."""
+
+    def _record_key(self, rid, key, doc):
+        return key
+
+    def _rid_for(self, record_key):
+        row = self._db.conn.execute(f"SELECT rid FROM {self._sql} WHERE key = ?", (record_key,)).fetchone()
+        return row[0] if row else None
+
+    def _load(self, key) -> Optional[Tuple[int, Any, str]]:
+        return self._db.conn.execute(
+            f"SELECT rid, key, doc FROM {self._sql} WHERE key = ?", (key,)
+        ).fetchone()
+
+    def __getitem__(self, key):
+        record = self._records.get(key)
+        if record is not None:
+            return record
+        row = self._load(key)
+        if row is None:
+            raise KeyError(key)
+        return self._record(*row)
+
+    def __contains__(self, key) -> bool:
+        return self._db.conn.execute(f"SELECT 1 FROM {self._sql} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter(_RowsView(self, 'keys'))
+
+    def keys(self):
+        return _RowsView(self, 'keys')
+
+    def values(self):
+        return _RowsView(self, 'values')
+
+    def items(self):
+        return _RowsView(self, 'items')
+
+    def find_keys(self, field: str, value: Any, normalized: bool = False) -> List[Any]:
+        """Return the keys of the records whose `field` equals `value`."""
+        return [key for _, key, _ in self._select_where(field, value, normalized)]
+
+    def _raw_set(self, key, value) -> None:
+        row = self._load(key)
+        self._forget(key)
+        if value is MISSING:
+            if row is not None:
+                self._raw_delete(row[0])
+        elif row is not None:
+            self._raw_update(row[0], value)
+        else:
+            self._raw_insert(key, value)
+
+    def _undo(self, op: str, key, old, new) -> None:
+        self._raw_set(key, old)
+
+    def describe(self, key, value) -> Tuple[Any, Any, str]:
+        return self.name, key, ''
+
+    def __setitem__(self, key, value):
+        with self._store.lock:
+            row = self._load(key)
+            old = json.loads(row[2]) if row else MISSING
+            self._raw_set(key, value)
+            self._store.record(self, 'set', key, old, value)
+
+    def __delitem__(self, key):
+        with self._store.lock:
+            row = self._load(key)
+            if row is None:
+                raise KeyError(key)
+            self._raw_set(key, MISSING)
+            self._store.record(self, 'set', key, json.loads(row[2]), MISSING)
+
+    def to_plain(self) -> Dict[str, Any]:
+        return {key: json.loads(doc) for _, key, doc in self._rows()}
+
+
+class SqliteListTable(SqliteTable, MutableSequence):
+    """A list of records stored in SQLite.
+
+    Rows are ordered by a position key (see _position_between) rather than by row ID,
+    so records can be inserted, replaced and removed anywhere without renumbering the
+    row IDs that address records without a primary key.
+    """
+
+    _order = 'pos'
+
+    def _record_key(self, rid, key, doc):
+        if self.primary_key and isinstance(doc, dict) and self.primary_key in doc:
+            return doc[self.primary_key]
+        return f"#{rid}"
+
+    def _rid_for(self, record_key):
+        if isinstance(record_key, str) and record_key.startswith('#') and record_key[1:].isdigit():
+            return int(record_key[1:])
+        if not self.primary_key:
+            return None
+        row = next(iter(self._select_where(self.primary_key, record_key, False)), None)
+        return row[0] if row else None
+
+    def _rows_at(self, start: int, count: int) -> List[Tuple[int, Any, str, str]]:
+        return self._db.conn.execute(
+            f"SELECT rid, key, doc, pos FROM {self._sql} ORDER BY pos LIMIT ? OFFSET ?", (count, start)
+        ).fetchall()
+
+    def _index(self, index: int) -> int:
+        size = len(self)
+        normalized = index + size if index < 0 else index
+        if not 0 <= normalized < size:
+            raise IndexError('list index out of range')
+        return normalized
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._record(*self._rows_at(self._index(index), 1)[0][:3])
+
+    def __iter__(self):
+        return iter(_RowsView(self, 'values'))
+
+    def record(self, record_key: Any) -> SqliteRecord:
+        """Return the record with a record key (primary key value, or #row ID without one)."""
+        rid = self._rid_for(record_key)
+        row = self._db.conn.execute(f"SELECT rid, key, doc FROM {self._sql} WHERE rid = ?", (rid,)).fetchone()
+        if row is None:
+            raise KeyError(record_key)
+        return self._record(*row)
+
+    # Changes are journaled with (row ID, position, position key) of the row: the row ID
+    # for undo, the position for replaying events and the key to undo a deletion in place
+
+    def describe(self, key, value) -> Tuple[Any, Any, str]:
+        return self.name, self._record_key(key[0], None, value), ''
+
+    def _undo(self, op: str, key, old, new) -> None:
+        rid, _, pos = key
+        if op == 'insert':
+            self._forget(self._record_key(rid, None, new[0]))
+            self._raw_delete(rid)
+        elif op == 'delete':
+            self._raw_insert(None, old, rid, pos)
+        else:
+            self._forget(self._record_key(rid, None, new))
+            self._raw_update(rid, old)
+
+    def insert(self, index, value):
+        with self._store.lock:
+            size = len(self)
+            index = max(0, index + size) if index < 0 else min(index, size)
+            if index == size:
+                # Ordered rather than MAX(pos), so both sides are read through their index
+                row = self._db.conn.execute(f"SELECT pos FROM {self._sql} ORDER BY pos DESC LIMIT 1").fetchone()
+                low = row[0] if row else None
+                high = None
+            else:
+                neighbours = [row[3] for row in self._rows_at(max(index - 1, 0), 2 if index else 1)]
+                low, high = (None, neighbours[0]) if index == 0 else neighbours
+            pos = _position_between(low, high)
+            rid = self._raw_insert(None, value, pos=pos)
+            self._store.record(self, 'insert', (rid, index, pos), MISSING, [value])
+
+    def _set_row(self, row: Tuple[int, Any, str, str], index: int, value) -> None:
+        rid, _, doc, pos = row
+        old = json.loads(doc)
+        self._forget(self._record_key(rid, None, old))
+        self._raw_update(rid, value)
+        self._store.record(self, 'set', (rid, index, pos), old, value)
+
+    def _delete_row(self, row: Tuple[int, Any, str, str], index: int) -> None:
+        rid, _, doc, pos = row
+        old = json.loads(doc)
+        self._forget(self._record_key(rid, None, old))
+        self._raw_delete(rid)
+        self._store.record(self, 'delete', (rid, index, pos), old, MISSING)
+
+    def __setitem__(self, index, value):
+        with self._store.lock:
+            if not isinstance(index, slice):
+                index = self._index(index)
+                self._set_row(self._rows_at(index, 1)[0], index, value)
+                return
+            values = list(value)
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                positions = range(start, stop, step)
+                if len(values) != len(positions):
+                    raise ValueError(f"attempt to assign sequence of size {len(values)} "
+                                     f"to extended slice of size {len(positions)}")
+                for position, item in zip(positions, values):
+                    self._set_row(self._rows_at(position, 1)[0], position, item)
+                return
+            # Like a list: the slice is replaced by the new records, however many there are
+            self._delete_range(range(start, stop))
+            for offset, item in enumerate(values):
+                self.insert(start + offset, item)
+
+    def __delitem__(self, index):
+        with self._store.lock:
+            if isinstance(index, slice):
+                self._delete_range(range(*index.indices(len(self))))
+                return
+            index = self._index(index)
+            self._delete_row(self._rows_at(index, 1)[0], index)
+
+    def _delete_range(self, positions: range) -> None:
+        if not positions:
+            return
+        first, last = min(positions[0], positions[-1]), max(positions[0], positions[-1])
+        rows = self._rows_at(first, last - first + 1)
+        # From the end, so the positions of the rows still to delete stay the same
+        for position in sorted(positions, reverse=True):
+            self._delete_row(rows[position - first], position)
+
+    def to_plain(self) -> List[Any]:
+        return [json.loads(doc) for _, _, doc in self._rows()]
@@ -0,0 +1,459 @@
+import argparse
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from integrity import reference_target
+from schema import infer_schema, table_keys
+
+# Generator specs are plain JSON-serializable dicts, one per record table
+SPEC_FORMAT = """A table spec is {"kind": "dict" | "list", "key": <sequence spec>, "key_field": <field or null>, "fields": {field: <field spec>}}.
+A field spec has a "type" and may set "null_rate" (the share of null values):
+  int / float    {"min", "max"}, sampled uniformly, or with "distribution": "normal" or "lognormal" and "mean", "std" (clipped to min/max); floats round to "decimals"
+  bool           {"p"}: probability of true
+                 Numbers and booleans may set "correlated_with" (a sibling number or boolean field) and "correlation" (-1 to 1)
+  choice         {"values", "weights"}: categorical values or a vocabulary (weights are optional)
+  sequence       {"prefix", "start", "width"}: unique IDs such as TXN1002, TXN1003, ...
+  ref            {"table"}: a key of another table
+  date/datetime  {"min", "max"}: ISO dates or date-times, sampled uniformly
+  list           {"min_length", "max_length", "items": <field spec>}
+  object         {"fields": {field: <field spec>}}
+  constant       {"value"}
+"""
+
+ID_PATTERN = re.compile(r'^(.*?)(\d+)$')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+DATETIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}$')
+LATENT_TYPES = ('int', 'float', 'bool')
+
+
+def _decimals(value: float) -> int:
+    text = repr(float(value))
+    return 0 if 'e' in text else len(text.split('.')[1].rstrip('0'))
+
+
+def sequence_spec(values: Iterable[Any], fallback_prefix: str = 'ID') -> Dict[str, Any]:
+    """Continue the ID pattern of `values` (a common prefix and a zero-padded number).
+
+    New IDs start above the highest existing number, so they never collide with the
+    existing ones. Values without a pattern continue as `<fallback_prefix>1`, `2`, ...
+    """
+    values = [str(value) for value in values]
+    matches = [ID_PATTERN.match(value) for value in values]
+    prefixes = Counter(match.group(1) for match in matches if match)
+    if not prefixes:
+        return {'type': 'sequence', 'prefix': fallback_prefix, 'start': len(values) + 1, 'width': 0}
+    prefix = prefixes.most_common(1)[0][0]
+    numbers = [match.group(2) for match in matches if match and match.group(1) == prefix]
+    return {
+        'type': 'sequence',
+        'prefix': prefix,
+        'start': max(int(number) for number in numbers) + 1,
+        'width': max(len(number) for number in numbers)
+    }
+
+
+def _is_sequence(values: List[str]) -> bool:
+    # Distinct IDs sharing a prefix, e.g. nested transaction IDs
+    matches = [ID_PATTERN.match(value) for value in values]
+    return (all(matches) and len(set(values)) == len(values)
+            and len({match.group(1) for match in matches}) == 1
+            and any(char.isalpha() for char in matches[0].group(1)))
+
+
+def infer_field_spec(values: List[Any], keys: Mapping[str, set], table: Optional[str] = None) -> Dict[str, Any]:
+    """Infer a field spec from the values a field holds across records.
+
+    `keys` maps record tables to their keys; strings that are mostly keys of another
+    table (see integrity.reference_target) become references to it, so values that
+    dangle in the data are not reproduced: references are only sampled from valid keys.
+    """
+    present = [value for value in values if value is not None]
+    null_rate = 1 - len(present) / len(values) if values else 0.0
+    spec = _infer_present(present, keys, table)
+    if null_rate and spec['type'] != 'constant':
+        spec['null_rate'] = round(null_rate, 3)
+    return spec
+
+
+def _infer_present(values: List[Any], keys: Mapping[str, set], table: Optional[str]) -> Dict[str, Any]:
+    if not values:
+        return {'type': 'constant', 'value': None}
+    if all(isinstance(value, bool) for value in values):
+        return {'type': 'bool', 'p': round(sum(values) / len(values), 3)}
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        kind = 'int' if all(isinstance(value, int) for value in values) else 'float'
+        low, high = min(values), max(values)
+        if low == high:
+            # A single observed value: vary it by half its size either way
+            low, high = low - abs(low) / 2, high + abs(high) / 2
+        spec = {'type': kind, 'min': low, 'max': high}
+        if kind == 'int':
+            spec['min'], spec['max'] = int(np.floor(low)), int(np.ceil(high))
+        else:
+            spec['decimals'] = max(_decimals(value) for value in values)
+        return spec
+    if all(isinstance(value, str) for value in values):
+        target = reference_target(set(values), keys, exclude=table)
+        if target is not None:
+            return {'type': 'ref', 'table': target}
+        if all(DATE_PATTERN.match(value) for value in values):
+            return {'type': 'date', 'min': min(values), 'max': max(values)}
+        if all(DATETIME_PATTERN.match(value) for value in values):
+            return {'type': 'datetime', 'min': min(values), 'max': max(values)}
+        if _is_sequence(values):
+            return sequence_spec(values)
+    if all(isinstance(value, list) for value in values):
+        lengths = [len(value) for value in values]
+        items = [item for value in values for item in value]
+        return {
+            'type': 'list',
+            'min_length': min(lengths),
+            'max_length': max(lengths),
+            'items': infer_field_spec(items, keys, table) if items else {'type': 'constant', 'value': None}
+        }
+    if all(isinstance(value, dict) for value in values):
+        fields: Dict[str, None] = {}
+        for value in values:
+            fields.update(dict.fromkeys(value))
+        return {
+            'type': 'object',
+            'fields': {field: infer_field_spec([value.get(field) for value in values], keys, table)
+                       for field in fields}
+        }
+    counts = Counter(json.dumps(value, sort_keys=True) for value in values)
+    return {
+        'type': 'choice',
+        'values': [json.loads(value) for value in counts],
+        'weights': [round(count / len(values), 3) for count in counts.values()]
+    }
+
+
+def infer_specs(data: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Infer a generator spec for every record table of `data`."""
+    schema = infer_schema(data)
+    keys = {name: {str(key) for key in table_keys(data, schema, name)} for name in schema}
+    specs = {}
+    for name, table in schema.items():
+        value = data[name]
+        records = list(value.values()) if table['kind'] == 'dict' else list(value)
+        key_field = table['primary_key']
+        fields = {}
+        for field in table['fields']:
+            if field == key_field:
+                continue
+            fields[field] = infer_field_spec([record.get(field) for record in records], keys, name)
+        specs[name] = {
+            'kind': table['kind'],
+            'key': sequence_spec(list(value.keys()) if table['kind'] == 'dict' else
+                                 [record.get(key_field) for record in records],
+                                 fallback_prefix=name.upper() + '_'),
+            'key_field': key_field,
+            'fields': fields
+        }
+    return specs
+
+
+def specs_signature(specs: Mapping[str, Mapping[str, Any]]) -> str:
+    """Fingerprint of the tables and fields specs cover, to tell when cached specs are outdated."""
+    shape = {name: sorted(spec['fields']) for name, spec in specs.items()}
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _valid_field_spec(spec: Any, tables: Iterable[str]) -> bool:
+    if not isinstance(spec, dict):
+        return False
+    kind = spec.get('type')
+    if kind in ('int', 'float'):
+        return (_is_number(spec.get('min')) and _is_number(spec.get('max')) and spec['min'] <= spec['max']
+                and spec.get('distribution', 'uniform') in ('uniform', 'normal', 'lognormal')
+                and all(_is_number(spec[param]) for param in ('mean', 'std') if param in spec))
+    if kind == 'bool':
+        return _is_number(spec.get('p')) and 0 <= spec['p'] <= 1
+    if kind == 'choice':
+        values, weights = spec.get('values'), spec.get('weights')
+        if not isinstance(values, list) or not values:
+            return False
+        return weights is None or (isinstance(weights, list) and len(weights) == len(values)
+                                   and all(_is_number(w) and w >= 0 for w in weights) and sum(weights) > 0)
+    if kind == 'sequence':
+        return isinstance(spec.get('prefix', ''), str) and isinstance(spec.get('start', 1), int)
+    if kind == 'ref':
+        return spec.get('table') in tables
+    if kind in ('date', 'datetime'):
+        try:
+            return np.datetime64(spec['min']) <= np.datetime64(spec['max'])
+        except (KeyError, TypeError, ValueError):
+            return False
+    if kind == 'list':
+        lengths = spec.get('min_length'), spec.get('max_length')
+        return (all(isinstance(length, int) and length >= 0 for length in lengths)
+                and lengths[0] <= lengths[1] and _valid_field_spec(spec.get('items'), tables))
+    if kind == 'object':
+        return isinstance(spec.get('fields'), dict) and all(
+            _valid_field_spec(field, tables) for field in spec['fields'].values())
+    return kind == 'constant'
+
+
+def _merge_field_spec(proposed: Any, inferred: Dict[str, Any], tables: Iterable[str]) -> Dict[str, Any]:
+    if not _valid_field_spec(proposed, tables):
+        return inferred
+    if proposed['type'] == 'sequence' and inferred['type'] == 'sequence':
+        # Continue from the IDs in the data, whatever the proposal started at
+        return inferred
+    return proposed
+
+
+def merge_specs(proposed: Any, inferred: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Combine proposed specs (e.g. written by a model or by hand) with inferred ones.
+
+    Every table and field comes from the inferred specs; a proposed field spec replaces
+    the inferred one when it is well formed. Keys always continue from the data, so
+    specs can be reused after rows were added.
+    """
+    proposed = proposed if isinstance(proposed, dict) else {}
+    merged = {}
+    for name, spec in inferred.items():
+        fields = proposed.get(name, {}).get('fields', {}) if isinstance(proposed.get(name), dict) else {}
+        fields = fields if isinstance(fields, dict) else {}
+        merged[name] = dict(spec, fields={
+            field: _merge_field_spec(fields.get(field), field_spec, inferred)
+            for field, field_spec in spec['fields'].items()
+        })
+    return merged
+
+
+def sample_sequence(spec: Mapping[str, Any], n: int) -> List[str]:
+    """Return the next `n` IDs of a sequence spec."""
+    prefix, width = spec.get('prefix', ''), spec.get('width', 0)
+    start = spec.get('start', 1)
+    return [f"{prefix}{number:0{width}d}" for number in range(start, start + n)]
+
+
+def _ranks(latent: np.ndarray) -> np.ndarray:
+    # Uniform (0, 1) values in the order of the latent draws
+    return (np.argsort(np.argsort(latent)) + 0.5) / len(latent)
+
+
+def _numbers(spec: Mapping[str, Any], n: int, rng: np.random.Generator,
+             latent: np.ndarray = None) -> np.ndarray:
+    low, high = float(spec.get('min', 0)), float(spec.get('max', 1))
+    distribution = spec.get('distribution', 'uniform')
+    mean, std = spec.get('mean', (low + high) / 2), spec.get('std', (high - low) / 6 or 1)
+    if latent is None:
+        latent = rng.standard_normal(n) if distribution in ('normal', 'lognormal') else None
+    elif distribution not in ('normal', 'lognormal'):
+        # Correlated uniform values follow the ranks of their latent draws
+        values = low + _ranks(latent) * (high - low + (1 if spec['type'] == 'int' else 0))
+        return np.clip(np.floor(values) if spec['type'] == 'int' else values, low, high)
+    if distribution == 'normal':
+        values = mean + std * latent
+    elif distribution == 'lognormal':
+        # Parameters of the underlying normal for the requested mean and spread
+        sigma = np.sqrt(np.log(1 + (std / mean) ** 2)) if mean > 0 else 1.0
+        mu = np.log(mean) - sigma ** 2 / 2 if mean > 0 else 0.0
+        values = np.exp(mu + sigma * latent)
+    elif spec['type'] == 'int':
+        return rng.integers(int(low), int(high) + 1, n)
+    else:
+        values = rng.uniform(low, high, n)
+    return np.clip(values, low, high)
+
+
+def _correlated_with(fields: Mapping[str, Mapping[str, Any]], name: str) -> Optional[str]:
+    other = fields[name].get('correlated_with')
+    if (fields[name]['type'] in LATENT_TYPES and other != name and other in fields
+            and fields[other]['type'] in LATENT_TYPES):
+        return other
+    return None
+
+
+def _latents(fields: Mapping[str, Mapping[str, Any]], n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Draw correlated standard normals for the fields linked by `correlated_with`."""
+    linked = {name for name in fields if _correlated_with(fields, name)}
+    linked |= {_correlated_with(fields, name) for name in linked}
+    latents: Dict[str, np.ndarray] = {}
+
+    def draw(name: str, seen: frozenset) -> np.ndarray:
+        if name not in latents:
+            z = rng.standard_normal(n)
+            other = _correlated_with(fields, name)
+            if other is not None and other not in seen:
+                r = float(np.clip(fields[name].get('correlation', 0), -1, 1))
+                z = r * draw(other, seen | {name}) + np.sqrt(1 - r * r) * z
+            latents[name] = z
+        return latents[name]
+
+    for name in fields:
+        if name in linked:
+            draw(name, frozenset())
+    return latents
+
+
+def sample_field(spec: Mapping[str, Any], n: int, rng: np.random.Generator,
+                 keys: Mapping[str, np.ndarray], counters: Dict[int, int] = None,
+                 latent: np.ndarray = None) -> List[Any]:
+    """Sample `n` values of a field spec as one NumPy operation per column.
+
+    `keys` maps tables to arrays of their keys, for references. `counters` tracks
+    how far each sequence spec has advanced, so IDs stay unique across calls.
+    `latent` holds standard normal draws for fields correlated with another one.
+    """
+    counters = {} if counters is None else counters
+    kind = spec['type']
+    if kind in ('int', 'float'):
+        values = _numbers(spec, n, rng, latent)
+        if kind == 'int':
+            result = np.rint(values).astype(np.int64).tolist()
+        else:
+            result = np.round(values, spec.get('decimals', 2)).tolist()
+    elif kind == 'bool':
+        draws = _ranks(latent) if latent is not None else rng.random(n)
+        result = (draws < spec.get('p', 0.5)).tolist()
+    elif kind == 'choice':
+        values = spec.get('values') or [None]
+        weights = np.asarray(spec.get('weights') or np.ones(len(values)), dtype=float)
+        picks = rng.choice(len(values), size=n, p=weights / weights.sum())
+        result = [values[i] for i in picks.tolist()]
+    elif kind == 'sequence':
+        offset = counters.get(id(spec), 0)
+        counters[id(spec)] = offset + n
+        result = sample_sequence(dict(spec, start=spec.get('start', 1) + offset), n)
+    elif kind == 'ref':
+        pool = keys.get(spec['table'])
+        if pool is None or not len(pool):
+            result = [None] * n
+        else:
+            result = pool[rng.integers(0, len(pool), n)].tolist()
+    elif kind in ('date', 'datetime'):
+        unit = 'D' if kind == 'date' else 's'
+        low, high = np.datetime64(spec['min'], unit), np.datetime64(spec['max'], unit)
+        if low == high:
+            low, high = low - np.timedelta64(365, 'D'), high + np.timedelta64(365, 'D')
+        span = (high - low).astype(np.int64)
+        values = low + rng.integers(0, span + 1, n).astype(f'timedelta64[{unit}]')
+        result = np.datetime_as_string(values, unit=unit).tolist()
+    elif kind == 'list':
+        lengths = rng.integers(spec.get('min_length', 0), spec.get('max_length', 0) + 1, n)
+        items = sample_field(spec['items'], int(lengths.sum()), rng, keys, counters)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).tolist()
+        result = [items[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    elif kind == 'object':
+        result = sample_records(spec['fields'], n, rng, keys, counters)
+    else:
+        result = [spec.get('value')] * n
+
+    null_rate = spec.get('null_rate', 0)
+    if null_rate:
+        for i in np.flatnonzero(rng.random(n) < null_rate).tolist():
+            result[i] = None
+    return result
+
+
+def sample_records(fields: Mapping[str, Mapping[str, Any]], n: int, rng: np.random.Generator,
+                   keys: Mapping[str, np.ndarray], counters: Dict[int, int] = None) -> List[Dict[str, Any]]:
+    """Sample `n` records column by column and assemble them into dicts."""
+    names = list(fields)
+    latents = _latents(fields, n, rng)
+    columns = [sample_field(fields[name], n, rng, keys, counters, latents.get(name)) for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)] if names else [{} for _ in range(n)]
+
+
+def synthesize(data: Mapping[str, Any], rows: int, seed: int = 0, specs: Dict[str, Dict[str, Any]] = None,
+               keep_existing: bool = True, table_rows: Mapping[str, int] = None) -> Dict[str, Any]:
+    """Generate `rows` new records per record table (`table_rows` overrides it per table).
+
+    Records follow the inferred (or given) specs, and references point at existing
+    or newly generated keys, so the result is referentially consistent. The same
+    data, specs and seed always produce the same output. Settings and tables without
+    a spec are copied as they are; with `keep_existing`, existing records are kept
+    (new records may reference them either way).
+    """
+    specs = infer_specs(data) if specs is None else specs
+    counts = {name: (table_rows or {}).get(name, rows) for name in specs}
+
+    # Keys come first so that every table, including ones in reference cycles, can
+    # point at the complete key set of the tables it references
+    new_keys = {name: sample_sequence(spec['key'], counts[name])
+                if spec['kind'] == 'dict' or spec['key_field'] else [] for name, spec in specs.items()}
+    keys = {}
+    for name, spec in specs.items():
+        existing = []
+        if name in data:
+            existing = (list(data[name].keys()) if spec['kind'] == 'dict' else
+                        [record.get(spec['key_field']) for record in data[name]] if spec['key_field'] else [])
+        keys[name] = np.array(existing + new_keys[name], dtype=object)
+
+    result = {}
+    for index, name in enumerate(data):
+        if name not in specs:
+            result[name] = data[name]
+            continue
+        spec = specs[name]
+        # One generator per table, so a table's rows do not depend on the others' counts
+        rng = np.random.default_rng([seed, index])
+        records = sample_records(spec['fields'], counts[name], rng, keys)
+        if spec['kind'] == 'dict':
+            table = dict(data[name]) if keep_existing else {}
+            table.update(zip(new_keys[name], records))
+        else:
+            if spec['key_field']:
+                records = [dict({spec['key_field']: key}, **record) for key, record in zip(new_keys[name], records)]
+            table = (list(data[name]) if keep_existing else []) + records
+        result[name] = table
+    return result
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate large, referentially consistent synthetic data from a use case's data.json")
+    parser.add_argument('source', help="data.json to infer the schema from")
+    parser.add_argument('--rows', type=int, default=1000, help="new records per table")
+    parser.add_argument('--table', action='append', default=[], metavar='NAME=ROWS',
+                        help="record count for one table (repeatable)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--spec', help="generator spec file overriding the inferred field specs")
+    parser.add_argument('--print-spec', action='store_true', help="print the inferred spec and exit")
+    parser.add_argument('--new-only', action='store_true', help="leave out the existing records (new ones may still reference them)")
+    parser.add_argument('--output', '-o', default='-', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with open(args.source, 'r') as f:
+        data = json.load(f)
+    specs = infer_specs(data)
+    if args.spec:
+        with open(args.spec, 'r') as f:
+            proposed = json.load(f)
+        # Cached model-written specs keep their tables next to a signature
+        specs = merge_specs(proposed.get('tables', proposed), specs)
+    if args.print_spec:
+        json.dump(specs, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    table_rows = {}
+    for override in args.table:
+        name, _, count = override.partition('=')
+        table_rows[name] = int(count)
+    result = synthesize(data, args.rows, seed=args.seed, specs=specs,
+                        keep_existing=not args.new_only, table_rows=table_rows)
+    # json.dumps encodes in one pass; json.dump streams small chunks and is far slower
+    text = json.dumps(result)
+    if args.output == '-':
+        sys.stdout.write(text + '\n')
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
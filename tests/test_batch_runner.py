@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from batch_runner import expand_template, list_entity_ids, list_fields, list_tables
+from context_store import ContextStore
+from data_loader import DataFile
+
+DATA = {
+    'claims': {
+        'CL1': {'status': 'Open', 'amount': 100, 'notes': ['late']},
+        'CL2': {'status': ' open ', 'amount': 250, 'notes': []},
+        'CL3': {'status': 'Closed', 'amount': 50, 'notes': []},
+    },
+    'payments': [
+        {'payment_id': 'P1', 'claim_id': 'CL1'},
+        {'payment_id': 'P2', 'claim_id': 'CL3'},
+    ],
+    'settings': {'currency': 'EUR'},
+    'regions': ['north', 'south'],
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(DATA))
+    # Every table is left lazy, as large tables are
+    return ContextStore(DataFile(path).load(lazy_threshold=0))
+
+
+def test_tables_and_fields_are_listed_without_loading_tables(store):
+    assert list_tables(store) == ['claims', 'payments']
+    assert list_fields(store, 'claims') == ['status', 'amount']
+    assert list_fields(store, 'payments') == ['payment_id', 'claim_id']
+    assert all(getattr(dict.get(store.data, name), 'lazy', False) for name in DATA)
+
+
+def test_entity_ids_come_from_the_field_index(store):
+    assert list_entity_ids(store.data['claims']) == ['CL1', 'CL2', 'CL3']
+    assert list_entity_ids(store.data['claims'], 'status', 'OPEN') == ['CL1', 'CL2']
+    assert list_entity_ids(store.data['payments'], 'claim_id', 'cl3') == ['P2']
+    assert list_entity_ids(store.data['payments'], 'claim_id', 'CL9') == []
+
+
+def test_entity_ids_follow_changes(store):
+    store.data['claims']['CL3']['status'] = 'open'
+    store.data['payments'].append({'payment_id': 'P3', 'claim_id': 'CL3'})
+
+    assert list_entity_ids(store.data['claims'], 'status', 'open') == ['CL1', 'CL2', 'CL3']
+    assert list_entity_ids(store.data['payments'], 'claim_id', 'CL3') == ['P2', 'P3']
+
+
+def test_expand_template_fills_the_placeholder():
+    assert expand_template("Review claim {id}", ['CL1', 'CL2']) == [
+        ('CL1', 'Review claim CL1'), ('CL2', 'Review claim CL2')
+    ]
@@ -0,0 +1,123 @@
+import gc
+
+import numpy as np
+import pytest
+
+from columnar import MAX_CACHED_VIEWS, ColumnarTable, columnar, field_value, filter_keys, top_k
+from context_store import ContextStore
+
+
+@pytest.fixture
+def store():
+    return ContextStore({
+        'fields': {
+            'F1': {'score': 0.2, 'soil': {'moisture': 10}, 'tags': ['a', 'b']},
+            'F2': {'score': 0.9, 'soil': {'moisture': 30}, 'tags': []},
+            'F3': {'score': 0.5, 'soil': {}, 'tags': ['c']},
+        },
+        'visits': [
+            {'visit_id': 'V1', 'hours': 2},
+            {'visit_id': 'V2', 'hours': 5},
+        ],
+    })
+
+
+def test_field_value_reads_nested_numbers_and_sizes():
+    record = {'a': {'b': 3}, 'flag': True, 'items': [1, 2], 'name': 'x'}
+    assert field_value(record, 'a.b') == 3.0
+    assert field_value(record, 'flag') == 1.0
+    assert field_value(record, 'items') == 2.0
+    assert field_value(record, 'name', fill_value=-1) == -1
+    assert field_value(record, 'a.missing') == 0.0
+
+
+def test_columns_follow_record_changes_and_rollback(store):
+    fields = store.data['fields']
+    view = columnar(fields, ['score', 'soil.moisture', 'tags'])
+    assert view.keys == ['F1', 'F2', 'F3']
+    np.testing.assert_array_equal(view['soil.moisture'], [10, 30, 0])
+    np.testing.assert_array_equal(view['tags'], [2, 0, 1])
+
+    mark = store.snapshot()
+    fields['F2']['soil']['moisture'] = 12
+    fields['F4'] = {'score': 1.0, 'soil': {'moisture': 7}}
+    np.testing.assert_array_equal(columnar(fields, ['soil.moisture'])['soil.moisture'], [10, 12, 0, 7])
+    np.testing.assert_array_equal(view['soil.moisture'], [10, 12, 0, 7])
+
+    store.rollback(mark)
+    assert view.keys == ['F1', 'F2', 'F3']
+    np.testing.assert_array_equal(view['soil.moisture'], [10, 30, 0])
+
+
+def test_assign_writes_through_the_journal(store):
+    visits = store.data['visits']
+    view = columnar(visits, ['hours'])
+    mark = store.snapshot()
+
+    assert view.assign('hours', view['hours'] * 2) == 2
+    assert [visit['hours'] for visit in visits] == [4, 10]
+    assert view.assign('hours', [4, 10]) == 0
+
+    store.rollback(mark)
+    assert [visit['hours'] for visit in visits] == [2, 5]
+    np.testing.assert_array_equal(view['hours'], [2, 5])
+
+
+def test_positions_and_select(store):
+    view = columnar(store.data['visits'], ['hours'])
+    ids, positions, missing = view.positions(['V2', 'V9'])
+    assert ids == ['V2'] and positions.tolist() == [1] and missing == ['V9']
+    assert view.select(view['hours'] > 3) == ['V2']
+
+
+def test_cached_views_are_bounded_and_stop_listening(store):
+    fields = store.data['fields']
+    listeners = len(store._listeners)
+    first = columnar(fields, ['score'])
+    assert columnar(fields, ['score']) is first
+
+    for i in range(MAX_CACHED_VIEWS):
+        columnar(fields, ['score', f'extra{i}'])
+
+    assert len([key for key in store.derived if key[0] == 'columnar']) == MAX_CACHED_VIEWS
+    assert ('columnar', 'fields', ('score',), 0.0) not in store.derived
+    assert len(store._listeners) == listeners + MAX_CACHED_VIEWS
+
+
+def test_unused_views_are_dropped_from_the_listeners(store):
+    listeners = len(store._listeners)
+    view = ColumnarTable(store.data['fields'], ['score'])
+    assert len(store._listeners) == listeners + 1
+
+    del view
+    gc.collect()
+    store.data['fields']['F1']['score'] = 0.3
+
+    assert len(store._listeners) == listeners
+
+
+def test_top_k_returns_highest_scores_first():
+    keys = ['a', 'b', 'c', 'd']
+    assert top_k(keys, np.array([0.1, 0.9, 0.5, 0.9]), 3) == [('b', 0.9), ('d', 0.9), ('c', 0.5)]
+    assert top_k(keys, [3, 1, 2, 0], 10) == [('a', 3.0), ('c', 2.0), ('b', 1.0), ('d', 0.0)]
+    assert top_k(keys, [3, 1, 2, 0], 0) == []
+
+
+def test_filter_keys_combines_conditions_and_reports_missing(store):
+    fields = store.data['fields']
+    filters = [{'field': 'score', 'op': '>=', 'value': 0.5}, {'field': 'soil.moisture', 'op': '<', 'value': 20}]
+    assert filter_keys(fields, filters) == (['F3'], [])
+    assert filter_keys(fields, [{'field': 'tags', 'op': '>', 'value': 0}], keys=['F2', 'F1', 'F9']) == (['F1'], ['F9'])
+
+    fields['F3']['soil']['moisture'] = 25
+    assert filter_keys(fields, filters) == ([], [])
+
+
+@pytest.mark.parametrize('condition', [
+    'score > 1',
+    {'field': 'score', 'op': '=~', 'value': 1},
+    {'field': 'score', 'op': '>', 'value': 'high'},
+])
+def test_filter_keys_rejects_invalid_filters(store, condition):
+    with pytest.raises(ValueError, match='Invalid filter'):
+        filter_keys(store.data['fields'], [condition])
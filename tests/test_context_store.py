@@ -0,0 +1,270 @@
+import copy
+import threading
+
+import pytest
+
+from context_store import ContextStore, find_record, replay_event, to_plain
+
+DATA = {
+    'customers': {
+        'C1': {'name': 'Ada Lovelace', 'plan': 'basic', 'tags': ['vip'], 'address': {'city': 'London'}},
+        'C2': {'name': 'Alan Turing', 'plan': 'premium', 'tags': [], 'address': {'city': 'Wilmslow'}},
+    },
+    'orders': [
+        {'order_id': 'O1', 'customer_id': 'C1', 'total': 10},
+        {'order_id': 'O2', 'customer_id': 'C2', 'total': 20},
+        {'order_id': 'O3', 'customer_id': 'C1', 'total': 30},
+    ],
+    'settings': {'threshold': 0.5},
+}
+
+
+@pytest.fixture
+def store():
+    return ContextStore(copy.deepcopy(DATA))
+
+
+def tables(data):
+    """Read every table through the routed API, as tools do, so an active fork is seen."""
+    return {name: to_plain(table) for name, table in data.items()}
+
+
+def mutate(data):
+    """Make one of every kind of change, at every depth."""
+    data['customers']['C1']['address']['city'] = 'Paris'
+    data['customers']['C1']['tags'].append('churn-risk')
+    del data['customers']['C2']['plan']
+    data['customers']['C3'] = {'name': 'Grace Hopper', 'tags': ['new']}
+    data['orders'].insert(0, {'order_id': 'O0', 'customer_id': 'C3', 'total': 5})
+    data['orders'][2]['total'] += 1
+    data['orders'].pop()
+    data['settings']['threshold'] = 0.9
+    data['audit'] = [{'event': 'mutated'}]
+
+
+def test_rollback_undoes_nested_changes(store):
+    mark = store.snapshot()
+    mutate(store.data)
+    assert to_plain(store.data) != DATA
+
+    store.rollback(mark)
+
+    assert to_plain(store.data) == DATA
+
+
+def test_rollback_to_intermediate_mark_keeps_earlier_changes(store):
+    store.data['customers']['C1']['address']['city'] = 'Paris'
+    mark = store.snapshot()
+    store.data['customers']['C1']['address']['city'] = 'Rome'
+    store.data['customers']['C1']['tags'].clear()
+
+    store.rollback(mark)
+
+    assert store.data['customers']['C1']['address']['city'] == 'Paris'
+    assert store.data['customers']['C1']['tags'] == ['vip']
+    store.reset()
+    assert to_plain(store.data) == DATA
+
+
+def test_transaction_rolls_back_on_failure(store):
+    store.data['settings']['threshold'] = 0.7
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            mutate(store.data)
+            raise RuntimeError("tool failed")
+
+    expected = copy.deepcopy(DATA)
+    expected['settings']['threshold'] = 0.7
+    assert to_plain(store.data) == expected
+
+
+def test_transaction_keeps_changes_on_success(store):
+    with store.transaction() as txn:
+        store.data['orders'][0]['total'] = 11
+
+    assert not txn.rolled_back
+    assert store.data['orders'][0]['total'] == 11
+    assert [change['key'] for change in txn.changes()] == ['O1']
+
+
+def test_transaction_does_not_block_other_writers(store):
+    inside, written = threading.Event(), threading.Event()
+
+    def other_writer():
+        inside.wait(5)
+        store.data['settings']['threshold'] = 0.8
+        written.set()
+
+    writer = threading.Thread(target=other_writer)
+    writer.start()
+    with store.transaction() as txn:
+        store.data['orders'][0]['total'] = 11
+        inside.set()
+        assert written.wait(5)
+        store.data['customers']['C1']['plan'] = 'premium'
+    writer.join()
+
+    assert [change['key'] for change in txn.changes()] == ['O1', 'C1']
+
+
+def test_transaction_rollback_keeps_interleaved_changes(store):
+    mark = store.snapshot()
+    with store.transaction() as txn:
+        store.data['orders'][0]['total'] = 11
+        # Another thread's change, made while the transaction is open
+        writer = threading.Thread(target=store.data['settings'].__setitem__, args=('threshold', 0.8))
+        writer.start()
+        writer.join()
+        del store.data['customers']['C2']
+        assert txn.rollback() == 2
+
+    assert txn.rolled_back
+    expected = copy.deepcopy(DATA)
+    expected['settings']['threshold'] = 0.8
+    assert to_plain(store.data) == expected
+
+    store.rollback(mark)
+    assert to_plain(store.data) == DATA
+
+
+def test_fork_is_isolated_from_parent_mutations(store):
+    # The fork reads one table before the parent changes it and leaves the others shared
+    fork = store.fork()
+    with fork.activate():
+        assert store.data['orders'][0]['total'] == 10
+
+    mutate(store.data)
+
+    with fork.activate():
+        assert tables(store.data) == DATA
+    assert tables(fork.data) == DATA
+    fork.release()
+
+
+def test_fork_changes_do_not_reach_parent(store):
+    fork = store.fork()
+    with fork.activate():
+        mutate(store.data)
+        forked = tables(store.data)
+
+    assert tables(store.data) == DATA
+    assert tables(fork.data) == forked
+    assert forked['settings']['threshold'] == 0.9
+    fork.release()
+
+
+def test_parent_changes_copy_only_the_changed_records_for_forks(store):
+    fork = store.fork()
+    store.data['customers']['C1']['address']['city'] = 'Paris'
+    store.data['customers']['C3'] = {'name': 'Grace Hopper'}
+    store.data['orders'][1]['total'] = 21
+
+    # The tables are still shared; only the records as they were have been kept for the fork
+    assert {'customers', 'orders'} <= fork.pending_tables
+    assert set(fork._preserved['customers']) == {'C1', 'C3'}
+    assert set(fork._preserved['orders']) == {1}
+    assert tables(fork.data) == DATA
+
+    store.data['orders'].append({'order_id': 'O4', 'customer_id': 'C2', 'total': 40})
+    assert 'orders' not in fork.pending_tables
+    assert tables(fork.data) == DATA
+    fork.release()
+
+
+def test_fork_does_not_share_records_the_parent_can_change(store):
+    # C1 is tracked by the parent before the fork, and changed after the fork copied the table
+    assert store.data['customers']['C1']['address']['city'] == 'London'
+    fork = store.fork()
+    assert fork.data['customers']['C2']['plan'] == 'premium'
+
+    store.data['customers']['C1']['address']['city'] = 'Paris'
+    store.data['customers']['C2']['plan'] = 'basic'
+
+    assert tables(fork.data) == DATA
+    fork.release()
+
+
+def test_fork_survives_parent_reset(store):
+    store.data['settings']['threshold'] = 0.9
+    fork = store.fork()
+
+    store.reset()
+
+    assert fork.data['settings']['threshold'] == 0.9
+    assert store.data['settings']['threshold'] == 0.5
+    fork.release()
+
+
+def test_list_index_follows_inserts_and_deletes(store):
+    orders = store.data['orders']
+    assert orders.find_keys('customer_id', 'C1') == [0, 2]
+
+    orders.append({'order_id': 'O4', 'customer_id': 'C1', 'total': 40})
+    assert orders.find_keys('customer_id', 'C1') == [0, 2, 3]
+
+    orders.insert(0, {'order_id': 'O0', 'customer_id': 'C1', 'total': 1})
+    assert orders.find_keys('customer_id', 'C1') == [0, 1, 3, 4]
+
+    del orders[1]
+    assert orders.find_keys('customer_id', 'C1') == [0, 2, 3]
+    assert [record['order_id'] for record in orders.find_all('customer_id', 'C1')] == ['O0', 'O3', 'O4']
+    assert find_record(orders, 'order_id', 'O1') is None
+
+
+def test_list_index_follows_changed_fields(store):
+    orders = store.data['orders']
+    assert orders.find_keys('customer_id', 'C2') == [1]
+
+    orders[0]['customer_id'] = 'C2'
+    orders[1] = {'order_id': 'O2', 'customer_id': 'C9', 'total': 20}
+
+    assert orders.find_keys('customer_id', 'C2') == [0]
+    assert orders.find_keys('customer_id', 'C9') == [1]
+    store.reset()
+    assert orders.find_keys('customer_id', 'C2') == [1]
+    assert orders.find_keys('customer_id', 'C9') == []
+
+
+def test_dict_index_follows_renames(store):
+    customers = store.data['customers']
+    assert customers.find_keys('name', '  ada LOVELACE ', normalized=True) == ['C1']
+
+    # Renaming a record moves it to a new key
+    customers['C7'] = customers.pop('C1')
+    assert customers.find_keys('name', 'Ada Lovelace', normalized=True) == ['C7']
+
+    # Renaming a field value moves the record to the new value
+    customers['C2']['name'] = 'Ada Lovelace'
+    assert sorted(customers.find_keys('name', 'ada lovelace', normalized=True)) == ['C2', 'C7']
+    assert customers.find_keys('name', 'Alan Turing') == []
+
+    store.reset()
+    assert customers.find_keys('name', 'Ada Lovelace') == ['C1']
+    assert customers.find_keys('name', 'Alan Turing') == ['C2']
+
+
+def test_undone_run_replays_to_the_same_state(store):
+    store.begin_run('run-1')
+    mutate(store.data)
+    store.end_run()
+    after = to_plain(store.data)
+
+    assert store.undo_last_run() == 'run-1'
+    assert to_plain(store.data) == DATA
+
+    assert store.replay_run('run-1') == len(store.run_events('run-1'))
+    assert to_plain(store.data) == after
+    assert store.undone_run is None
+
+
+def test_events_replay_onto_a_copy_of_the_initial_data(store):
+    store.begin_run('run-1')
+    mutate(store.data)
+    store.end_run()
+
+    replica = ContextStore(copy.deepcopy(DATA))
+    for event in store.run_events('run-1'):
+        replay_event(replica.data, event)
+
+    assert to_plain(replica.data) == to_plain(store.data)
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+from data_loader import DataFile, DataFileChanged, open_data_file
+
+DATA = {
+    'customers': {
+        'C1': {'name': 'Ada "the Countess" Lovelace', 'tags': ['vip', '{not a brace}'], 'address': {'city': 'London'}},
+        'C2': {'name': 'Alan Turing', 'tags': [], 'address': None},
+        'Cé': {'name': 'Renée \\ Dupont', 'tags': ['☃'], 'score': -1.5e3},
+    },
+    'orders': [
+        {'order_id': 'O1', 'customer_id': 'C1', 'items': [{'sku': 'A', 'qty': 2}], 'paid': True},
+        {'order_id': 'O2', 'customer_id': 'C2', 'items': [], 'paid': False},
+        {'order_id': 'O3', 'customer_id': 'C1', 'items': [[1, 2], [3]], 'note': None},
+    ],
+    'settings': {'threshold': 0.5, 'enabled': True},
+    'regions': ['north', 'south'],
+    'version': 3,
+    'empty': [],
+}
+
+
+@pytest.fixture(params=[False, True], ids=['scanner', 'cache'])
+def data_file(request, tmp_path):
+    path = tmp_path / 'retail' / 'data.json'
+    path.parent.mkdir()
+    # Indented, as use case files are, so whitespace between tokens is scanned too
+    path.write_text(json.dumps(DATA, indent=2))
+    return DataFile(path, str(tmp_path / 'cache') if request.param else None)
+
+
+def test_tables_read_like_json_load(data_file):
+    expected = json.loads(data_file.path.read_text())
+
+    assert data_file.names == list(expected)
+    assert {name: data_file.read(name) for name in data_file.names} == expected
+
+
+def test_record_kinds(data_file):
+    kinds = {name: data_file.record_kind(name) for name in data_file.names}
+
+    assert kinds['customers'] == 'dict' and kinds['orders'] == 'list'
+    assert kinds['version'] is None
+
+
+def test_iter_records_streams_keys_and_records(data_file):
+    assert list(data_file.iter_records('customers')) == list(DATA['customers'].items())
+    assert list(data_file.iter_records('orders')) == list(enumerate(DATA['orders']))
+    assert list(data_file.iter_records('orders', 1, 10)) == [(1, DATA['orders'][1]), (2, DATA['orders'][2])]
+    assert data_file.record_count('customers') == 3
+    with pytest.raises(ValueError):
+        list(data_file.iter_records('version'))
+
+
+def test_read_record_parses_one_record(data_file):
+    assert data_file.read_record('customers', 'Cé') == DATA['customers']['Cé']
+    assert data_file.read_record('orders', 2) == DATA['orders'][2]
+    for name, key in [('customers', 'C9'), ('orders', 3), ('orders', -1)]:
+        with pytest.raises(KeyError):
+            data_file.read_record(name, key)
+
+
+def test_lazy_tables_page_without_loading(data_file):
+    tables = data_file.load(lazy_threshold=0)
+    customers, orders = tables['customers'], tables['orders']
+
+    assert customers.lazy and orders.lazy
+    assert customers.page(1, 5) == {key: DATA['customers'][key] for key in list(DATA['customers'])[1:]}
+    assert orders.page(0, 2) == DATA['orders'][:2]
+    assert orders.head(1) == DATA['orders'][:1] and orders.record_count() == 3
+    assert customers.load() == DATA['customers']
+
+
+def test_cache_is_reused_until_the_file_changes(tmp_path):
+    path = tmp_path / 'retail' / 'data.json'
+    path.parent.mkdir()
+    path.write_text(json.dumps(DATA))
+    cache_dir = str(tmp_path / 'cache')
+    DataFile(path, cache_dir)
+    cache_path = tmp_path / 'cache' / 'retail.cache'
+    built = cache_path.stat().st_mtime_ns
+
+    assert DataFile(path, cache_dir).read('orders') == DATA['orders']
+    assert cache_path.stat().st_mtime_ns == built
+
+    path.write_text(json.dumps({**DATA, 'version': 4}))
+    assert DataFile(path, cache_dir).read('version') == 4
+
+
+def test_reading_a_changed_file_raises_data_file_changed(tmp_path):
+    path = tmp_path / 'retail' / 'data.json'
+    path.parent.mkdir()
+    path.write_text(json.dumps(DATA))
+    data_file = open_data_file(path)
+    path.write_text(json.dumps({**DATA, 'version': 4}))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    with pytest.raises(DataFileChanged):
+        data_file.read_record('orders', 0)
+    assert open_data_file(path).read('version') == 4
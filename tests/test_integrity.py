@@ -0,0 +1,68 @@
+import copy
+
+from context_store import ContextStore
+from integrity import (DICT_KEYS, ITEMS, check_integrity, format_path, infer_references, reference_target,
+                       values_at)
+
+DATA = {
+    'doctors': {'D1': {'name': 'House'}, 'D2': {'name': 'Grey'}},
+    'components': {'COMP_A': {'name': 'Bolt'}, 'COMP_B': {'name': 'Nut'}},
+    'patients': [
+        {'patient_id': 'PT1', 'doctor_id': 'D1', 'history': [{'treating_doctor': 'D2', 'note': 'fine'}]},
+        {'patient_id': 'PT2', 'doctor_id': 'D9', 'history': [{'treating_doctor': 'D1', 'note': 'sore'}]},
+        {'patient_id': 'PT3', 'doctor_id': 'D2', 'history': []},
+    ],
+    'products': {
+        'P1': {'components_needed': {'COMP_A': 2, 'COMP_B': 1}, 'status': 'active'},
+        'P2': {'components_needed': {'COMP_X': 1}, 'status': 'active'},
+    },
+    'settings': {'threshold': 0.5},
+}
+
+
+def test_reference_target_picks_the_largest_share():
+    keys = {'doctors': {'D1', 'D2'}, 'nurses': {'D1', 'N1'}, 'patients': {'D1', 'D2', 'D9'}}
+
+    assert reference_target({'D1', 'D2', 'D9'}, keys) == 'patients'
+    assert reference_target({'D1', 'D2', 'D9'}, keys, exclude='patients') == 'doctors'
+    # Half of the values must be keys of the target
+    assert reference_target({'D1', 'X1', 'X2'}, keys) is None
+    assert reference_target(set(), keys) is None
+
+
+def test_infer_references_finds_nested_paths_and_dict_keys():
+    references = set(infer_references(DATA))
+
+    assert references == {
+        ('patients', ('doctor_id',), 'doctors'),
+        ('patients', ('history', ITEMS, 'treating_doctor'), 'doctors'),
+        ('products', ('components_needed', DICT_KEYS), 'components'),
+    }
+    assert format_path(('history', ITEMS, 'treating_doctor')) == 'history[].treating_doctor'
+    assert format_path(('components_needed', DICT_KEYS)) == 'components_needed{}'
+
+
+def test_values_at_follows_items_and_dict_keys():
+    patient, product = DATA['patients'][0], DATA['products']['P1']
+
+    assert values_at(patient, ('history', ITEMS, 'treating_doctor')) == ['D2']
+    assert values_at(product, ('components_needed', DICT_KEYS)) == ['COMP_A', 'COMP_B']
+    assert values_at(patient, ('missing', ITEMS)) == []
+
+
+def test_check_integrity_reports_dangling_references():
+    report = check_integrity(DATA)
+
+    assert report['checked'] == 8
+    assert report['violation_count'] == 2
+    assert sorted((v['table'], v['key'], v['field'], v['value']) for v in report['violations']) == [
+        ('patients', 'PT2', 'doctor_id', 'D9'),
+        ('products', 'P2', 'components_needed{}', 'COMP_X'),
+    ]
+
+
+def test_check_integrity_reads_tracked_tables():
+    store = ContextStore(copy.deepcopy(DATA))
+    store.data['patients'][1]['doctor_id'] = 'D2'
+
+    assert check_integrity(store.data)['violation_count'] == 1
@@ -0,0 +1,138 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from job_queue import CANCELLED, COMPLETED, FAILED, RUNNING, Job, JobCancelled, JobQueue, QueueFull
+from scenario_processor import script_context
+
+
+def wait_until_done(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while not job.done:
+        assert time.time() < deadline, f"job {job.id} did not finish"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(max_workers=2, max_finished_jobs=2)
+
+
+def test_job_runs_in_the_background_and_keeps_its_log(queue):
+    def work(job, a, b=0):
+        job.add_message('info', 'adding')
+        return a + b
+
+    job = wait_until_done(queue.submit('add', work, 1, b=2, metadata={'use_case': 'demo'}))
+
+    assert job.status == COMPLETED and job.result == 3
+    assert job.metadata == {'use_case': 'demo'}
+    assert [message['content'] for message in job.get_messages()] == ['adding']
+    assert queue.get(job.id) is job
+
+
+def test_failed_job_records_the_error(queue):
+    def fail(job):
+        raise ValueError("bad input")
+
+    job = wait_until_done(queue.submit('fail', fail))
+
+    assert job.status == FAILED and job.error == "bad input"
+    assert job.get_messages()[-1]['arguments']['error_type'] == 'ValueError'
+
+
+def test_oldest_finished_jobs_are_evicted(queue):
+    jobs = [wait_until_done(queue.submit(f'job {i}', lambda job: None)) for i in range(3)]
+    queue.submit('last', lambda job: None)
+
+    assert queue.get(jobs[0].id) is None
+    assert queue.get('unknown') is None
+    assert queue.get(jobs[2].id) is jobs[2]
+
+
+def test_unfinished_jobs_are_never_evicted(queue):
+    release = threading.Event()
+    running = queue.submit('blocked', lambda job: release.wait(5))
+    for i in range(3):
+        wait_until_done(queue.submit(f'job {i}', lambda job: None))
+
+    assert queue.get(running.id) is running
+    release.set()
+    wait_until_done(running)
+
+
+def test_submit_raises_queue_full_once_max_pending_jobs_are_unfinished():
+    queue = JobQueue(max_workers=1, max_pending=2)
+    release = threading.Event()
+    jobs = [queue.submit(f'job {i}', lambda job: release.wait(5)) for i in range(2)]
+
+    with pytest.raises(QueueFull):
+        queue.submit('one too many', lambda job: None)
+    assert queue.pending() == 2
+
+    release.set()
+    for job in jobs:
+        wait_until_done(job)
+    wait_until_done(queue.submit('after', lambda job: None))
+
+
+def test_script_context_is_restored_after_a_run():
+    session_ctx = SimpleNamespace(pages_manager=SimpleNamespace(main_script_hash='main'))
+    with script_context(session_ctx):
+        assert get_script_run_ctx(suppress_warning=True) is session_ctx
+    assert get_script_run_ctx(suppress_warning=True) is None
+
+
+def test_cancel_stops_a_running_job_at_its_next_check(queue):
+    started = threading.Event()
+    steps = []
+
+    def work(job):
+        started.set()
+        while True:
+            job.raise_if_cancelled()
+            steps.append(1)
+            time.sleep(0.01)
+
+    job = queue.submit('loop', work)
+    assert started.wait(5)
+    assert queue.cancel(job.id)
+
+    assert wait_until_done(job).status == CANCELLED
+    assert not queue.cancel(job.id)
+    assert not queue.cancel('unknown')
+
+
+def test_cancel_interrupts_a_blocking_call_and_runs_callbacks(queue):
+    release = threading.Event()
+    callbacks = []
+
+    def work(job):
+        job.on_cancel(lambda: callbacks.append('cancelled'))
+        return job.run_interruptible(release.wait, 5)
+
+    job = queue.submit('blocking', work)
+    while job.status != RUNNING:
+        time.sleep(0.01)
+    started = time.time()
+    job.cancel()
+
+    assert wait_until_done(job).status == CANCELLED
+    assert time.time() - started < 1
+    assert callbacks == ['cancelled']
+    release.set()
+
+
+def test_callback_registered_after_cancel_runs_immediately():
+    job = Job('j1', 'label')
+    job.cancel()
+    callbacks = []
+    job.on_cancel(lambda: callbacks.append('cancelled'))
+
+    assert callbacks == ['cancelled']
+    with pytest.raises(JobCancelled):
+        job.raise_if_cancelled()
@@ -0,0 +1,67 @@
+import pytest
+
+from run_history import RunHistoryStore, scenario_hash
+
+
+def run(run_id, use_case='retail', scenario='Restock the store', outcome='completed', created_at=0.0):
+    return {
+        'run_id': run_id,
+        'use_case': use_case,
+        'scenario': scenario,
+        'outcome': outcome,
+        'created_at': created_at,
+        'planning_time': 1.5,
+        'execution_time': 2.0,
+        'operation_counts': {'function_calls': 3},
+        'log': [{'type': 'info', 'content': 'step'}],
+    }
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = RunHistoryStore(tmp_path / 'history')
+    store.append(run('r1', created_at=1.0))
+    store.append(run('r2', use_case='banking', scenario='Approve the loan', outcome='failed', created_at=2.0))
+    store.append(run('r3', scenario='  restock THE store ', created_at=3.0))
+    return store
+
+
+def test_scenario_hash_ignores_case_and_spacing():
+    assert scenario_hash('Restock  the store ') == scenario_hash('restock the STORE')
+    assert scenario_hash('Restock the store') != scenario_hash('Restock the shop')
+
+
+def test_get_loads_the_full_record(history):
+    record = history.get('r2')
+
+    assert record['scenario'] == 'Approve the loan'
+    assert record['log'] == [{'type': 'info', 'content': 'step'}]
+    assert history.get('missing') is None
+
+
+def test_query_filters_newest_first(history):
+    assert [row['run_id'] for row in history.query()] == ['r3', 'r2', 'r1']
+    assert [row['run_id'] for row in history.query(use_case='retail')] == ['r3', 'r1']
+    assert [row['run_id'] for row in history.query(scenario='restock the store')] == ['r3', 'r1']
+    assert [row['run_id'] for row in history.query(outcome='failed', since=1.5)] == ['r2']
+    assert [row['run_id'] for row in history.query(limit=1)] == ['r3']
+
+    row = history.query(outcome='failed')[0]
+    assert row['function_calls'] == 3 and row['duration'] == 3.5
+
+
+def test_rebuild_index_recovers_runs_from_the_log(history):
+    history.index_path.unlink()
+    rebuilt = RunHistoryStore(history.base_path)
+
+    assert rebuilt.rebuild_index() == 3
+    assert [row['run_id'] for row in rebuilt.query()] == ['r3', 'r2', 'r1']
+    assert rebuilt.get('r1')['scenario'] == 'Restock the store'
+
+
+def test_rebuild_index_stops_at_a_truncated_record(history):
+    with open(history.log_path, 'ab') as f:
+        f.write(b'RUN1\xff\x00\x00\x00partial')
+
+    assert history.rebuild_index() == 3
+    assert history.get('r3') is not None
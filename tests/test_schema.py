@@ -0,0 +1,140 @@
+import pytest
+
+from schema import generation_levels, infer_schema, merge_rows
+
+DATA = {
+    'components': {
+        'COMP_A': {'name': 'Bolt'},
+        'COMP_B': {'name': 'Nut'},
+    },
+    'suppliers': [
+        {'supplier_id': 'S1', 'name': 'Acme'},
+        {'supplier_id': 'S2', 'name': 'Globex'},
+    ],
+    'products': {
+        'P1': {'supplier_id': 'S1', 'components_needed': {'COMP_A': 2}, 'history': [{'supplier_id': 'S2'}]},
+        'P2': {'supplier_id': 'S2', 'components_needed': {'COMP_B': 1}, 'history': []},
+    },
+    'settings': {'currency': 'EUR'},
+}
+
+
+@pytest.fixture
+def schema():
+    return infer_schema(DATA)
+
+
+def reasons(rejected):
+    return {(row['table'], row['key']): row['reason'] for row in rejected}
+
+
+def test_valid_rows_are_accepted(schema):
+    accepted, rejected = merge_rows(DATA, schema, {
+        'suppliers': [{'supplier_id': 'S3', 'name': 'Initech'}],
+        'products': {'P3': {'supplier_id': 'S3', 'components_needed': {'COMP_A': 1},
+                            'history': [{'supplier_id': 'S1'}]}},
+    })
+
+    assert rejected == []
+    assert accepted['suppliers'] == [('S3', {'supplier_id': 'S3', 'name': 'Initech'})]
+    assert [key for key, _ in accepted['products']] == ['P3']
+
+
+def test_malformed_and_duplicate_rows_are_rejected(schema):
+    accepted, rejected = merge_rows(DATA, schema, {
+        'components': {'COMP_A': {'name': 'Again'}, 'COMP_C': 'not a record', 'COMP_D': {'name': 'Washer'}},
+        'suppliers': [{'name': 'No key'}, {'supplier_id': 'S3'}, {'supplier_id': 'S3'}],
+        'settings': {'currency': 'USD'},
+        'orders': [],
+    })
+
+    assert accepted == {'components': [('COMP_D', {'name': 'Washer'})],
+                        'suppliers': [('S3', {'supplier_id': 'S3'})]}
+    assert reasons(rejected) == {
+        ('components', 'COMP_A'): 'key already exists',
+        ('components', 'COMP_C'): 'not a JSON object',
+        ('suppliers', None): 'missing key field supplier_id',
+        ('suppliers', 'S3'): 'key already exists',
+        ('settings', None): 'not a record table',
+        ('orders', None): 'not a record table',
+    }
+
+
+def test_rows_of_the_wrong_shape_are_rejected(schema):
+    accepted, rejected = merge_rows(DATA, schema, {'components': [{'name': 'Listed'}]})
+
+    assert accepted == {}
+    assert reasons(rejected) == {('components', None): 'expected an object of records'}
+
+
+def test_dangling_nested_references_are_rejected(schema):
+    accepted, rejected = merge_rows(DATA, schema, {
+        'products': {
+            'P3': {'supplier_id': 'S1', 'components_needed': {'COMP_X': 1}, 'history': []},
+            'P4': {'supplier_id': 'S1', 'components_needed': {}, 'history': [{'supplier_id': 'S9'}]},
+        },
+    })
+
+    assert accepted == {}
+    assert reasons(rejected) == {
+        ('products', 'P3'): 'components_needed{} references unknown components key COMP_X',
+        ('products', 'P4'): 'history[].supplier_id references unknown suppliers key S9',
+    }
+
+
+def test_rejections_cascade_to_rows_referencing_rejected_rows():
+    data = {
+        'regions': {'R1': {'name': 'North'}},
+        'stores': [{'store_id': 'ST1', 'region_id': 'R1'}],
+        'staff': [{'staff_id': 'E1', 'store_id': 'ST1'}],
+    }
+    accepted, rejected = merge_rows(data, infer_schema(data), {
+        'stores': [{'store_id': 'ST2', 'region_id': 'R1'}, {'store_id': 'ST3', 'region_id': 'R9'}],
+        'staff': [{'staff_id': 'E2', 'store_id': 'ST2'}, {'staff_id': 'E3', 'store_id': 'ST3'}],
+    })
+
+    assert accepted == {'stores': [('ST2', {'store_id': 'ST2', 'region_id': 'R1'})],
+                        'staff': [('E2', {'staff_id': 'E2', 'store_id': 'ST2'})]}
+    assert reasons(rejected) == {
+        ('stores', 'ST3'): 'region_id references unknown regions key R9',
+        ('staff', 'E3'): 'store_id references unknown stores key ST3',
+    }
+
+
+def test_limit_rejects_extra_rows(schema):
+    accepted, rejected = merge_rows(DATA, schema, {
+        'components': {'COMP_C': {'name': 'Gear'}, 'COMP_D': {'name': 'Washer'}},
+    }, limit=1)
+
+    assert accepted == {'components': [('COMP_C', {'name': 'Gear'})]}
+    assert reasons(rejected) == {('components', 'COMP_D'): 'more rows than requested'}
+
+
+def references(**graph):
+    """A schema with only the references generation_levels reads: table -> referenced tables."""
+    return {name: {'references': {(f'{target}_id',): target for target in targets}}
+            for name, targets in graph.items()}
+
+
+def test_generation_levels_follow_nested_references(schema):
+    assert schema['products']['references'] == {
+        ('supplier_id',): 'suppliers',
+        ('components_needed', '{}'): 'components',
+        ('history', '[]', 'supplier_id'): 'suppliers',
+    }
+    assert generation_levels(schema) == [[['components'], ['suppliers']], [['products']]]
+
+
+def test_generation_levels_order_tables_referenced_only_by_dict_keys():
+    data = {'products': {'P1': {'parts': {'COMP_A': 2}}}, 'components': {'COMP_A': {'name': 'Bolt'}}}
+
+    assert generation_levels(infer_schema(data)) == [[['components']], [['products']]]
+
+
+def test_generation_levels_group_cycles():
+    levels = generation_levels(references(
+        orders=['customers', 'products'], customers=['accounts'], accounts=['customers'],
+        products=[], reviews=['orders', 'unknown'],
+    ))
+
+    assert levels == [[['customers', 'accounts'], ['products']], [['orders']], [['reviews']]]
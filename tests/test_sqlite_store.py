@@ -0,0 +1,160 @@
+import copy
+import gc
+import json
+
+import pytest
+
+from context_store import ContextStore, to_plain
+from data_loader import DataFile
+from sqlite_store import SqliteDatabase
+
+DATA = {
+    'claims': {
+        'CL1': {'status': 'Open', 'amount': 100},
+        'CL2': {'status': 'Closed', 'amount': 250},
+        'CL3': {'status': ' open ', 'amount': 50},
+    },
+    'payments': [
+        {'payment_id': 'P1', 'claim_id': 'CL1'},
+        {'payment_id': 'P2', 'claim_id': 'CL3'},
+        {'payment_id': 'P3', 'claim_id': 'CL1'},
+    ],
+    'settings': {'currency': 'EUR'},
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(DATA))
+    db = SqliteDatabase(tmp_path / 'context.sqlite')
+    db.import_data(DataFile(path))
+    return db
+
+
+def session(db):
+    store = ContextStore(copy.deepcopy(DATA))
+    db.attach(store)
+    return store
+
+
+def scratch_tables(db):
+    return {name for (name,) in db.conn.execute("SELECT sql_name FROM _scratch")}
+
+
+def test_sessions_do_not_see_each_others_changes(db):
+    a, b = session(db), session(db)
+    a.data['claims']['CL1']['status'] = 'Approved'
+    del a.data['claims']['CL2']
+    a.data['payments'].append({'payment_id': 'P4', 'claim_id': 'CL2'})
+
+    assert b.data['claims'].to_plain() == DATA['claims']
+    assert b.data['payments'].to_plain() == DATA['payments']
+    assert len(a.data['claims']) == 2 and len(a.data['payments']) == 4
+    assert len(b.data['claims']) == 3 and len(b.data['payments']) == 3
+
+
+def test_attaching_copies_no_rows(db):
+    store = session(db)
+    overlays = scratch_tables(db)
+
+    assert len(overlays) == 2
+    for name in overlays:
+        assert db.conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] == 0
+    store.data['claims']['CL1']['amount'] = 1
+    assert sum(db.conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in overlays) == 1
+
+
+def test_rollback_and_reset_restore_the_imported_rows(db):
+    store = session(db)
+    mark = store.snapshot()
+    claims, payments = store.data['claims'], store.data['payments']
+    claims['CL1']['status'] = 'Approved'
+    del claims['CL2']
+    claims['CL2'] = {'status': 'Reopened'}
+    claims['CL4'] = {'status': 'Open', 'amount': 10}
+    payments.insert(0, {'payment_id': 'P0', 'claim_id': 'CL4'})
+    del payments[2]
+    payments[1]['claim_id'] = 'CL2'
+
+    assert [p['payment_id'] for p in payments] == ['P0', 'P1', 'P3']
+    store.rollback(mark)
+    assert claims.to_plain() == DATA['claims'] and payments.to_plain() == DATA['payments']
+
+    claims['CL3']['status'] = 'Closed'
+    payments.append({'payment_id': 'P4'})
+    store.reset()
+    assert claims.to_plain() == DATA['claims'] and payments.to_plain() == DATA['payments']
+
+
+def test_list_slices_and_inserts_keep_their_order(db):
+    payments = session(db).data['payments']
+    payments.insert(1, {'payment_id': 'PA'})
+    payments.insert(-1, {'payment_id': 'PB'})
+    payments.append({'payment_id': 'PZ'})
+    payments.pop(0)
+
+    assert [p['payment_id'] for p in payments] == ['PA', 'P2', 'PB', 'P3', 'PZ']
+    assert [p['payment_id'] for p in payments[1:3]] == ['P2', 'PB']
+    assert payments.record('P3')['claim_id'] == 'CL1'
+
+
+def test_lookups_see_the_overlay(db):
+    store = session(db)
+    claims, payments = store.data['claims'], store.data['payments']
+    claims['CL2']['status'] = 'open'
+    del claims['CL3']
+    payments.append({'payment_id': 'P4', 'claim_id': 'CL1'})
+
+    assert claims.record_keys('status', 'OPEN', normalized=True) == ['CL1', 'CL2']
+    assert [p['payment_id'] for p in payments.find_all('claim_id', 'CL1')] == ['P1', 'P3', 'P4']
+    assert payments.record_keys() == ['P1', 'P2', 'P3', 'P4']
+    assert claims.count('open') == 2 and list(claims.search('open')) == ['CL1', 'CL2']
+    assert 'CL3' not in claims and claims.find('status', 'Closed') is None
+
+
+def test_forks_are_isolated_from_their_parent_and_each_other(db):
+    store = session(db)
+    store.data['claims']['CL1']['status'] = 'Approved'
+    fork = store.fork()
+    other = store.fork()
+
+    with fork.activate():
+        fork.data['claims']['CL2']['status'] = 'Rejected'
+        fork.data['payments'].append({'payment_id': 'P4'})
+    store.data['claims']['CL3']['status'] = 'Paid'
+
+    assert to_plain(fork.data['claims']) == {**DATA['claims'], 'CL1': {'status': 'Approved', 'amount': 100},
+                                             'CL2': {'status': 'Rejected', 'amount': 250}}
+    assert len(fork.data['payments']) == 4
+    assert to_plain(other.data['claims']) == {**DATA['claims'], 'CL1': {'status': 'Approved', 'amount': 100}}
+    assert store.data['claims']['CL2']['status'] == 'Closed'
+    assert len(store.data['payments']) == 3
+
+
+def test_overlays_are_dropped_with_their_store(db):
+    store = session(db)
+    fork = store.fork()
+    fork.data['claims']['CL1']['status'] = 'Approved'
+    assert len(scratch_tables(db)) == 3
+
+    fork.release()
+    del fork, store
+    gc.collect()
+    assert scratch_tables(db) == set()
+
+
+def test_reimport_keeps_tables_in_use_until_released(db, tmp_path):
+    store = session(db)
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps({**DATA, 'claims': {'CL9': {'status': 'New'}}}))
+
+    assert db.import_data(DataFile(path))
+    assert store.data['claims'].to_plain() == DATA['claims']
+    assert list(session(db).data['claims']) == ['CL9']
+
+    del store
+    gc.collect()
+    tables = {name for (name,) in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    imported = {name for (name,) in db.conn.execute("SELECT sql_name FROM _tables")}
+    assert {name for name in tables if not name.startswith(('_', 'overlay_'))} == imported
@@ -0,0 +1,79 @@
+import streamlit as st
+import pandas as pd
+from typing import Dict, Callable
+from tool_metrics import TOOL_METRICS, LATENCY_BUCKETS
+
+def format_bucket(upper: float) -> str:
+    """Label a latency histogram bucket by its upper bound."""
+    if upper == float('inf'):
+        return f"> {LATENCY_BUCKETS[-2] * 1000:g} ms"
+    return f"≤ {upper * 1000:g} ms"
+
+def display_profiling_tab(use_case: str, function_mapping: Dict[str, Callable]):
+    """Display per-tool latency statistics and opt-in cProfile captures."""
+    st.subheader("Tool Performance")
+    st.info("Call counts, errors, latency percentiles and result sizes for every tool invocation, aggregated across runs. Use the profiler to find slow or pathological functions.")
+
+    scope = st.radio(
+        "Scope",
+        ["Current use case", "All use cases"],
+        horizontal=True,
+        key="tool_metrics_scope"
+    )
+    rows = TOOL_METRICS.snapshot(use_case if scope == "Current use case" else None)
+
+    if not rows:
+        st.write("No tool calls recorded yet. Run an agentic workflow to collect metrics.")
+    else:
+        df = pd.DataFrame(rows)
+        st.dataframe(
+            df.round({'mean_ms': 3, 'p50_ms': 3, 'p95_ms': 3, 'max_ms': 3, 'mean_result_bytes': 1}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        chart_col, hist_col = st.columns(2)
+        with chart_col:
+            st.markdown("**p50 / p95 latency per tool (ms)**")
+            # Tools of different use cases can share a name, so label them by use case too
+            labels = df['function'] if scope == "Current use case" else df['use_case'] + '/' + df['function']
+            st.bar_chart(df.set_index(labels)[['p50_ms', 'p95_ms']], stack=False)
+        with hist_col:
+            hist_tool = st.selectbox(
+                "Latency histogram for",
+                [row['function'] for row in rows if row['use_case'] == use_case] or [None],
+                key="tool_metrics_histogram"
+            )
+            stats = TOOL_METRICS.get_stats(use_case, hist_tool) if hist_tool else None
+            if stats:
+                hist = pd.DataFrame({
+                    'bucket': [format_bucket(upper) for upper in LATENCY_BUCKETS],
+                    'calls': stats.bucket_counts
+                })
+                st.bar_chart(hist.set_index('bucket'), sort=False)
+
+        if st.button("Reset metrics", key="reset_tool_metrics"):
+            TOOL_METRICS.reset(use_case if scope == "Current use case" else None)
+            st.rerun()
+
+    st.markdown("---")
+    st.markdown("### cProfile capture")
+    st.info("While profiling is enabled, every call to the selected tool runs under cProfile. Profiled calls are serialized, so only enable it while investigating.")
+    profile_tool = st.selectbox(
+        "Tool to profile",
+        sorted(function_mapping),
+        key="profile_tool"
+    )
+    profiling = TOOL_METRICS.is_profiling(use_case, profile_tool)
+    enabled = st.toggle("Capture cProfile for this tool", value=profiling, key=f"profile_toggle_{profile_tool}")
+    if enabled and not profiling:
+        TOOL_METRICS.enable_profiling(use_case, profile_tool)
+    elif not enabled and profiling:
+        TOOL_METRICS.disable_profiling(use_case, profile_tool)
+
+    if enabled:
+        report = TOOL_METRICS.profile_report(use_case, profile_tool)
+        if report:
+            st.code(report, language="text")
+        else:
+            st.write(f"Waiting for the next call to `{profile_tool}`...")
@@ -0,0 +1,186 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf')
+)
+
+
+class ToolStats:
+    """Aggregated call statistics for a single tool function."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.error_results = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_result_bytes = 0
+        self.max_result_bytes = 0
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, duration: float, error: bool, error_result: bool, result_bytes: int) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self.error_results += int(error_result)
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.total_result_bytes += result_bytes
+        self.max_result_bytes = max(self.max_result_bytes, result_bytes)
+        for index, upper in enumerate(LATENCY_BUCKETS):
+            if duration <= upper:
+                self.bucket_counts[index] += 1
+                break
+
+    def percentile(self, q: float) -> float:
+        """Estimate a latency percentile (0-100) by interpolating within histogram buckets."""
+        if not self.calls:
+            return 0.0
+        rank = q / 100.0 * self.calls
+        seen = 0
+        for index, count in enumerate(self.bucket_counts):
+            if count and seen + count >= rank:
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = min(LATENCY_BUCKETS[index], self.max_time)
+                fraction = (rank - seen) / count
+                return lower + max(upper - lower, 0.0) * fraction
+            seen += count
+        return self.max_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_results': self.error_results,
+            'mean_ms': self.total_time / self.calls * 1000 if self.calls else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'max_ms': self.max_time * 1000,
+            'mean_result_bytes': self.total_result_bytes / self.calls if self.calls else 0.0,
+            'max_result_bytes': self.max_result_bytes
+        }
+
+
+class ToolMetrics:
+    """Thread-safe registry of per use case, per function tool statistics and profiles."""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], ToolStats] = {}
+        self._profiles: Dict[Tuple[str, str], cProfile.Profile] = {}
+        self._profiled_calls: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        # cProfile hooks are per thread, so profiled calls are serialized
+        self._profile_lock = threading.Lock()
+
+    def record(self, use_case: str, function_name: str, duration: float,
+               error: bool = False, error_result: bool = False, result_bytes: int = 0) -> None:
+        with self._lock:
+            stats = self._stats.setdefault((use_case, function_name), ToolStats())
+            stats.record(duration, error, error_result, result_bytes)
+
+    def get_stats(self, use_case: str, function_name: str) -> Optional[ToolStats]:
+        with self._lock:
+            return self._stats.get((use_case, function_name))
+
+    def snapshot(self, use_case: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return one row of statistics per tool, optionally limited to a use case."""
+        with self._lock:
+            return [
+                {'use_case': uc, 'function': name, **stats.to_dict()}
+                for (uc, name), stats in sorted(self._stats.items())
+                if use_case is None or uc == use_case
+            ]
+
+    def reset(self, use_case: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._stats if use_case is None or k[0] == use_case]:
+                del self._stats[key]
+
+    def enable_profiling(self, use_case: str, function_name: str) -> None:
+        """Start capturing a cProfile of every call to the given tool."""
+        with self._lock:
+            self._profiles.setdefault((use_case, function_name), cProfile.Profile())
+            self._profiled_calls.setdefault((use_case, function_name), 0)
+
+    def disable_profiling(self, use_case: str, function_name: str) -> None:
+        with self._lock:
+            self._profiles.pop((use_case, function_name), None)
+            self._profiled_calls.pop((use_case, function_name), None)
+
+    def is_profiling(self, use_case: str, function_name: str) -> bool:
+        with self._lock:
+            return (use_case, function_name) in self._profiles
+
+    def profile_report(self, use_case: str, function_name: str, limit: int = 25) -> Optional[str]:
+        """Return the cumulative-time cProfile report captured for a tool, if any."""
+        with self._lock:
+            profile = self._profiles.get((use_case, function_name))
+            calls = self._profiled_calls.get((use_case, function_name), 0)
+        if profile is None or not calls:
+            return None
+        stream = io.StringIO()
+        with self._profile_lock:
+            stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return f"Profiled calls: {calls}\n{stream.getvalue()}"
+
+    def call(self, use_case: str, function_name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Invoke a tool function, recording its latency, outcome and result size."""
+        with self._lock:
+            profile = self._profiles.get((use_case, function_name))
+
+        error = False
+        result = None
+        start_time = time.perf_counter()
+        try:
+            if profile is not None:
+                with self._profile_lock:
+                    result = profile.runcall(fn, *args, **kwargs)
+                    with self._lock:
+                        self._profiled_calls[(use_case, function_name)] = \
+                            self._profiled_calls.get((use_case, function_name), 0) + 1
+            else:
+                result = fn(*args, **kwargs)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            error_result = isinstance(result, dict) and 'error' in result
+            self.record(use_case, function_name, duration, error, error_result, _result_size(result))
+
+
+def _result_size(result: Any) -> int:
+    if result is None:
+        return 0
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def instrument_function_mapping(use_case: str, function_mapping: Dict[str, Callable],
+                                metrics: 'ToolMetrics' = None) -> Dict[str, Callable]:
+    """Wrap every function of a FUNCTION_MAPPING so its calls are recorded in `metrics`."""
+    metrics = metrics or TOOL_METRICS
+
+    def instrument(name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return metrics.call(use_case, name, fn, *args, **kwargs)
+        return wrapper
+
+    return {name: instrument(name, fn) for name, fn in function_mapping.items()}
+
+
+# Shared across sessions and reruns so statistics aggregate over every run
+TOOL_METRICS = ToolMetrics()
@@ -0,0 +1,221 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# A trace file is rotated to <path>.1 once it would grow past this size (TRACE_MAX_BYTES)
+DEFAULT_TRACE_MAX_BYTES = 50 * 1024 * 1024
+SERVICE_NAME = "agentic-demos"
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed operation with attributes, nested under an optional parent span."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status_code = STATUS_UNSET
+        self.status_message = ''
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds, up to now if the span is still open."""
+        end_time_ns = self.end_time_ns or time.time_ns()
+        return (end_time_ns - self.start_time_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append({'name': name, 'time_ns': time.time_ns(), 'attributes': attributes})
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)
+        self.add_event('exception', **{
+            'exception.type': type(error).__name__,
+            'exception.message': str(error)
+        })
+
+    def end(self) -> None:
+        if self.end_time_ns is None:
+            self.end_time_ns = time.time_ns()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Serialize the span using the OTLP/JSON field names."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.end_time_ns or time.time_ns()),
+            'attributes': _otlp_attributes(self.attributes),
+            'events': [
+                {
+                    'name': event['name'],
+                    'timeUnixNano': str(event['time_ns']),
+                    'attributes': _otlp_attributes(event['attributes'])
+                }
+                for event in self.events
+            ],
+            'status': {'code': self.status_code, 'message': self.status_message}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(v) for v in value]}}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+
+class JsonFileExporter:
+    """Appends finished spans to a file as OTLP/JSON lines, one export request per line.
+
+    This is the format written by the OpenTelemetry Collector file exporter, so the file
+    can be replayed through a Collector (otlpjsonfile receiver) into any trace viewer.
+    Once the file would grow past `max_bytes` it is renamed to <path>.1 (replacing the
+    previous one) and a new file is started, so traces take at most twice that on disk.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_TRACE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        request = {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        line = json.dumps(request)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.max_bytes and self.path.exists() and self.path.stat().st_size + len(line) > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + '.1'))
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; useful for inspecting a run in-process."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]) -> None:
+        self.spans.extend(spans)
+
+
+class Tracer:
+    """Creates nested spans and hands finished ones to pluggable exporters.
+
+    An exporter is any object with an `export(spans)` method. Until exporters are set,
+    spans are only written to a file if TRACE_EXPORT_PATH is set (see JsonFileExporter);
+    otherwise they are dropped once finished.
+    """
+
+    def __init__(self):
+        self._exporters = None
+        self._lock = threading.Lock()
+
+    @property
+    def exporters(self) -> list:
+        with self._lock:
+            if self._exporters is None:
+                path = os.getenv('TRACE_EXPORT_PATH')
+                max_bytes = int(os.getenv('TRACE_MAX_BYTES') or DEFAULT_TRACE_MAX_BYTES)
+                self._exporters = [JsonFileExporter(path, max_bytes)] if path else []
+            return list(self._exporters)
+
+    def set_exporters(self, exporters: list) -> None:
+        with self._lock:
+            self._exporters = list(exporters)
+
+    def add_exporter(self, exporter) -> None:
+        exporters = self.exporters
+        exporters.append(exporter)
+        self.set_exporters(exporters)
+
+    @contextmanager
+    def span(self, name: str, parent: Span = None, **attributes) -> Iterator[Span]:
+        """Open a span as a child of `parent`, or of the current span if none is given."""
+        parent = parent or _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export([span])
+            except Exception:
+                # Tracing must never break a run
+                pass
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def read_trace_file(path: str) -> Dict[str, Any]:
+    """Merge an OTLP/JSON lines file into a single export request document."""
+    resource_spans = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                resource_spans.extend(json.loads(line)['resourceSpans'])
+    return {'resourceSpans': resource_spans}
+
+
+tracer = Tracer()
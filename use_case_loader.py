@@ -1,13 +1,17 @@
-import json
 import importlib.util
+import os
 import sys
 from pathlib import Path
 from typing import Dict, Any, Tuple, List
 import inspect
+from tool_metrics import instrument_function_mapping
+from data_loader import open_data_file
 
 class UseCaseLoader:
-    def __init__(self, base_path: str = "use_cases"):
+    def __init__(self, base_path: str = "use_cases", cache_dir: str = None):
         self.base_path = Path(base_path)
+        # Directory of the optional binary cache of data.json files (DATA_CACHE_DIR)
+        self.cache_dir = cache_dir or os.getenv('DATA_CACHE_DIR') or None
         
     def load_use_cases(self) -> List[str]:
         """Load all available use cases from the use_cases directory."""
@@ -41,10 +45,9 @@ class UseCaseLoader:
     def load_use_case_components(self, use_case: str) -> Dict[str, Any]:
         """Load all components for a specific use case."""
         try:
-            # Load JSON data
+            # Load JSON data, streaming large tables in on first access
             data_path = self.base_path / use_case / "data.json"
-            with open(data_path, 'r') as f:
-                data = json.load(f)
+            data = open_data_file(data_path, self.cache_dir).load()
             
             # Import Python modules
             tools_module = self.import_module(use_case, "tools")
@@ -53,7 +56,9 @@ class UseCaseLoader:
             return {
                 'data': data,
                 'tools': getattr(tools_module, 'TOOLS', []),
-                'function_mapping': getattr(functions_module, 'FUNCTION_MAPPING', {}),
+                'function_mapping': instrument_function_mapping(
+                    use_case, getattr(functions_module, 'FUNCTION_MAPPING', {})
+                ),
                 'sample_scenarios': getattr(functions_module, 'SAMPLE_SCENARIOS', []),
                 'functions': inspect.getsource(functions_module)
             }
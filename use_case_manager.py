@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 import json
 import shutil
+from data_loader import sample_data
 
 def create_use_case_template(base_case: str) -> dict:
     """Load template files from an existing use case."""
@@ -9,9 +10,8 @@ def create_use_case_template(base_case: str) -> dict:
     template = {}
     
     try:
-        # Load data.json
-        with open(base_path / "data.json", "r") as f:
-            template["data"] = json.load(f)
+        # Load a sample of data.json; the template only needs to show its structure
+        template["data"] = sample_data(base_path / "data.json")
             
         # Load tools.py
         with open(base_path / "tools.py", "r") as f:
@@ -86,6 +86,8 @@ Instructions for Generating the New Files:
 - Include function mapping and sample scenarios demonstrating how the functions interact with the data (e.g., if an ID is required in a function, ensure it exists in the sample data).
 - Function mapping and sample scenarios should be included in the functions file.
 - Functions fetching customer details should accept both customer IDs and names as input.
+- Functions must read and update the data through `get_context()` (`from context_provider import get_context`) and must not import streamlit, so they can also run outside the app.
+- Look up records with `find_record`, `find_records` and `resolve_record` from `context_store` (as in the example) rather than looping over tables.
 - The values True and False must always be capitalized.
 - Return the output as a JSON object with three keys:
   - 'data' → A pure JSON object (not a string) representing the structured data. Do not include newline symbols (\\, \\n) in the JSON data object.
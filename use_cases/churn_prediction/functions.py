@@ -1,6 +1,9 @@
 # functions.py for Churn Prediction in Telecom
-import streamlit as st
-from typing import Dict, Any, List
+import numpy as np
+from context_provider import get_context
+from columnar import columnar, filter_keys, top_k as top_scores
+from context_store import find_record
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 
@@ -8,7 +11,7 @@ def get_customer_info(customer_id: str) -> Dict[str, Any]:
     """
     Retrieves high-level customer information including plan and monthly charges.
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
     customer = customers[customer_id]
@@ -26,7 +29,7 @@ def get_customer_usage(customer_id: str) -> Dict[str, Any]:
     """
     Fetches usage statistics for a particular customer (minutes, data usage, etc.).
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
     usage = customers[customer_id].get("usage", {})
@@ -41,7 +44,7 @@ def update_customer_info(customer_id: str, updates: Dict[str, Any]) -> Dict[str,
     """
     Updates the customer's information such as plan or churn score.
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
     for key, value in updates.items():
@@ -57,17 +60,23 @@ def fetch_risky_customers() -> List[Dict[str, Any]]:
     """
     Fetches a list of customers who have high churn scores based on the global threshold.
     """
-    customers = st.session_state.context['customers']
-    threshold = st.session_state.context['churn_model'].get('churn_threshold', 0.7)
-    results = []
-    for cid, data in customers.items():
-        score = data.get('churn_score', 0)
-        if score >= threshold:
-            results.append({
-                "customer_id": cid,
-                "churn_score": score
-            })
-    return results
+    customers = get_context()['customers']
+    threshold = get_context()['churn_model'].get('churn_threshold', 0.7)
+    view = columnar(customers, ['churn_score'])
+    scores = view['churn_score']
+    mask = scores >= threshold
+    return [
+        {"customer_id": cid, "churn_score": score}
+        for cid, score in zip(view.select(mask), scores[mask].tolist())
+    ]
+
+
+def churn_scores(data_gb_used, support_calls):
+    """
+    Placeholder heuristic combining usage and support calls, clipped at 1.0.
+    Works on single values as well as NumPy columns of the whole customer base.
+    """
+    return np.minimum(np.asarray(data_gb_used) / 10.0 + np.asarray(support_calls) * 0.05, 1.0)
 
 
 def predict_churn(customer_id: str) -> Dict[str, Any]:
@@ -75,17 +84,13 @@ def predict_churn(customer_id: str) -> Dict[str, Any]:
     Runs the churn model on a specific customer to calculate a fresh churn score.
     In this demo, we'll just simulate a nominal churn score update.
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
 
-    # Placeholder logic: simple heuristic combining usage and support calls.
     usage = customers[customer_id].get("usage", {})
     support_calls = customers[customer_id].get("support_calls", 0)
-    base_score = (usage.get("data_gb_used", 0) / 10.0) + (support_calls * 0.05)
-
-    # Clip at 1.0 for demonstration, or can apply sophisticated model.
-    churn_score = min(base_score, 1.0)
+    churn_score = float(churn_scores(usage.get("data_gb_used", 0), support_calls))
     customers[customer_id]["churn_score"] = churn_score
 
     return {
@@ -95,12 +100,50 @@ def predict_churn(customer_id: str) -> Dict[str, Any]:
     }
 
 
+def predict_churn_batch(customer_ids: Optional[List[str]] = None, top_k: int = 10,
+                        filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Runs the churn model on many customers at once (every customer by default),
+    updates their churn scores and returns the top_k customers most at risk.
+    Filters on numeric fields (e.g. churn_score >= 0.5) narrow the batch further.
+    """
+    customers = get_context()['customers']
+    threshold = get_context()['churn_model'].get('churn_threshold', 0.7)
+    missing = []
+    if filters:
+        try:
+            customer_ids, missing = filter_keys(customers, filters, customer_ids)
+        except ValueError as e:
+            return {"error": str(e)}
+    view = columnar(customers, ['usage.data_gb_used', 'support_calls'])
+    ids, positions, not_found = view.positions(customer_ids)
+    missing += not_found
+
+    scores = churn_scores(view['usage.data_gb_used'][positions], view['support_calls'][positions])
+    updated = view.assign('churn_score', scores, ids)
+
+    result = {
+        "scored_customers": len(ids),
+        "updated_customers": updated,
+        "churn_threshold": threshold,
+        "customers_above_threshold": int((scores >= threshold).sum()),
+        "top_customers": [
+            {"customer_id": cid, "churn_score": score}
+            for cid, score in top_scores(ids, scores, top_k)
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+    if missing:
+        result["not_found"] = missing
+    return result
+
+
 def propose_retention_action(customer_id: str) -> Dict[str, Any]:
     """
     Suggests a retention offer or action for a high-churn-risk customer.
     """
-    customers = st.session_state.context['customers']
-    retention_offers = st.session_state.context['retention_offers']
+    customers = get_context()['customers']
+    retention_offers = get_context()['retention_offers']
 
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
@@ -133,13 +176,13 @@ def apply_retention_offer(customer_id: str, offer_id: str) -> Dict[str, Any]:
     """
     Applies a specific retention offer to a customer's account.
     """
-    customers = st.session_state.context['customers']
-    retention_offers = st.session_state.context['retention_offers']
+    customers = get_context()['customers']
+    retention_offers = get_context()['retention_offers']
 
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
 
-    offer = next((o for o in retention_offers if o['offer_id'] == offer_id), None)
+    offer = find_record(retention_offers, 'offer_id', offer_id)
     if not offer:
         return {"error": f"Offer {offer_id} not found."}
 
@@ -158,7 +201,7 @@ def check_retention_resources() -> Dict[str, Any]:
     """
     Checks availability of retention resources (support agents, callback slots).
     """
-    resources = st.session_state.context['support_resources']
+    resources = get_context()['support_resources']
     return {
         "available_agents": resources["available_agents"],
         "callback_slots": resources["callback_slots"],
@@ -170,8 +213,8 @@ def schedule_follow_up(customer_id: str, follow_up_type: str) -> Dict[str, Any]:
     """
     Schedules a follow-up call or message.
     """
-    customers = st.session_state.context['customers']
-    resources = st.session_state.context['support_resources']
+    customers = get_context()['customers']
+    resources = get_context()['support_resources']
 
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
@@ -196,7 +239,7 @@ def generate_customer_survey(customer_id: str) -> Dict[str, Any]:
     """
     Generates a simple survey for the customer.
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
 
@@ -218,7 +261,7 @@ def gather_survey_results(customer_id: str, survey_responses: Dict[str, Any]) ->
     """
     Processes the survey responses and updates the customer's record.
     """
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {"error": f"Customer ID {customer_id} not found."}
 
@@ -239,6 +282,7 @@ FUNCTION_MAPPING = {
     'update_customer_info': update_customer_info,
     'fetch_risky_customers': fetch_risky_customers,
     'predict_churn': predict_churn,
+    'predict_churn_batch': predict_churn_batch,
     'propose_retention_action': propose_retention_action,
     'apply_retention_offer': apply_retention_offer,
     'check_retention_resources': check_retention_resources,
@@ -90,6 +90,43 @@ TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "predict_churn_batch",
+            "description": "Runs the churn model on many customers in one step (all customers unless customer_ids is given, narrowed by filters), updates their churn scores and returns a summary with the top_k customers most at risk. Prefer this over calling predict_churn for each customer.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "customer_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional list of customer IDs to score. Omit to score every customer."
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": "Number of highest-scoring customers to return (default 10)."
+                    },
+                    "filters": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "field": {"type": "string", "description": "Numeric field to compare, dotted for nested fields (e.g. churn_score, monthly_charge, support_calls or usage.data_gb_used). Lists compare by their length."},
+                                "op": {"type": "string", "enum": ["==", "!=", ">", ">=", "<", "<="]},
+                                "value": {"type": "number"}
+                            },
+                            "required": ["field", "op", "value"],
+                            "additionalProperties": False
+                        },
+                        "description": "Optional conditions every scored customer must meet, e.g. churn_score >= 0.5. Omit to score without filtering."
+                    }
+                },
+                "required": [],
+                "additionalProperties": False
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
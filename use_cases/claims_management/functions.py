@@ -1,5 +1,6 @@
 # functions.py - Implementation for suspicious-claim detection use case
-import streamlit as st
+from context_provider import get_context
+from context_store import find_record, resolve_record
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
@@ -8,8 +9,8 @@ def fetch_claim_details(claim_id: str) -> Dict[str, Any]:
     """
     Fetches all details related to a given claim.
     """
-    claims = st.session_state.context['claims']
-    claim = next((c for c in claims if c['claim_id'] == claim_id), None)
+    claims = get_context()['claims']
+    claim = find_record(claims, 'claim_id', claim_id)
     if not claim:
         return {"error": f"Claim {claim_id} not found."}
     return {"claim": claim}
@@ -19,7 +20,7 @@ def get_policyholder_info(policyholder_id: Optional[str] = None, policyholder_na
     """
     Retrieves policyholder details using either ID or name.
     """
-    policyholders = st.session_state.context['policyholders']
+    policyholders = get_context()['policyholders']
 
     # If an ID is provided, look it up.
     if policyholder_id:
@@ -29,9 +30,9 @@ def get_policyholder_info(policyholder_id: Optional[str] = None, policyholder_na
 
     # Otherwise, if a name is provided, search for a matching record.
     if policyholder_name:
-        for pid, data in policyholders.items():
-            if data.get('name') == policyholder_name:
-                return {"policyholder_id": pid, "info": data}
+        pid, data = resolve_record(policyholders, policyholder_name)
+        if data is not None:
+            return {"policyholder_id": pid, "info": data}
         return {"error": f"No policyholder found with name {policyholder_name}."}
 
     return {"error": "No policyholder_id or policyholder_name provided."}
@@ -41,9 +42,9 @@ def parse_claim_narrative(claim_id: str) -> Dict[str, Any]:
     """
     Uses advanced LLM logic to parse the claim description and identify suspicious keywords.
     """
-    claims = st.session_state.context['claims']
-    analysis_rules = st.session_state.context['analysis_rules']
-    claim = next((c for c in claims if c['claim_id'] == claim_id), None)
+    claims = get_context()['claims']
+    analysis_rules = get_context()['analysis_rules']
+    claim = find_record(claims, 'claim_id', claim_id)
 
     if not claim:
         return {"error": f"Claim {claim_id} not found."}
@@ -78,16 +79,16 @@ def run_ml_fraud_scoring(claim_id: str) -> Dict[str, Any]:
     """
     Runs the claim data and suspicious flags through a simple fraud model to produce a fraud score.
     """
-    claims = st.session_state.context['claims']
-    ml_model = st.session_state.context['ml_fraud_model']
-    suspicions = st.session_state.context['suspicions']
+    claims = get_context()['claims']
+    ml_model = get_context()['ml_fraud_model']
+    suspicions = get_context()['suspicions']
 
-    claim = next((c for c in claims if c['claim_id'] == claim_id), None)
+    claim = find_record(claims, 'claim_id', claim_id)
     if not claim:
         return {"error": f"Claim {claim_id} not found."}
 
     # Retrieve any suspicious flags that may have been computed.
-    suspicious_record = next((s for s in suspicions if s['claim_id'] == claim_id), None)
+    suspicious_record = find_record(suspicions, 'claim_id', claim_id)
     suspicious_flags_count = len(suspicious_record['suspicious_flags']) if suspicious_record else 0
 
     # Simple scoring: 0.4 * (amount / threshold_amount) + 0.3 * (risky type) + 0.3 * (# of suspicious flags)
@@ -99,7 +100,7 @@ def run_ml_fraud_scoring(claim_id: str) -> Dict[str, Any]:
 
     # Factor in claim type risk
     if 'claim_type' in ml_model['features']:
-        if claim.get('claim_type', "") in st.session_state.context['analysis_rules']['high_risk_claim_types']:
+        if claim.get('claim_type', "") in get_context()['analysis_rules']['high_risk_claim_types']:
             raw_score += 0.3
 
     # Factor in suspicious flags
@@ -120,8 +121,8 @@ def flag_claim_for_investigation(claim_id: str, reason: str) -> Dict[str, Any]:
     """
     Flags a claim for manual review.
     """
-    claims = st.session_state.context['claims']
-    claim = next((c for c in claims if c['claim_id'] == claim_id), None)
+    claims = get_context()['claims']
+    claim = find_record(claims, 'claim_id', claim_id)
 
     if not claim:
         return {"error": f"Claim {claim_id} not found."}
@@ -139,8 +140,8 @@ def update_claim_status(claim_id: str, new_status: str) -> Dict[str, Any]:
     """
     Updates the status of a claim.
     """
-    claims = st.session_state.context['claims']
-    claim = next((c for c in claims if c['claim_id'] == claim_id), None)
+    claims = get_context()['claims']
+    claim = find_record(claims, 'claim_id', claim_id)
 
     if not claim:
         return {"error": f"Claim {claim_id} not found."}
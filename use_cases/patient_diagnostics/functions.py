@@ -1,10 +1,11 @@
-import streamlit as st
+from context_provider import get_context
+from context_store import find_record, find_records
 from typing import Dict, Any, List
 from datetime import datetime
 
 # Retrieve a patient's full medical history
 def get_patient_history(patient_id: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
+    patients = get_context()['patients']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
     return {
@@ -16,7 +17,7 @@ def get_patient_history(patient_id: str) -> Dict[str, Any]:
 
 # Record a symptom for a particular patient
 def record_symptom(patient_id: str, symptom: str, severity: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
+    patients = get_context()['patients']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
     new_symptom = {
@@ -33,7 +34,7 @@ def record_symptom(patient_id: str, symptom: str, severity: str) -> Dict[str, An
 
 # Add a new diagnosis for a patient
 def add_diagnosis(patient_id: str, diagnosis: str, date: str, treating_doctor: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
+    patients = get_context()['patients']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
     diagnosis_entry = {
@@ -50,13 +51,13 @@ def add_diagnosis(patient_id: str, diagnosis: str, date: str, treating_doctor: s
 
 # Compile a timeline of patient events
 def compile_timeline(patient_id: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
-    lab_tests = st.session_state.context['lab_tests']
+    patients = get_context()['patients']
+    lab_tests = get_context()['lab_tests']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
     history = patients[patient_id].get("medical_history", [])
     symptoms = patients[patient_id].get("symptoms_reported", [])
-    patient_tests = [test for test in lab_tests if test.get("patient_id") == patient_id]
+    patient_tests = find_records(lab_tests, 'patient_id', patient_id)
     # Combine events into a single list
     events = []
     for dx in history:
@@ -92,8 +93,8 @@ def compile_timeline(patient_id: str) -> Dict[str, Any]:
 
 # Retrieve lab test results
 def get_lab_test_results(test_id: str) -> Dict[str, Any]:
-    lab_tests = st.session_state.context['lab_tests']
-    test = next((t for t in lab_tests if t["test_id"] == test_id), None)
+    lab_tests = get_context()['lab_tests']
+    test = find_record(lab_tests, 'test_id', test_id)
     if not test:
         return {"error": f"Lab test {test_id} not found."}
     return {
@@ -106,10 +107,10 @@ def get_lab_test_results(test_id: str) -> Dict[str, Any]:
 
 # Schedule a new lab test for a patient
 def schedule_lab_test(patient_id: str, test_type: str, date_conducted: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
+    patients = get_context()['patients']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
-    lab_tests = st.session_state.context['lab_tests']
+    lab_tests = get_context()['lab_tests']
     new_test_id = f"LT_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     new_test = {
         "test_id": new_test_id,
@@ -127,7 +128,7 @@ def schedule_lab_test(patient_id: str, test_type: str, date_conducted: str) -> D
 
 # Send an update message to a patient
 def send_patient_update(patient_id: str, message: str) -> Dict[str, Any]:
-    patients = st.session_state.context['patients']
+    patients = get_context()['patients']
     if patient_id not in patients:
         return {"error": f"Patient {patient_id} not found."}
     return {
@@ -1,6 +1,9 @@
 # functions.py for Crop Analysis
-import streamlit as st
-from typing import Dict, Any, List
+import numpy as np
+from context_provider import get_context
+from columnar import columnar, filter_keys, top_k as top_scores
+from context_store import find_record
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 
@@ -8,7 +11,7 @@ def get_field_info(field_id: str) -> Dict[str, Any]:
     """
     Retrieves high-level field information including plan and monthly charges.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
     field = fields[field_id]
@@ -26,7 +29,7 @@ def get_soil_quality(field_id: str) -> Dict[str, Any]:
     """
     Fetches soil quality metrics for a particular field.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
     soil_data = fields[field_id].get("soil_quality", {})
@@ -44,7 +47,7 @@ def update_field_info(field_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
     """
     Updates the field's information such as plan or analysis score.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
     for key, value in updates.items():
@@ -60,36 +63,36 @@ def fetch_high_risk_fields() -> List[Dict[str, Any]]:
     """
     Fetches a list of fields that have high analysis score based on the global threshold.
     """
-    fields = st.session_state.context['fields']
-    threshold = st.session_state.context['analysis_model'].get('analysis_threshold', 0.7)
-    results = []
-    for fid, data in fields.items():
-        score = data.get('analysis_score', 0)
-        if score >= threshold:
-            results.append({
-                "field_id": fid,
-                "analysis_score": score
-            })
-    return results
+    fields = get_context()['fields']
+    threshold = get_context()['analysis_model'].get('analysis_threshold', 0.7)
+    view = columnar(fields, ['analysis_score'])
+    scores = view['analysis_score']
+    mask = scores >= threshold
+    return [
+        {"field_id": fid, "analysis_score": score}
+        for fid, score in zip(view.select(mask), scores[mask].tolist())
+    ]
+
+
+def analysis_scores(moisture, disease_incidents):
+    """
+    Placeholder heuristic combining soil moisture and disease incidents, clipped at 1.0.
+    Works on single values as well as NumPy columns of every field.
+    """
+    return np.minimum(np.asarray(moisture) / 10.0 + np.asarray(disease_incidents) * 0.1, 1.0)
 
 
 def predict_analysis_score(field_id: str) -> Dict[str, Any]:
     """
     Runs the analysis model on a specific field to calculate a fresh analysis score.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
 
-    # Placeholder heuristic for demonstration
     soil = fields[field_id].get("soil_quality", {})
     crop_health = fields[field_id].get("crop_health", {})
-    moisture_factor = soil.get("moisture", 0) / 10.0
-    disease_factor = crop_health.get("disease_incidents", 0) * 0.1
-
-    base_score = moisture_factor + disease_factor
-    # Clip at 1.0 for demonstration
-    analysis_score = min(base_score, 1.0)
+    analysis_score = float(analysis_scores(soil.get("moisture", 0), crop_health.get("disease_incidents", 0)))
     fields[field_id]["analysis_score"] = analysis_score
 
     return {
@@ -99,12 +102,50 @@ def predict_analysis_score(field_id: str) -> Dict[str, Any]:
     }
 
 
+def predict_analysis_score_batch(field_ids: Optional[List[str]] = None, top_k: int = 10,
+                                 filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Runs the analysis model on many fields at once (every field by default),
+    updates their analysis scores and returns the top_k highest-scoring fields.
+    Filters on numeric fields (e.g. soil_quality.moisture < 30) narrow the batch further.
+    """
+    fields = get_context()['fields']
+    threshold = get_context()['analysis_model'].get('analysis_threshold', 0.7)
+    missing = []
+    if filters:
+        try:
+            field_ids, missing = filter_keys(fields, filters, field_ids)
+        except ValueError as e:
+            return {"error": str(e)}
+    view = columnar(fields, ['soil_quality.moisture', 'crop_health.disease_incidents'])
+    ids, positions, not_found = view.positions(field_ids)
+    missing += not_found
+
+    scores = analysis_scores(view['soil_quality.moisture'][positions], view['crop_health.disease_incidents'][positions])
+    updated = view.assign('analysis_score', scores, ids)
+
+    result = {
+        "scored_fields": len(ids),
+        "updated_fields": updated,
+        "analysis_threshold": threshold,
+        "fields_above_threshold": int((scores >= threshold).sum()),
+        "top_fields": [
+            {"field_id": fid, "analysis_score": score}
+            for fid, score in top_scores(ids, scores, top_k)
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+    if missing:
+        result["not_found"] = missing
+    return result
+
+
 def propose_recommendation(field_id: str) -> Dict[str, Any]:
     """
     Suggests a recommendation or action for a high-analysis-score field.
     """
-    fields = st.session_state.context['fields']
-    recommendations = st.session_state.context['recommendations']
+    fields = get_context()['fields']
+    recommendations = get_context()['recommendations']
 
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
@@ -136,13 +177,13 @@ def apply_recommendation(field_id: str, recommendation_id: str) -> Dict[str, Any
     """
     Applies a specific recommendation to a field.
     """
-    fields = st.session_state.context['fields']
-    recommendations = st.session_state.context['recommendations']
+    fields = get_context()['fields']
+    recommendations = get_context()['recommendations']
 
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
 
-    rec = next((r for r in recommendations if r['recommendation_id'] == recommendation_id), None)
+    rec = find_record(recommendations, 'recommendation_id', recommendation_id)
     if not rec:
         return {"error": f"Recommendation {recommendation_id} not found."}
 
@@ -160,7 +201,7 @@ def check_support_resources() -> Dict[str, Any]:
     """
     Checks availability of retention resources (agents, field visit slots).
     """
-    resources = st.session_state.context['support_resources']
+    resources = get_context()['support_resources']
     return {
         "available_agents": resources["available_agents"],
         "field_visit_slots": resources["field_visit_slots"],
@@ -172,8 +213,8 @@ def schedule_field_visit(field_id: str, visit_type: str) -> Dict[str, Any]:
     """
     Schedules a field visit.
     """
-    fields = st.session_state.context['fields']
-    resources = st.session_state.context['support_resources']
+    fields = get_context()['fields']
+    resources = get_context()['support_resources']
 
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
@@ -199,7 +240,7 @@ def generate_field_survey(field_id: str) -> Dict[str, Any]:
     """
     Generates a simple survey for the field owner.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
 
@@ -220,7 +261,7 @@ def gather_survey_results(field_id: str, survey_responses: Dict[str, Any]) -> Di
     """
     Processes the survey responses and updates the field record.
     """
-    fields = st.session_state.context['fields']
+    fields = get_context()['fields']
     if field_id not in fields:
         return {"error": f"Field ID {field_id} not found."}
 
@@ -238,6 +279,7 @@ FUNCTION_MAPPING = {
     'update_field_info': update_field_info,
     'fetch_high_risk_fields': fetch_high_risk_fields,
     'predict_analysis_score': predict_analysis_score,
+    'predict_analysis_score_batch': predict_analysis_score_batch,
     'propose_recommendation': propose_recommendation,
     'apply_recommendation': apply_recommendation,
     'check_support_resources': check_support_resources,
@@ -90,6 +90,43 @@ TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "predict_analysis_score_batch",
+            "description": "Runs the analysis model on many fields in one step (all fields unless field_ids is given, narrowed by filters), updates their analysis scores and returns a summary with the top_k highest-scoring fields. Prefer this over calling predict_analysis_score for each field.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "field_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional list of field IDs to score. Omit to score every field."
+                    },
+                    "top_k": {
+                        "type": "integer",
+                        "description": "Number of highest-scoring fields to return (default 10)."
+                    },
+                    "filters": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "field": {"type": "string", "description": "Numeric field to compare, dotted for nested fields (e.g. analysis_score, monthly_charge, soil_quality.moisture or crop_health.disease_incidents). Lists compare by their length."},
+                                "op": {"type": "string", "enum": ["==", "!=", ">", ">=", "<", "<="]},
+                                "value": {"type": "number"}
+                            },
+                            "required": ["field", "op", "value"],
+                            "additionalProperties": False
+                        },
+                        "description": "Optional conditions every scored field must meet, e.g. soil_quality.moisture < 30. Omit to score without filtering."
+                    }
+                },
+                "required": [],
+                "additionalProperties": False
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -1,13 +1,16 @@
 # functions.py for Product Recommendation
-import streamlit as st
-from typing import Dict, Any, List
+import numpy as np
+from context_provider import get_context
+from columnar import columnar, filter_keys, top_k as top_scores
+from context_store import find_record
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 def get_customer_info(customer_id: str) -> Dict[str, Any]:
     '''
     Retrieves high-level customer information including membership plan.
     '''
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
     cust = customers[customer_id]
@@ -24,7 +27,7 @@ def get_product_info(product_id: str) -> Dict[str, Any]:
     '''
     Fetches product information for a given product.
     '''
-    products = st.session_state.context['products']
+    products = get_context()['products']
     if product_id not in products:
         return {'error': f'Product ID {product_id} not found.'}
     prod = products[product_id]
@@ -41,7 +44,7 @@ def update_customer_info(customer_id: str, updates: Dict[str, Any]) -> Dict[str,
     '''
     Updates the customer's information.
     '''
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
     for key, value in updates.items():
@@ -56,35 +59,39 @@ def fetch_high_value_customers() -> List[Dict[str, Any]]:
     '''
     Fetches customers with recommendation_score above the global recommendation threshold.
     '''
-    customers = st.session_state.context['customers']
-    threshold = st.session_state.context['recommendation_model'].get('recommendation_threshold', 0.6)
-    results = []
-    for cid, data in customers.items():
-        score = data.get('recommendation_score', 0)
-        if score >= threshold:
-            results.append({
-                'customer_id': cid,
-                'recommendation_score': score
-            })
-    return results
+    customers = get_context()['customers']
+    threshold = get_context()['recommendation_model'].get('recommendation_threshold', 0.6)
+    view = columnar(customers, ['recommendation_score'])
+    scores = view['recommendation_score']
+    mask = scores >= threshold
+    return [
+        {'customer_id': cid, 'recommendation_score': score}
+        for cid, score in zip(view.select(mask), scores[mask].tolist())
+    ]
+
+def recommendation_scores(brand_count, category_count, purchase_count):
+    '''
+    Simple heuristic on the number of preferred brands, preferred categories and purchases,
+    clipped at 1.0. Works on single values as well as NumPy columns of every customer.
+    '''
+    base_score = np.asarray(brand_count) * 0.1 + np.asarray(category_count) * 0.2 + np.asarray(purchase_count) * 0.05
+    return np.minimum(base_score, 1.0)
 
 def run_recommendation_model(customer_id: str) -> Dict[str, Any]:
     '''
     Recalculates a recommendation_score for the customer.
     '''
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
     preferences = customers[customer_id].get('preferences', {})
     purchased = customers[customer_id].get('purchased_products', [])
 
-    # Simple heuristic for demonstration
-    brand_factor = len(preferences.get('preferred_brands', [])) * 0.1
-    category_factor = len(preferences.get('preferred_categories', [])) * 0.2
-    purchase_factor = len(purchased) * 0.05
-
-    base_score = brand_factor + category_factor + purchase_factor
-    recommendation_score = min(base_score, 1.0)
+    recommendation_score = float(recommendation_scores(
+        len(preferences.get('preferred_brands', [])),
+        len(preferences.get('preferred_categories', [])),
+        len(purchased)
+    ))
     customers[customer_id]['recommendation_score'] = recommendation_score
 
     return {
@@ -93,12 +100,50 @@ def run_recommendation_model(customer_id: str) -> Dict[str, Any]:
         'timestamp': datetime.now().isoformat()
     }
 
+def run_recommendation_model_batch(customer_ids: Optional[List[str]] = None, top_k: int = 10,
+                                   filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    '''
+    Recalculates the recommendation_score of many customers at once (every customer by default)
+    and returns the top_k highest-scoring customers. Filters on numeric fields
+    (e.g. months_with_service >= 12) narrow the batch further.
+    '''
+    customers = get_context()['customers']
+    threshold = get_context()['recommendation_model'].get('recommendation_threshold', 0.6)
+    features = ['preferences.preferred_brands', 'preferences.preferred_categories', 'purchased_products']
+    missing = []
+    if filters:
+        try:
+            customer_ids, missing = filter_keys(customers, filters, customer_ids)
+        except ValueError as e:
+            return {'error': str(e)}
+    view = columnar(customers, features)
+    ids, positions, not_found = view.positions(customer_ids)
+    missing += not_found
+
+    scores = recommendation_scores(*(view[feature][positions] for feature in features))
+    updated = view.assign('recommendation_score', scores, ids)
+
+    result = {
+        'scored_customers': len(ids),
+        'updated_customers': updated,
+        'recommendation_threshold': threshold,
+        'customers_above_threshold': int((scores >= threshold).sum()),
+        'top_customers': [
+            {'customer_id': cid, 'recommendation_score': score}
+            for cid, score in top_scores(ids, scores, top_k)
+        ],
+        'timestamp': datetime.now().isoformat()
+    }
+    if missing:
+        result['not_found'] = missing
+    return result
+
 def propose_product_recommendation(customer_id: str) -> Dict[str, Any]:
     '''
     Suggests product recommendations for the customer.
     '''
-    customers = st.session_state.context['customers']
-    recommendations = st.session_state.context['recommendations']
+    customers = get_context()['customers']
+    recommendations = get_context()['recommendations']
 
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
@@ -129,13 +174,13 @@ def apply_recommendation(customer_id: str, recommendation_id: str) -> Dict[str,
     '''
     Applies a specific recommendation for a customer.
     '''
-    customers = st.session_state.context['customers']
-    recommendations = st.session_state.context['recommendations']
+    customers = get_context()['customers']
+    recommendations = get_context()['recommendations']
 
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
 
-    rec = next((r for r in recommendations if r['recommendation_id'] == recommendation_id), None)
+    rec = find_record(recommendations, 'recommendation_id', recommendation_id)
     if not rec:
         return {'error': f'Recommendation {recommendation_id} not found.'}
 
@@ -152,7 +197,7 @@ def check_support_resources() -> Dict[str, Any]:
     '''
     Checks availability of support resources (agents, tickets).
     '''
-    resources = st.session_state.context['support_resources']
+    resources = get_context()['support_resources']
     return {
         'available_agents': resources['available_agents'],
         'support_tickets': resources['support_tickets'],
@@ -163,8 +208,8 @@ def schedule_support_call(customer_id: str, call_type: str) -> Dict[str, Any]:
     '''
     Schedules a support call.
     '''
-    customers = st.session_state.context['customers']
-    resources = st.session_state.context['support_resources']
+    customers = get_context()['customers']
+    resources = get_context()['support_resources']
 
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
@@ -188,7 +233,7 @@ def generate_customer_survey(customer_id: str) -> Dict[str, Any]:
     '''
     Generates a simple survey for the customer.
     '''
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
 
@@ -208,7 +253,7 @@ def gather_survey_feedback(customer_id: str, survey_responses: Dict[str, Any]) -
     '''
     Processes the survey responses and updates the customer record.
     '''
-    customers = st.session_state.context['customers']
+    customers = get_context()['customers']
     if customer_id not in customers:
         return {'error': f'Customer ID {customer_id} not found.'}
 
@@ -226,6 +271,7 @@ FUNCTION_MAPPING = {
     'update_customer_info': update_customer_info,
     'fetch_high_value_customers': fetch_high_value_customers,
     'run_recommendation_model': run_recommendation_model,
+    'run_recommendation_model_batch': run_recommendation_model_batch,
     'propose_product_recommendation': propose_product_recommendation,
     'apply_recommendation': apply_recommendation,
     'check_support_resources': check_support_resources,
@@ -90,6 +90,43 @@ TOOLS = [
             }
         }
     },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'run_recommendation_model_batch',
+            'description': 'Runs the recommendation model on many customers in one step (all customers unless customer_ids is given, narrowed by filters), updates their recommendation_score and returns a summary with the top_k highest-scoring customers. Prefer this over calling run_recommendation_model for each customer.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'customer_ids': {
+                        'type': 'array',
+                        'items': {'type': 'string'},
+                        'description': 'Optional list of customer IDs to score. Omit to score every customer.'
+                    },
+                    'top_k': {
+                        'type': 'integer',
+                        'description': 'Number of highest-scoring customers to return (default 10).'
+                    },
+                    'filters': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'field': {'type': 'string', 'description': 'Numeric field to compare, dotted for nested fields (e.g. recommendation_score, monthly_subscription_fee or months_with_service). Lists compare by their length.'},
+                                'op': {'type': 'string', 'enum': ['==', '!=', '>', '>=', '<', '<=']},
+                                'value': {'type': 'number'}
+                            },
+                            'required': ['field', 'op', 'value'],
+                            'additionalProperties': False
+                        },
+                        'description': 'Optional conditions every scored customer must meet, e.g. months_with_service >= 12. Omit to score without filtering.'
+                    }
+                },
+                'required': [],
+                'additionalProperties': False
+            }
+        }
+    },
     {
         'type': 'function',
         'function': {
@@ -1,4 +1,5 @@
-import streamlit as st
+from context_provider import get_context
+from context_store import find_record, resolve_record
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
@@ -11,10 +12,10 @@ def check_credit_risk(application_id: str) -> Dict[str, Any]:
     Evaluates the mortgage applicant's credit risk by analyzing their credit score.
     Returns a risk rating such as "LOW", "MEDIUM", or "HIGH".
     """
-    data = st.session_state.context
+    data = get_context()
     apps = data['mortgage_applications']
 
-    application = next((app for app in apps if app['application_id'] == application_id), None)
+    application = find_record(apps, 'application_id', application_id)
     if not application:
         return {"error": f"Application {application_id} not found.", "success": False}
 
@@ -39,21 +40,11 @@ def assess_income_stability(customer_identifier: str) -> Dict[str, Any]:
     Compares customer's reported income with tax records to assess consistency.
     Accepts either a customer ID (e.g., "CUST101") or a customer's name.
     """
-    data = st.session_state.context
+    data = get_context()
     customers = data['customers']
 
     # Attempt to find by ID or by name
-    found_customer = None
-    if customer_identifier in customers:
-        found_customer = customers[customer_identifier]
-        cust_key = customer_identifier
-    else:
-        # Search by name
-        for cid, info in customers.items():
-            if info['name'].lower() == customer_identifier.lower():
-                found_customer = info
-                cust_key = cid
-                break
+    cust_key, found_customer = resolve_record(customers, customer_identifier)
 
     if not found_customer:
         return {"error": f"Customer {customer_identifier} not found.", "success": False}
@@ -79,7 +70,7 @@ def evaluate_property_value(property_address: str) -> Dict[str, Any]:
     """
     Retrieves the property value from the data store.
     """
-    data = st.session_state.context
+    data = get_context()
     prop_values = data['property_values']
 
     if property_address not in prop_values:
@@ -96,9 +87,9 @@ def underwrite_mortgage(application_id: str) -> Dict[str, Any]:
     """
     Completes a mortgage underwriting decision based on risk, income stability, and property value.
     """
-    data = st.session_state.context
+    data = get_context()
     apps = data['mortgage_applications']
-    application = next((app for app in apps if app['application_id'] == application_id), None)
+    application = find_record(apps, 'application_id', application_id)
 
     if not application:
         return {"error": f"Application {application_id} not found.", "success": False}
@@ -130,11 +121,11 @@ def detect_fraud(application_id: str) -> Dict[str, Any]:
     """
     Examines application data for income vs. tax inconsistencies.
     """
-    data = st.session_state.context
+    data = get_context()
     apps = data['mortgage_applications']
     customers = data['customers']
 
-    application = next((app for app in apps if app['application_id'] == application_id), None)
+    application = find_record(apps, 'application_id', application_id)
     if not application:
         return {"error": f"Application {application_id} not found.", "success": False}
 
@@ -162,24 +153,18 @@ def run_aml_check(customer_identifier: str, transaction_id: str) -> Dict[str, An
     """
     Checks if the customer's transaction exceeds AML threshold.
     """
-    data = st.session_state.context
+    data = get_context()
     aml_threshold = data['compliance_rules']['aml_threshold']
     customers = data['customers']
 
     # Attempt to find by ID or by name
-    found_customer_key = None
-    found_customer = None
-    for k, cdata in customers.items():
-        if k == customer_identifier or cdata['name'].lower() == customer_identifier.lower():
-            found_customer = cdata
-            found_customer_key = k
-            break
+    found_customer_key, found_customer = resolve_record(customers, customer_identifier)
 
     if not found_customer:
         return {"error": f"Customer {customer_identifier} not found.", "success": False}
 
     transactions = found_customer.get('transactions', [])
-    txn = next((t for t in transactions if t['transaction_id'] == transaction_id), None)
+    txn = find_record(transactions, 'transaction_id', transaction_id)
     if not txn:
         return {"error": f"Transaction {transaction_id} not found.", "success": False}
 
@@ -200,17 +185,11 @@ def send_compliance_notice(customer_identifier: str, reference_id: str, message:
     """
     Sends a compliance notice to the specified customer about the given reference (e.g., a transaction or application ID).
     """
-    data = st.session_state.context
+    data = get_context()
     customers = data['customers']
 
     # Attempt to find by ID or by name
-    found_customer_key = None
-    found_customer = None
-    for k, cdata in customers.items():
-        if k == customer_identifier or cdata['name'].lower() == customer_identifier.lower():
-            found_customer = cdata
-            found_customer_key = k
-            break
+    found_customer_key, found_customer = resolve_record(customers, customer_identifier)
 
     if not found_customer:
         return {"error": f"Customer {customer_identifier} not found.", "success": False}
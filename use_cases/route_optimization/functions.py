@@ -1,12 +1,12 @@
 # functions.py for Delivery Route Planning
-import streamlit as st
+from context_provider import get_context
 from typing import Dict, Any, List
 from datetime import datetime
 
 
 def get_order_info(order_id: str) -> Dict[str, Any]:
     '''Retrieves high-level order information including destination, priority, and deadline.'''
-    orders = st.session_state.context['orders']
+    orders = get_context()['orders']
     if order_id not in orders:
         return {"error": f"Order ID {order_id} not found."}
     order = orders[order_id]
@@ -21,7 +21,7 @@ def get_order_info(order_id: str) -> Dict[str, Any]:
 
 def get_driver_info(driver_id: str) -> Dict[str, Any]:
     '''Retrieves information about a driver, including experience and rating.'''
-    drivers = st.session_state.context['drivers']
+    drivers = get_context()['drivers']
     if driver_id not in drivers:
         return {"error": f"Driver ID {driver_id} not found."}
     driver = drivers[driver_id]
@@ -36,8 +36,8 @@ def get_driver_info(driver_id: str) -> Dict[str, Any]:
 
 def plan_optimal_route(order_ids: List[str], vehicle_id: str) -> Dict[str, Any]:
     '''Generates an optimal route for a list of given orders, considering constraints like vehicle capacity and deadlines.'''
-    orders = st.session_state.context['orders']
-    fleet = st.session_state.context['fleet']
+    orders = get_context()['orders']
+    fleet = get_context()['fleet']
     if vehicle_id not in fleet:
         return {"error": f"Vehicle ID {vehicle_id} not found."}
 
@@ -66,7 +66,7 @@ def plan_optimal_route(order_ids: List[str], vehicle_id: str) -> Dict[str, Any]:
 
 def update_order_status(order_id: str, new_status: str) -> Dict[str, Any]:
     '''Updates the status of the order (e.g., pending, in_progress, completed).'''
-    orders = st.session_state.context['orders']
+    orders = get_context()['orders']
     if order_id not in orders:
         return {"error": f"Order ID {order_id} not found."}
     orders[order_id]["status"] = new_status
@@ -79,7 +79,7 @@ def update_order_status(order_id: str, new_status: str) -> Dict[str, Any]:
 
 def fetch_high_priority_orders() -> List[Dict[str, Any]]:
     '''Fetches a list of orders that are marked as High priority.'''
-    orders = st.session_state.context['orders']
+    orders = get_context()['orders']
     results = []
     for oid, data in orders.items():
         if data.get('priority', '').lower() == 'high':
@@ -94,14 +94,14 @@ def fetch_high_priority_orders() -> List[Dict[str, Any]]:
 
 def assign_driver_to_route(driver_id: str, route_id: str) -> Dict[str, Any]:
     '''Assigns a driver to a route after the route has been planned.'''
-    drivers = st.session_state.context['drivers']
+    drivers = get_context()['drivers']
     if driver_id not in drivers:
         return {"error": f"Driver ID {driver_id} not found."}
 
     # For this demo, we record the assignment in session_state.
-    assigned_routes = st.session_state.context.get('assigned_routes', {})
+    assigned_routes = get_context().get('assigned_routes', {})
     assigned_routes[route_id] = driver_id
-    st.session_state.context['assigned_routes'] = assigned_routes
+    get_context()['assigned_routes'] = assigned_routes
 
     return {
         "driver_id": driver_id,
@@ -113,7 +113,7 @@ def assign_driver_to_route(driver_id: str, route_id: str) -> Dict[str, Any]:
 
 def check_schedule_resources() -> Dict[str, Any]:
     '''Checks the availability of drivers and vehicles.'''
-    resources = st.session_state.context['schedule_resources']
+    resources = get_context()['schedule_resources']
     return {
         "available_drivers": resources["available_drivers"],
         "available_vehicles": resources["available_vehicles"],
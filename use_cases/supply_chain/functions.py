@@ -1,4 +1,5 @@
-import streamlit as st
+from context_provider import get_context
+from context_store import find_record
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
@@ -7,9 +8,9 @@ def get_inventory_status(product_id: str) -> Dict[str, Any]:
     Retrieves the current inventory status for a given product.
     Returns both quantity and component availability.
     """
-    inventory = st.session_state.context['inventory']
-    components = st.session_state.context['components']
-    products = st.session_state.context['products']
+    inventory = get_context()['inventory']
+    components = get_context()['components']
+    products = get_context()['products']
     
     if product_id not in products:
         return {'error': f"Product ID {product_id} not found."}
@@ -35,8 +36,8 @@ def get_product_details(product_id: str) -> Dict[str, Any]:
     """
     Fetches comprehensive product details including components and suppliers.
     """
-    products = st.session_state.context['products']
-    components = st.session_state.context['components']
+    products = get_context()['products']
+    components = get_context()['components']
     
     if product_id not in products:
         return {'error': f"Product ID {product_id} not found."}
@@ -62,9 +63,9 @@ def update_inventory(product_id: str, quantity_change: int) -> Dict[str, Any]:
     """
     Updates inventory with validation for component availability.
     """
-    inventory = st.session_state.context['inventory']
-    products = st.session_state.context['products']
-    components = st.session_state.context['components']
+    inventory = get_context()['inventory']
+    products = get_context()['products']
+    components = get_context()['components']
     
     if product_id not in products:
         return {'error': f"Product ID {product_id} not found."}
@@ -94,8 +95,8 @@ def fetch_new_orders() -> List[Dict[str, Any]]:
     """
     Fetches and validates new customer orders.
     """
-    orders = st.session_state.context['orders']
-    inventory = st.session_state.context['inventory']
+    orders = get_context()['orders']
+    inventory = get_context()['inventory']
     
     validated_orders = []
     for order in orders:
@@ -118,11 +119,11 @@ def allocate_stock(order_id: str, product_id: str, quantity: int) -> Dict[str, A
     """
     Allocates stock for an order with validation and partial allocation support.
     """
-    inventory = st.session_state.context['inventory']
-    orders = st.session_state.context['orders']
+    inventory = get_context()['inventory']
+    orders = get_context()['orders']
     
     # Validate order exists
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    order = find_record(orders, 'order_id', order_id)
     if not order:
         return {'error': f"Order {order_id} not found."}
     
@@ -147,8 +148,8 @@ def check_available_suppliers() -> Dict[str, List[Dict[str, Any]]]:
     """
     Returns detailed supplier availability information.
     """
-    suppliers = st.session_state.context.get('available_suppliers', [])
-    components = st.session_state.context['components']
+    suppliers = get_context().get('available_suppliers', [])
+    components = get_context()['components']
     
     supplier_details = []
     for supplier_id in suppliers:
@@ -168,8 +169,8 @@ def place_purchase_order(supplier_id: str, component_id: str, quantity: int) ->
     """
     Places and validates a purchase order with improved error handling.
     """
-    suppliers = st.session_state.context['available_suppliers']
-    components = st.session_state.context['components']
+    suppliers = get_context()['available_suppliers']
+    components = get_context()['components']
     
     if supplier_id not in suppliers:
         return {'error': f"Invalid supplier ID: {supplier_id}"}
@@ -188,7 +189,7 @@ def place_purchase_order(supplier_id: str, component_id: str, quantity: int) ->
     
     # Update component availability and production capacity
     component['available_quantity'] += quantity
-    st.session_state.context['production_capacity']['next_week'] += quantity
+    get_context()['production_capacity']['next_week'] += quantity
     
     return {
         'po_number': po_number,
@@ -203,9 +204,9 @@ def schedule_production_run(product_id: str, quantity: int, time_frame: str) ->
     """
     Schedules production with component and capacity validation.
     """
-    capacity = st.session_state.context['production_capacity']
-    products = st.session_state.context['products']
-    components = st.session_state.context['components']
+    capacity = get_context()['production_capacity']
+    products = get_context()['products']
+    components = get_context()['components']
     
     if time_frame not in capacity:
         return {'error': f"Invalid time frame: {time_frame}"}
@@ -227,8 +228,8 @@ def schedule_production_run(product_id: str, quantity: int, time_frame: str) ->
     # Update capacity and inventory
     capacity[time_frame] -= quantity
     if time_frame == 'immediate':
-        st.session_state.context['inventory'][product_id] = \
-            st.session_state.context['inventory'].get(product_id, 0) + quantity
+        get_context()['inventory'][product_id] = \
+            get_context()['inventory'].get(product_id, 0) + quantity
     
     return {
         'production_id': f"PROD_{datetime.now().strftime('%Y%m%d')}_{product_id}",
@@ -242,7 +243,7 @@ def calculate_shipping_options(destination: str, weight: float, dimensions: Dict
     """
     Calculates shipping options with validation and sorting.
     """
-    shipping_options = st.session_state.context['shipping_options']
+    shipping_options = get_context()['shipping_options']
     
     if destination not in shipping_options:
         return {'error': f"No shipping options available for destination {destination}"}
@@ -262,13 +263,13 @@ def book_shipment(order_id: str, carrier_id: str, service_level: str) -> Dict[st
     """
     Books shipment with improved validation and tracking.
     """
-    orders = st.session_state.context['orders']
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    orders = get_context()['orders']
+    order = find_record(orders, 'order_id', order_id)
     
     if not order:
         return {'error': f"Order {order_id} not found"}
         
-    shipping_options = st.session_state.context['shipping_options'][order['destination']]
+    shipping_options = get_context()['shipping_options'][order['destination']]
     valid_option = next((opt for opt in shipping_options 
                         if opt['carrier_id'] == carrier_id 
                         and opt['service_level'] == service_level), None)
@@ -292,13 +293,13 @@ def send_order_update(customer_id: str, order_id: str, message: str) -> Dict[str
     """
     Sends order updates with customer validation.
     """
-    customers = st.session_state.context['customers']
-    orders = st.session_state.context['orders']
+    customers = get_context()['customers']
+    orders = get_context()['orders']
     
     if customer_id not in customers:
         return {'error': f"Customer {customer_id} not found"}
         
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    order = find_record(orders, 'order_id', order_id)
     if not order:
         return {'error': f"Order {order_id} not found"}
         
@@ -1,12 +1,13 @@
-import streamlit as st
+from context_provider import get_context
+from context_store import find_record
 from typing import Dict, Any, List
 from datetime import datetime
 
 def get_portfolio_overview(portfolio_id: str) -> Dict[str, Any]:
-    portfolios = st.session_state.context['portfolios']
-    market_data = st.session_state.context['market_data']
+    portfolios = get_context()['portfolios']
+    market_data = get_context()['market_data']
 
-    portfolio = next((p for p in portfolios if p['portfolio_id'] == portfolio_id), None)
+    portfolio = find_record(portfolios, 'portfolio_id', portfolio_id)
     if not portfolio:
         return {"error": f"Portfolio {portfolio_id} not found.", "success": False}
 
@@ -44,7 +45,7 @@ def get_portfolio_overview(portfolio_id: str) -> Dict[str, Any]:
     }
 
 def analyze_security(symbol: str) -> Dict[str, Any]:
-    market_data = st.session_state.context['market_data']
+    market_data = get_context()['market_data']
     if symbol not in market_data:
         return {"error": f"Symbol {symbol} not found.", "success": False}
 
@@ -57,10 +58,10 @@ def analyze_security(symbol: str) -> Dict[str, Any]:
     }
 
 def suggest_optimizations(portfolio_id: str) -> Dict[str, Any]:
-    portfolios = st.session_state.context['portfolios']
-    users = st.session_state.context['users']
+    portfolios = get_context()['portfolios']
+    users = get_context()['users']
 
-    portfolio = next((p for p in portfolios if p['portfolio_id'] == portfolio_id), None)
+    portfolio = find_record(portfolios, 'portfolio_id', portfolio_id)
     if not portfolio:
         return {"error": f"Portfolio {portfolio_id} not found.", "success": False}
 
@@ -87,14 +88,14 @@ def suggest_optimizations(portfolio_id: str) -> Dict[str, Any]:
     }
 
 def fetch_latest_news() -> Dict[str, Any]:
-    market_news = st.session_state.context['market_news']
+    market_news = get_context()['market_news']
     return {
         "success": True,
         "latest_news": market_news
     }
 
 def update_market_data(symbol: str, new_price: float) -> Dict[str, Any]:
-    market_data = st.session_state.context['market_data']
+    market_data = get_context()['market_data']
     if symbol not in market_data:
         return {"error": f"Symbol {symbol} not found.", "success": False}
 
@@ -107,16 +108,16 @@ def update_market_data(symbol: str, new_price: float) -> Dict[str, Any]:
     }
 
 def place_trade(portfolio_id: str, symbol: str, shares: int) -> Dict[str, Any]:
-    portfolios = st.session_state.context['portfolios']
-    market_data = st.session_state.context['market_data']
-    portfolio = next((p for p in portfolios if p['portfolio_id'] == portfolio_id), None)
+    portfolios = get_context()['portfolios']
+    market_data = get_context()['market_data']
+    portfolio = find_record(portfolios, 'portfolio_id', portfolio_id)
 
     if not portfolio:
         return {"error": f"Portfolio {portfolio_id} not found.", "success": False}
     if symbol not in market_data:
         return {"error": f"Symbol {symbol} not found.", "success": False}
 
-    current_holding = next((h for h in portfolio['holdings'] if h['symbol'] == symbol), None)
+    current_holding = find_record(portfolio['holdings'], 'symbol', symbol)
     # Buy or Sell
     if shares > 0:
         # Buying